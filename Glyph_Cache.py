@@ -0,0 +1,84 @@
+# glyph_cache.py
+"""
+Pre-rendered glyph atlas for gauge text.
+
+Rasterising TrueType text every frame costs far more than the pixels it
+produces. GlyphAtlas renders each character of a font once at startup
+(digits, sign, decimal point, units) into a 1-bit bitmap with its
+advance width, so a value is composed by pasting cached bitmaps and
+centered using precomputed widths. Static strings such as page labels
+are cached whole.
+
+    big = GlyphAtlas(font_value)
+    big.draw_centered(image, "14.7", y=10)
+"""
+import math
+from PIL import Image, ImageDraw
+
+DEFAULT_CHARS = "0123456789-+.:% CFMPHkPaVRAN/"
+
+
+class GlyphAtlas:
+
+    def __init__(self, font, chars=DEFAULT_CHARS):
+        self.font = font
+        try:
+            ascent, descent = font.getmetrics()
+            self.height = ascent + descent
+        except AttributeError:
+            # Bitmap fonts from load_default() have no metrics
+            bbox = font.getbbox("0123456789Ag")
+            self.height = bbox[3]
+        self.glyphs = {}
+        self.strings = {}
+        for ch in chars:
+            self._add(ch)
+
+    def _add(self, ch):
+        advance = self.font.getlength(ch)
+        right = self.font.getbbox(ch)[2] if ch.strip() else 0
+        cell = Image.new('1', (max(1, math.ceil(max(advance, right))), self.height))
+        ImageDraw.Draw(cell).text((0, 0), ch, font=self.font, fill=255)
+        glyph = (cell, advance)
+        self.glyphs[ch] = glyph
+        return glyph
+
+    def _glyph(self, ch):
+        glyph = self.glyphs.get(ch)
+        return glyph if glyph is not None else self._add(ch)
+
+    def width(self, text):
+        """Rendered width from cached advances (no font calls)."""
+        w = 0.0
+        for ch in text:
+            w += self._glyph(ch)[1]
+        return int(round(w))
+
+    def blit(self, image, text, x, y):
+        """Paste the text's cached glyphs into image at (x, y)."""
+        pos = float(x)
+        for ch in text:
+            cell, advance = self._glyph(ch)
+            # Using the cell as its own mask ORs glyphs, so overhangs don't erase
+            image.paste(cell, (int(round(pos)), y), cell)
+            pos += advance
+
+    def draw_centered(self, image, text, y, width=None):
+        width = image.width if width is None else width
+        self.blit(image, text, (width - self.width(text)) // 2, y)
+
+    def string(self, text):
+        """A whole static string (e.g. a page label) rendered once: (bitmap, width)."""
+        cached = self.strings.get(text)
+        if cached is None:
+            w = max(1, self.width(text))
+            bitmap = Image.new('1', (w, self.height))
+            self.blit(bitmap, text, 0, 0)
+            cached = self.strings[text] = (bitmap, w)
+        return cached
+
+    def paste_centered(self, image, text, y, width=None):
+        """Center a cached whole string; cheapest path for labels."""
+        width = image.width if width is None else width
+        bitmap, w = self.string(text)
+        image.paste(bitmap, ((width - w) // 2, y), bitmap)
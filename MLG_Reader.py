@@ -0,0 +1,229 @@
+# mlg_reader.py
+"""
+Memory-mapped reader for TunerStudio binary .mlg (MLVLG) logs.
+
+The file is mmapped and the header's field descriptors are turned into a
+NumPy structured dtype covering one data block, so the records are a
+zero-copy view straight onto the mapping: opening a multi-hundred-MB log
+only parses the header. Marker blocks split the data into segments.
+Without NumPy, records are read through memoryviews and struct instead.
+A log still being written is followed with refresh(), which remaps the
+grown file and scans only the blocks appended since the last call.
+
+    log = MLGLog("2024-06-01_track.mlg")
+    rpm = log.column("RPM")          # scaled float array
+    new = log.refresh()              # records TunerStudio appended since
+"""
+import mmap
+import os
+import struct
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+MAGIC = b'MLVLG\0'
+
+# Descriptor type -> (struct char, numpy dtype); bitfields read as unsigned
+FIELD_TYPES = {
+    0: ('B', 'u1'), 1: ('b', 'i1'),
+    2: ('H', '>u2'), 3: ('h', '>i2'),
+    4: ('I', '>u4'), 5: ('i', '>i4'),
+    6: ('q', '>i8'), 7: ('f', '>f4'),
+    10: ('B', 'u1'), 11: ('H', '>u2'), 12: ('I', '>u4'),
+}
+
+_HEADER_V1 = struct.Struct('>6shIhIhh')   # magic, version, time, info start, data start, record len, fields
+_HEADER_V2 = struct.Struct('>6shIIIhh')
+_FIELD_V1 = struct.Struct('>B34s10sBffb')
+_FIELD_V2 = struct.Struct('>B34s10sBffb34s')
+_BLOCK_HEAD = struct.Struct('>BBH')       # block type, counter, timestamp (10 us)
+BLOCK_DATA = 0
+BLOCK_MARKER = 1
+MARKER_SIZE = _BLOCK_HEAD.size + 50
+
+
+def _text(b):
+    return b.split(b'\0', 1)[0].decode('latin-1').strip()
+
+
+class MLGLog:
+
+    def __init__(self, path):
+        self.path = path
+        self._f = open(path, "rb")
+        self.mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._parse_header()
+        self.markers = []
+        self.segments = []
+        self._end = self.data_start    # first byte not yet scanned
+        self._scan()
+
+    def _parse_header(self):
+        mm = self.mm
+        if mm[:6] != MAGIC:
+            raise ValueError(f"{self.path} is not an MLVLG log")
+        (self.version,) = struct.unpack_from('>h', mm, 6)
+        if self.version == 1:
+            header, field = _HEADER_V1, _FIELD_V1
+        else:
+            header, field = _HEADER_V2, _FIELD_V2
+        (_, _, self.timestamp, self.info_start, self.data_start,
+         self.record_length, n) = header.unpack_from(mm)
+
+        self.fields = []
+        names = set()
+        pos = header.size
+        offset = 0
+        for _ in range(n):
+            desc = field.unpack_from(mm, pos)
+            pos += field.size
+            type_code, name, units, style, scale_, transform, digits = desc[:7]
+            name = _text(name) or f"field{len(self.fields)}"
+            base, i = name, 1
+            while name in names:   # dtype field names must be unique
+                i += 1
+                name = f"{base}_{i}"
+            names.add(name)
+            fmt, dtype = FIELD_TYPES.get(type_code, ('B', 'u1'))
+            self.fields.append({'name': name, 'units': _text(units), 'type': type_code,
+                                'scale': scale_, 'transform': transform,
+                                'digits': digits, 'offset': offset,
+                                'fmt': fmt, 'dtype': dtype})
+            offset += struct.calcsize(fmt)
+
+        self.block_size = _BLOCK_HEAD.size + self.record_length + 1
+        self.by_name = {f['name']: f for f in self.fields}
+        if np is not None:
+            self.dtype = np.dtype({
+                'names': ['block_type', 'counter', 'timestamp']
+                         + [f['name'] for f in self.fields] + ['crc'],
+                'formats': ['u1', 'u1', '>u2'] + [f['dtype'] for f in self.fields] + ['u1'],
+                'offsets': [0, 1, 2] + [_BLOCK_HEAD.size + f['offset'] for f in self.fields]
+                           + [self.block_size - 1],
+                'itemsize': self.block_size,
+            })
+        self._record = struct.Struct('>' + ''.join(f['fmt'] for f in self.fields))
+
+    def _scan(self):
+        """
+        Split the data area past the last scan into runs of data blocks,
+        recording markers. Only the block-type byte at each stride is
+        examined; without markers this is a single vectorised check over
+        the new part of the file.
+        """
+        segments = self.segments
+        pos = self._end
+        size = len(self.mm)
+        while pos + self.block_size <= size:
+            count = (size - pos) // self.block_size
+            if np is not None:
+                types = np.frombuffer(self.mm, dtype='u1', count=count * self.block_size,
+                                      offset=pos)[::self.block_size]
+                bad = np.flatnonzero(types != BLOCK_DATA)
+                run = int(bad[0]) if len(bad) else count
+            else:
+                run = 0
+                while run < count and self.mm[pos + run * self.block_size] == BLOCK_DATA:
+                    run += 1
+            if run:
+                if segments and segments[-1][0] + segments[-1][1] * self.block_size == pos:
+                    segments[-1] = (segments[-1][0], segments[-1][1] + run)
+                else:
+                    segments.append((pos, run))
+                pos += run * self.block_size
+            if run == count:
+                break
+            if self.mm[pos] == BLOCK_MARKER and pos + MARKER_SIZE <= size:
+                _, _, ts = _BLOCK_HEAD.unpack_from(self.mm, pos)
+                self.markers.append((sum(n for _, n in segments), ts,
+                                     _text(self.mm[pos + _BLOCK_HEAD.size:pos + MARKER_SIZE])))
+                pos += MARKER_SIZE
+            else:
+                break  # unknown block type or marker still being written
+        self._end = pos
+
+    def refresh(self):
+        """
+        Pick up blocks appended since the last scan; returns the number of
+        new records. Only the grown tail of the file is examined.
+        """
+        before = len(self)
+        if os.fstat(self._f.fileno()).st_size > len(self.mm):
+            old = self.mm
+            self.mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                old.close()
+            except BufferError:
+                pass  # arrays from blocks() still view it; freed along with them
+            self._scan()
+        return len(self) - before
+
+    def __len__(self):
+        return sum(n for _, n in self.segments)
+
+    # --- NumPy access ---
+    def blocks(self):
+        """List of zero-copy structured arrays, one per segment between markers."""
+        return [np.frombuffer(self.mm, dtype=self.dtype, count=n, offset=pos)
+                for pos, n in self.segments]
+
+    def records(self):
+        """All data blocks as one structured array (zero-copy unless markers split it)."""
+        parts = self.blocks()
+        if len(parts) == 1:
+            return parts[0]
+        if not parts:
+            return np.zeros(0, dtype=self.dtype)
+        return np.concatenate(parts)
+
+    def column(self, name):
+        """Scaled values of one field: (raw + transform) * scale."""
+        f = self.by_name[name]
+        raw = self.records()[name]
+        return (raw.astype(np.float64) + f['transform']) * f['scale']
+
+    def times(self):
+        """Seconds since the first record, unwrapping the 16-bit 10 us counter."""
+        ts = self.records()['timestamp']
+        if not len(ts):
+            return np.zeros(0)
+        step = np.diff(ts.astype(np.int64)) % 65536
+        return np.concatenate(([0.0], np.cumsum(step) * 1e-5))
+
+    # --- Plain Python access ---
+    def record_view(self, index):
+        """memoryview of one record's field bytes (no copy)."""
+        for pos, n in self.segments:
+            if index < n:
+                start = pos + index * self.block_size + _BLOCK_HEAD.size
+                return memoryview(self.mm)[start:start + self.record_length]
+            index -= n
+        raise IndexError(index)
+
+    def record(self, index):
+        """One record decoded to {name: scaled value}."""
+        raw = self._record.unpack_from(self.record_view(index))
+        return {f['name']: (v + f['transform']) * f['scale'] for f, v in zip(self.fields, raw)}
+
+    def close(self):
+        self.mm.close()
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# --- MAIN ---
+if __name__ == "__main__":
+    import sys
+    with MLGLog(sys.argv[1]) as log:
+        print(f"MLVLG v{log.version}: {len(log.fields)} fields, {len(log)} records, "
+              f"{len(log.markers)} markers")
+        if len(log):
+            for k, v in log.record(len(log) - 1).items():
+                print(f"{k:20s} {v:g} {log.by_name[k]['units']}")
@@ -0,0 +1,187 @@
+# msl_index.py
+"""
+Sidecar time index for TunerStudio .msl text logs.
+
+The log is streamed once and every INTERVAL seconds of log time an entry
+(time, row number, byte offset) is written to "<log>.idx". Seeking to a
+timestamp is then a binary search over the index plus a short forward
+scan, instead of reading the log from the start. When the log has grown,
+indexing resumes from the last indexed byte rather than starting over.
+
+    offset, row = seek_time("session.msl", 1234.5)
+    rows = read_rows("session.msl", 1234.5, count=200)
+"""
+import bisect
+import os
+import struct
+
+# --- CONFIG ---
+INTERVAL = 1.0          # seconds of log time between index entries
+HEADER_LINES = 4        # title, capture date, channel names, units
+TIME_COLUMN = "Time"
+
+MAGIC = b'MSLI'
+VERSION = 1
+# magic, version, time column, interval, data start, indexed end, rows indexed, last entry time
+_HEADER = struct.Struct('<4sHHdQQQd')
+_ENTRY = struct.Struct('<dQQ')          # time, row, byte offset
+
+
+def index_path(log_path):
+    return log_path + ".idx"
+
+def _read_log_header(f):
+    """Return (channel names, byte offset of the first data row) or None if incomplete."""
+    f.seek(0)
+    lines = [f.readline() for _ in range(HEADER_LINES)]
+    if not lines[-1].endswith(b"\n"):
+        return None
+    names = lines[2].decode('utf-8', 'replace').strip().split("\t")
+    return names, f.tell()
+
+def _row_time(line, col):
+    cols = line.split(b"\t")
+    try:
+        return float(cols[col])
+    except (IndexError, ValueError):
+        return None
+
+
+class LogIndex:
+
+    def __init__(self, log_path, interval=INTERVAL):
+        self.log_path = log_path
+        self.path = index_path(log_path)
+        self.interval = interval
+        self.times = []
+        self.rows = []
+        self.offsets = []
+        self.time_col = 0
+        self.data_start = 0
+        self.indexed_end = 0
+        self.row_count = 0
+        self.last_time = float('-inf')
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+            (magic, version, self.time_col, interval, self.data_start, self.indexed_end,
+             self.row_count, self.last_time) = _HEADER.unpack_from(data)
+        except (OSError, struct.error):
+            return
+        if (magic != MAGIC or version != VERSION or interval != self.interval
+                or self.indexed_end > os.path.getsize(self.log_path)):
+            # Stale, or the log was replaced by a shorter one: rebuild
+            self.indexed_end = self.row_count = 0
+            self.last_time = float('-inf')
+            return
+        for t, row, offset in _ENTRY.iter_unpack(data[_HEADER.size:]):
+            self.times.append(t)
+            self.rows.append(row)
+            self.offsets.append(offset)
+
+    def update(self):
+        """Index whatever was appended to the log since the last update."""
+        with open(self.log_path, "rb") as log:
+            if not self.indexed_end:
+                header = _read_log_header(log)
+                if header is None:
+                    return 0
+                names, self.data_start = header
+                self.time_col = names.index(TIME_COLUMN) if TIME_COLUMN in names else 0
+                self.indexed_end = self.data_start
+                self.times, self.rows, self.offsets = [], [], []
+            log.seek(self.indexed_end)
+
+            new = []
+            pos = self.indexed_end
+            row = self.row_count
+            next_time = self.last_time + self.interval
+            for line in log:
+                if not line.endswith(b"\n"):
+                    break  # partial row being written; index it next time
+                t = _row_time(line, self.time_col)
+                if t is not None:
+                    if t >= next_time:
+                        new.append((t, row, pos))
+                        self.last_time = t
+                        next_time = t + self.interval
+                    row += 1
+                pos += len(line)
+
+        self.indexed_end = pos
+        self.row_count = row
+        for t, r, offset in new:
+            self.times.append(t)
+            self.rows.append(r)
+            self.offsets.append(offset)
+        self._save(new)
+        return len(new)
+
+    def _save(self, new):
+        header = _HEADER.pack(MAGIC, VERSION, self.time_col, self.interval, self.data_start,
+                              self.indexed_end, self.row_count, self.last_time)
+        entries = b''.join(_ENTRY.pack(*e) for e in new)
+        if os.path.exists(self.path) and len(new) != len(self.times):
+            # Incremental: append the new entries, then rewrite the header
+            with open(self.path, "r+b") as f:
+                f.seek(0, os.SEEK_END)
+                f.write(entries)
+                f.seek(0)
+                f.write(header)
+        else:
+            with open(self.path, "wb") as f:
+                f.write(header + entries)
+
+    def locate(self, t):
+        """(byte offset, row) of the last index entry at or before time t."""
+        i = bisect.bisect_right(self.times, t) - 1
+        if i < 0:
+            return self.data_start, 0
+        return self.offsets[i], self.rows[i]
+
+
+def build_index(log_path, interval=INTERVAL):
+    """Create or incrementally extend the sidecar index; returns the LogIndex."""
+    index = LogIndex(log_path, interval)
+    index.update()
+    return index
+
+def seek_time(log_path, t, index=None):
+    """Byte offset and row number of the first row with time >= t."""
+    index = index or build_index(log_path)
+    offset, row = index.locate(t)
+    with open(log_path, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            row_t = _row_time(line, index.time_col)
+            if row_t is not None:
+                if row_t >= t:
+                    return offset, row
+                row += 1
+            offset += len(line)
+    return offset, row
+
+def read_rows(log_path, t, count=100, index=None):
+    """Read `count` rows starting at log time t, touching only those bytes."""
+    offset, _ = seek_time(log_path, t, index)
+    rows = []
+    with open(log_path, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            line = line.decode('utf-8', 'replace').strip()
+            if line:
+                rows.append(line.split("\t"))
+            if len(rows) >= count:
+                break
+    return rows
+
+
+# --- MAIN ---
+if __name__ == "__main__":
+    import sys
+    idx = build_index(sys.argv[1])
+    print(f"{len(idx.times)} index entries over {idx.row_count} rows "
+          f"({os.path.getsize(idx.path)} bytes)")
@@ -0,0 +1,377 @@
+# ms_bench.py
+"""
+End-to-end benchmarks for the dash pipeline, with no hardware attached.
+
+Each stage runs on its own against in-memory fakes, then the whole
+poll -> decode -> render -> flush loop runs as one:
+
+    decode_words    bytes_to_words_le + try_map_common (MS_Decoder)
+    decode_layout   ChannelLayout.decode of a full outpc block
+    render_text     draw.text + oled.image + full oled.show() (the old path)
+    render_glyph    glyph-atlas draw_centered + DirtyRenderer partial flush
+    render_sh1106   testdashcode_r3's atlas paste + luma-style display()
+    render_layout   three-gauge page from dash_layout.json + partial flush
+    poll            one framed Transport round-trip on a fake serial port
+    loop            poll + decode + format + render, as newMScode does it
+
+Frames come from the simulator's synthetic engine or a recorded log, and
+the fake serial port answers with them framed exactly as the ECU would.
+Per stage, p50/p99 latency, frames per second and allocations per frame
+are printed and saved as JSON; --compare shows the change against an
+earlier run.
+
+    python MS_Bench.py --out bench_v2.json --compare bench_v1.json
+    python MS_Bench.py --replay track.msl --stages poll,loop --frames 5000
+"""
+import gc
+import json
+import os
+import platform
+import struct
+import sys
+import time
+import tracemalloc
+from PIL import Image, ImageDraw, ImageFont
+from Glyph_Cache import GlyphAtlas
+from MS_Channels import default_layout
+from MS_Simulator import SyntheticSource, ReplaySource, SIGNATURE
+from MS_Transport import Transport, frame
+from OLED_Renderer import DirtyRenderer
+from OLED_Layout import load_layout
+
+# --- CONFIG ---
+FRAMES = 2000          # timed iterations per stage
+WARMUP = 50
+ALLOC_FRAMES = 200     # iterations of the (slower) tracemalloc pass
+RECORDED_FRAMES = 500  # distinct ECU blocks cycled through
+FONT_PATH = "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"
+OUT_PATH = "bench_results.json"
+LAYOUT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dash_layout.json")
+
+
+# --- FAKES ---
+class FakeSerial:
+    """
+    pyserial stand-in that answers newserial requests from recorded
+    blocks, one block per realtime request, cycling at the end.
+    """
+
+    def __init__(self, blocks, signature=SIGNATURE, timeout=0.2):
+        self.blocks = blocks
+        self.signature = signature.encode('latin-1')
+        self.timeout = timeout
+        self.index = 0
+        self._rx = bytearray()
+
+    def write(self, data):
+        payload = data[2:-4]
+        if payload[:1] == b'A':
+            block = self.blocks[self.index % len(self.blocks)]
+            self.index += 1
+            self._rx += frame(b'\x01' + block)
+        elif payload[:1] == b'r':
+            _, _, _, offset, length = struct.unpack('>cBBHH', payload)
+            block = self.blocks[self.index % len(self.blocks)]
+            self.index += 1
+            self._rx += frame(b'\x01' + block[offset:offset + length])
+        elif payload[:1] == b'Q':
+            self._rx += frame(b'\x00' + self.signature)
+        return len(data)
+
+    def read(self, n):
+        data = bytes(self._rx[:n])
+        del self._rx[:n]
+        return data
+
+    def reset_input_buffer(self):
+        self._rx.clear()
+
+
+class FakeI2CDevice:
+    """Counts bytes written, like adafruit_bus_device.I2CDevice."""
+
+    def __init__(self):
+        self.bytes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def write(self, buf, start=0, end=None):
+        self.bytes += (len(buf) if end is None else end) - start
+
+
+class FakeSSD1306:
+    """
+    adafruit_ssd1306.SSD1306_I2C framebuffer: page-major bytes behind a
+    control byte, image() copies pixel by pixel as the driver does.
+    """
+
+    def __init__(self, width=128, height=32):
+        self.width = width
+        self.height = height
+        self.pages = height // 8
+        self.buffer = bytearray(self.pages * width + 1)
+        self.buffer[0] = 0x40
+        self.buf = memoryview(self.buffer)[1:]
+        self.i2c_device = FakeI2CDevice()
+        self.commands = 0
+
+    def write_cmd(self, cmd):
+        self.commands += 1
+        self.i2c_device.write(bytes((0x80, cmd)))
+
+    def fill(self, color):
+        self.buf[:] = (b'\xff' if color else b'\x00') * len(self.buf)
+
+    def image(self, image):
+        self.fill(0)
+        pixels = image.load()
+        buf, w = self.buf, self.width
+        for y in range(self.height):
+            bit = 1 << (y & 7)
+            row = (y >> 3) * w
+            for x in range(w):
+                if pixels[x, y]:
+                    buf[row + x] |= bit
+
+    def show(self):
+        for cmd in (0x21, 0, self.width - 1, 0x22, 0, self.pages - 1):
+            self.write_cmd(cmd)
+        with self.i2c_device:
+            self.i2c_device.write(self.buffer)
+
+
+class FakeSH1106:
+    """luma.oled sh1106 device: display(image) packs and sends page by page."""
+
+    def __init__(self, width=128, height=64):
+        self.width = width
+        self.height = height
+        self.mode = '1'
+        self.size = (width, height)
+        self.i2c_device = FakeI2CDevice()
+
+    def display(self, image):
+        pixels = image.load()
+        w = self.width
+        buf = bytearray(w)
+        for page in range(self.height // 8):
+            # Page address, then column 2 (the SH1106's 132-column offset)
+            self.i2c_device.write(bytes((0xB0 | page, 0x02, 0x10)))
+            top = page * 8
+            for x in range(w):
+                byte = 0
+                for bit in range(8):
+                    if pixels[x, top + bit]:
+                        byte |= 1 << bit
+                buf[x] = byte
+            self.i2c_device.write(buf)
+
+
+# --- FRAMES ---
+def recorded_blocks(layout, replay=None, count=RECORDED_FRAMES):
+    """Realtime blocks from a recorded log, or from the synthetic engine at 50 Hz."""
+    if replay:
+        return ReplaySource(layout, replay).blocks[:count]
+    source = SyntheticSource(layout)
+    return [source.block(i * 0.02) for i in range(count)]
+
+
+# --- MEASUREMENT ---
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, int(round(p / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+def measure(step, frames=FRAMES, warmup=WARMUP, alloc_frames=ALLOC_FRAMES):
+    """
+    Time step(i) per frame, then repeat a shorter pass under tracemalloc.
+    CPython keeps no cumulative allocation counter, so allocations are
+    reported as the transient peak bytes each frame needs on top of what
+    was live before it, plus the net blocks it leaves behind (should be ~0).
+    """
+    for i in range(warmup):
+        step(i)
+    clock = time.perf_counter_ns
+    times = []
+    start = clock()
+    for i in range(frames):
+        t = clock()
+        step(i)
+        times.append(clock() - t)
+    total = clock() - start
+
+    tracemalloc.start()
+    peak_bytes = 0
+    gc.collect()  # count only what a frame keeps alive, not pending cycles
+    blocks_before = sys.getallocatedblocks()
+    for i in range(alloc_frames):
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        step(i)
+        _, peak = tracemalloc.get_traced_memory()
+        peak_bytes += peak - before
+    gc.collect()
+    blocks = sys.getallocatedblocks() - blocks_before
+    tracemalloc.stop()
+
+    times.sort()
+    mean = total / frames
+    return {
+        'frames': frames,
+        'p50_us': percentile(times, 50) / 1000.0,
+        'p99_us': percentile(times, 99) / 1000.0,
+        'mean_us': mean / 1000.0,
+        'fps': 1e9 / mean if mean else 0.0,
+        'alloc_bytes_per_frame': peak_bytes / alloc_frames,
+        'net_blocks_per_frame': blocks / alloc_frames,
+    }
+
+
+# --- STAGES ---
+def build_stages(blocks, layout):
+    """{name: step(i)} closures over shared fakes, like the real scripts wire them."""
+    stages = {}
+    try:
+        from MS_Decoder import bytes_to_words_le, try_map_common
+    except ImportError as e:   # pyserial missing on a desktop
+        print(f"decode_words skipped: {e}")
+    else:
+        stages['decode_words'] = lambda i: try_map_common(bytes_to_words_le(blocks[i % len(blocks)]))
+
+    stages['decode_layout'] = lambda i: layout.decode(blocks[i % len(blocks)])
+
+    font_label = ImageFont.load_default()
+    if os.path.exists(FONT_PATH):
+        font_value = ImageFont.truetype(FONT_PATH, 16)
+    else:
+        font_value = ImageFont.load_default()
+    label_glyphs = GlyphAtlas(font_label, "")
+    value_glyphs = GlyphAtlas(font_value)
+    bbox = font_label.getbbox("Ag")
+    value_y = bbox[3] - bbox[1]
+    values = [f"{int(layout.decode(b)['rpm'])}" for b in blocks]
+
+    text_oled = FakeSSD1306()
+    text_image = Image.new('1', (128, 32))
+    text_draw = ImageDraw.Draw(text_image)
+
+    def render_text(i):
+        value = values[i % len(values)]
+        text_draw.rectangle((0, 0, 127, 31), fill=0)
+        w = text_draw.textlength("RPM", font=font_label)
+        text_draw.text(((128 - w) // 2, 0), "RPM", font=font_label, fill=255)
+        w = text_draw.textlength(value, font=font_value)
+        text_draw.text(((128 - w) // 2, value_y), value, font=font_value, fill=255)
+        text_oled.image(text_image)
+        text_oled.show()
+    stages['render_text'] = render_text
+
+    renderer = DirtyRenderer(FakeSSD1306(), 128, 32)
+
+    def draw_centered(image, label, value):
+        label_glyphs.paste_centered(image, label, 0)
+        value_glyphs.draw_centered(image, value, value_y)
+
+    def render_glyph(i):
+        value = values[i % len(values)]
+        renderer.render(("RPM", value), lambda draw: draw_centered(renderer.image, "RPM", value))
+    stages['render_glyph'] = render_glyph
+
+    sh1106 = FakeSH1106()
+    sh_image = Image.new(sh1106.mode, sh1106.size)
+    sh_label = GlyphAtlas(font_label, "")
+    sh_value = GlyphAtlas(font_value)
+
+    def render_sh1106(i):
+        sh_image.paste(0, (0, 0) + sh1106.size)
+        sh_label.paste_centered(sh_image, "RPM", 0)
+        sh_value.draw_centered(sh_image, values[i % len(values)], 16)
+        sh1106.display(sh_image)
+    stages['render_sh1106'] = render_sh1106
+
+    dash = load_layout(LAYOUT_PATH if os.path.exists(LAYOUT_PATH) else None, 128, 32)
+    page = max(dash.pages, key=lambda p: len(p.gauges))
+    decoded = [layout.decode(b) for b in blocks]
+    page_values = [{'RPM': d['rpm'], 'AFR': d['afr1'], 'TPS': d['tps'], 'Coolant': d['coolant'],
+                    'MAT': d['mat'], 'GPS': 0.0} for d in decoded]
+    layout_renderer = DirtyRenderer(FakeSSD1306(), 128, 32)
+
+    def render_layout(i):
+        state = page.state(page_values[i % len(page_values)])
+        if layout_renderer.draw_frame(state, lambda draw: page.paint(layout_renderer.image,
+                                                                     draw, state)):
+            layout_renderer.flush()
+    stages['render_layout'] = render_layout
+
+    transport = Transport(FakeSerial(blocks))
+    stages['poll'] = lambda i: transport.read_realtime()
+
+    loop_transport = Transport(FakeSerial(blocks))
+    loop_renderer = DirtyRenderer(FakeSSD1306(), 128, 32)
+
+    def loop(i):
+        data = layout.decode(loop_transport.read_realtime())
+        value = f"{int(data['rpm'])}"
+        loop_renderer.render(("RPM", value),
+                             lambda draw: draw_centered(loop_renderer.image, "RPM", value))
+    stages['loop'] = loop
+    return stages
+
+
+def run(stage_names=None, frames=FRAMES, replay=None):
+    layout = default_layout()
+    blocks = recorded_blocks(layout, replay)
+    stages = build_stages(blocks, layout)
+    results = {}
+    for name, step in stages.items():
+        if stage_names and name not in stage_names:
+            continue
+        results[name] = measure(step, frames)
+    return {
+        'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'node': platform.node(),
+        'source': replay or "synthetic",
+        'stages': results,
+    }
+
+
+def print_report(report, baseline=None):
+    old = baseline['stages'] if baseline else {}
+    print(f"{'stage':15s} {'p50 us':>9s} {'p99 us':>9s} {'fps':>9s} "
+          f"{'alloc B':>9s} {'blocks':>7s}" + ("  p50 vs baseline" if old else ""))
+    for name, r in report['stages'].items():
+        line = (f"{name:15s} {r['p50_us']:9.1f} {r['p99_us']:9.1f} {r['fps']:9.0f} "
+                f"{r['alloc_bytes_per_frame']:9.0f} {r['net_blocks_per_frame']:7.2f}")
+        if name in old and old[name]['p50_us']:
+            change = (r['p50_us'] / old[name]['p50_us'] - 1) * 100
+            line += f"  {change:+6.1f}%"
+        print(line)
+
+
+# --- MAIN ---
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Benchmark decode, render and poll stages")
+    parser.add_argument("--frames", type=int, default=FRAMES)
+    parser.add_argument("--stages", help="comma-separated subset of stages")
+    parser.add_argument("--replay", metavar="LOG", help=".msl/.mlg log to take frames from")
+    parser.add_argument("--out", default=OUT_PATH, help="JSON results file")
+    parser.add_argument("--compare", metavar="JSON", help="earlier results to compare against")
+    args = parser.parse_args()
+
+    report = run(args.stages.split(",") if args.stages else None, args.frames, args.replay)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved to {args.out}")
@@ -0,0 +1,177 @@
+# ms_capture.py
+"""
+Raw frame capture: the exact bytes the ECU sent, for chasing decode bugs.
+
+The capture file is allocated to its full size up front and memory
+mapped, and frames are appended into the mapping: no file growth, no
+write() calls, no formatting in the poll loop. A record's payload is
+copied in first and its header last, and the unused tail is zeros, so a
+zero length marks the end even if the poller dies without close().
+
+File format (little endian):
+    header  'MSCP' u16 version, u16 header size, u64 bytes used (set on
+            close, 0 while capturing), f64 wall-clock start
+    record  f64 monotonic timestamp, u16 length, then the frame bytes
+
+    capture = FrameCapture("ecu.cap")
+    capture.write(reply)                  # in the poll loop
+    capture.close()
+
+    python MS_Decoder.py ecu.cap          # batch decode to ecu.npz
+    python MS_Simulator.py --replay ecu.cap
+    python MS_Capture.py ecu.cap          # summary
+"""
+import mmap
+import os
+import struct
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# --- CONFIG ---
+CAPTURE_BYTES = 64 * 1024 * 1024   # about 100 minutes of 212-byte frames at 50 Hz
+
+MAGIC = b'MSCP'
+VERSION = 1
+_HEADER = struct.Struct('<4sHHQd')
+_RECORD = struct.Struct('<dH')
+
+
+class FrameCapture:
+
+    def __init__(self, path, size=CAPTURE_BYTES):
+        self.path = path
+        self.size = size
+        self._file = open(path, 'w+b')
+        fd = self._file.fileno()
+        if hasattr(os, 'posix_fallocate'):
+            os.posix_fallocate(fd, 0, size)   # reserve real blocks, not a sparse file
+        else:
+            self._file.truncate(size)
+        self.mm = mmap.mmap(fd, size)
+        _HEADER.pack_into(self.mm, 0, MAGIC, VERSION, _HEADER.size, 0, time.time())
+        self.pos = _HEADER.size
+        self.records = 0
+        self.dropped = 0
+
+    # --- hot path ---
+    def write(self, frame, timestamp=None):
+        """Append one frame; False (and counted in .dropped) once the file is full."""
+        pos = self.pos
+        start = pos + _RECORD.size
+        end = start + len(frame)
+        if end > self.size:
+            self.dropped += 1
+            return False
+        mm = self.mm
+        mm.seek(start)
+        mm.write(frame)
+        _RECORD.pack_into(mm, pos, time.monotonic() if timestamp is None else timestamp,
+                          len(frame))
+        self.pos = end
+        self.records += 1
+        return True
+
+    def close(self):
+        """Record the used length and trim the file to it."""
+        if self.mm.closed:
+            return
+        struct.pack_into('<Q', self.mm, 8, self.pos)
+        self.mm.flush()
+        self.mm.close()
+        self._file.truncate(self.pos)
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# --- READING ---
+def is_capture(path):
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+def _load(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, version, header_size, used, started = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a frame capture")
+    return data, header_size, used or len(data), started
+
+def iter_records(data, pos, end):
+    """(timestamp, memoryview of the frame) for every record up to the terminator."""
+    view = memoryview(data)
+    while pos + _RECORD.size <= end:
+        t, n = _RECORD.unpack_from(data, pos)
+        if n == 0:
+            break
+        pos += _RECORD.size
+        if pos + n > end:
+            break  # torn last record
+        yield t, view[pos:pos + n]
+        pos += n
+
+def read_capture(path):
+    """Timestamps and frames (bytes) of a capture, plus its wall-clock start."""
+    data, pos, end, started = _load(path)
+    times, frames = [], []
+    for t, frame in iter_records(data, pos, end):
+        times.append(t)
+        frames.append(bytes(frame))
+    return times, frames, started
+
+def capture_array(path, frame_size=None):
+    """
+    Timestamps (float64) and frames as an (n, frame_size) uint8 array.
+    frame_size defaults to the first frame's length. A capture of
+    equal-length frames, the usual case, is read as one strided NumPy view
+    with no per-record loop; otherwise records are walked, frames shorter
+    than frame_size are skipped and longer ones cut to it.
+    """
+    data, pos, end, _ = _load(path)
+    if pos + _RECORD.size > end or _RECORD.unpack_from(data, pos)[1] == 0:
+        size = frame_size or 0
+        return np.zeros(0), np.zeros((0, size), dtype=np.uint8)
+    first = _RECORD.unpack_from(data, pos)[1]
+    size = frame_size or first
+    if size <= first:
+        stride = _RECORD.size + first
+        dtype = np.dtype({'names': ['time', 'length', 'frame'],
+                          'formats': ['<f8', '<u2', ('u1', first)],
+                          'offsets': [0, 8, _RECORD.size], 'itemsize': stride})
+        records = np.frombuffer(data, dtype=dtype, count=(end - pos) // stride, offset=pos)
+        bad = np.flatnonzero(records['length'] != first)
+        # Uniform up to the zero-length terminator (or the end of the file)
+        if not len(bad) or records['length'][bad[0]] == 0:
+            records = records[:bad[0]] if len(bad) else records
+            return records['time'].copy(), np.ascontiguousarray(records['frame'][:, :size])
+    times, frames = [], []
+    for t, frame in iter_records(data, pos, end):
+        if len(frame) >= size:
+            times.append(t)
+            frames.append(np.frombuffer(frame, dtype=np.uint8, count=size))
+    if not frames:
+        return np.zeros(0), np.zeros((0, size), dtype=np.uint8)
+    return np.array(times), np.stack(frames)
+
+
+# --- MAIN ---
+if __name__ == "__main__":
+    import sys
+    from collections import Counter
+    times, frames, started = read_capture(sys.argv[1])
+    span = times[-1] - times[0] if times else 0.0
+    print(f"{len(frames)} frames over {span:.1f}s, started "
+          f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(started))}")
+    for length, count in Counter(len(f) for f in frames).most_common():
+        print(f"  {count} x {length} bytes")
@@ -0,0 +1,583 @@
+# ms_channels.py
+"""
+INI-driven realtime decoder for MS2/Extra.
+
+Reads the channel definitions from the [OutputChannels] section of the
+firmware's TunerStudio INI and compiles them once into a precompiled
+struct.Struct plus a scale/translate table, so a whole realtime block is
+decoded in a single call.
+
+    layout = load_ini("/home/pi/mainController.ini")
+    values = layout.decode(reply)     # {'rpm': 850, 'coolant': 82.3, ...}
+
+load_cached() keeps the compiled layout on disk, keyed by ECU signature
+and INI hash, so later boots skip INI parsing entirely.
+"""
+import ast
+import hashlib
+import operator
+import os
+import re
+import struct
+import time
+
+# --- INI TYPE CODES -> struct format characters ---
+TYPE_CODES = {
+    'U08': 'B', 'S08': 'b',
+    'U16': 'H', 'S16': 'h',
+    'U32': 'I', 'S32': 'i',
+    'F32': 'f',
+}
+
+# Minimal MS2/Extra 3.x outpc layout, used when no INI is available
+DEFAULT_INI = """
+[MegaTune]
+   endianness = big
+
+[OutputChannels]
+   ochBlockSize     = 212
+   seconds          = scalar, U16,    0, "s",     1.000, 0.0
+   pulseWidth1      = scalar, U16,    2, "ms",    0.000666, 0.0
+   pulseWidth2      = scalar, U16,    4, "ms",    0.000666, 0.0
+   rpm              = scalar, U16,    6, "RPM",   1.000, 0.0
+   advance          = scalar, S16,    8, "deg",   0.100, 0.0
+   squirt           = scalar, U08,   10, "bit",   1.000, 0.0
+   engine           = scalar, U08,   11, "bit",   1.000, 0.0
+   ready            = bits,   U08,   11, [0:0]
+   crank            = bits,   U08,   11, [1:1]
+   afrtgt1          = scalar, U08,   12, "AFR",   0.100, 0.0
+   afrtgt2          = scalar, U08,   13, "AFR",   0.100, 0.0
+   barometer        = scalar, S16,   16, "kPa",   0.100, 0.0
+   map              = scalar, S16,   18, "kPa",   0.100, 0.0
+   mat              = scalar, S16,   20, "C",     0.05555, -320.0
+   coolant          = scalar, S16,   22, "C",     0.05555, -320.0
+   tps              = scalar, S16,   24, "%",     0.100, 0.0
+   batteryVoltage   = scalar, S16,   26, "v",     0.100, 0.0
+   afr1             = scalar, S16,   28, "AFR",   0.100, 0.0
+   afr2             = scalar, S16,   30, "AFR",   0.100, 0.0
+   knock            = scalar, S16,   32, "%",     0.100, 0.0
+   egoCorrection1   = scalar, S16,   34, "%",     0.100, 0.0
+   egoCorrection2   = scalar, S16,   36, "%",     0.100, 0.0
+   airCorrection    = scalar, S16,   38, "%",     0.100, 0.0
+   warmupEnrich     = scalar, S16,   40, "%",     1.000, 0.0
+   accelEnrich      = scalar, S16,   42, "ms",    0.100, 0.0
+   tpsfuelcut       = scalar, S16,   44, "%",     1.000, 0.0
+   baroCorrection   = scalar, S16,   46, "%",     0.100, 0.0
+   gammaEnrich      = scalar, S16,   48, "%",     1.000, 0.0
+   veCurr1          = scalar, S16,   50, "%",     0.100, 0.0
+   veCurr2          = scalar, S16,   52, "%",     0.100, 0.0
+   iacstep          = scalar, S16,   54, "step",  1.000, 0.0
+   coldAdvDeg       = scalar, S16,   56, "deg",   0.100, 0.0
+   TPSdot           = scalar, S16,   58, "%/s",   0.100, 0.0
+   MAPdot           = scalar, S16,   60, "kPa/s", 1.000, 0.0
+   dwell            = scalar, S16,   62, "ms",    0.100, 0.0
+   mafmap           = scalar, S16,   64, "kPa",   0.100, 0.0
+   fuelload         = scalar, S16,   66, "%",     0.100, 0.0
+   fuelCorrection   = scalar, S16,   68, "%",     1.000, 0.0
+   portStatus       = scalar, U08,   70, "bit",   1.000, 0.0
+   knockRetard      = scalar, U08,   71, "deg",   0.100, 0.0
+   EAEfcor1         = scalar, U16,   72, "%",     1.000, 0.0
+   egoV1            = scalar, S16,   74, "V",     0.01,  0.0
+   egoV2            = scalar, S16,   76, "V",     0.01,  0.0
+   status1          = scalar, U08,   78, "",      1.000, 0.0
+   status2          = scalar, U08,   79, "",      1.000, 0.0
+   status3          = scalar, U08,   80, "",      1.000, 0.0
+   status4          = scalar, U08,   81, "",      1.000, 0.0
+   looptime         = scalar, U16,   82, "us",    1.000, 0.0
+   status5          = scalar, U16,   84, "",      1.000, 0.0
+   tpsADC           = scalar, U16,   86, "ADC",   1.000, 0.0
+   fuelload2        = scalar, S16,   88, "%",     0.100, 0.0
+   ignload          = scalar, S16,   90, "%",     0.100, 0.0
+   ignload2         = scalar, S16,   92, "%",     0.100, 0.0
+"""
+
+CACHE_DIR = os.path.expanduser("~/.cache/msdash")
+CACHE_MAX_AGE = 30 * 24 * 3600    # cache files not used for this long are removed
+CACHE_MAGIC = b'MSLC'
+CACHE_VERSION = 1
+
+_TYPE_LIST = list(TYPE_CODES)
+_CACHE_HEADER = struct.Struct('>4sBBHH32s')   # magic, version, endian, block size, count, key
+_CACHE_RECORD = struct.Struct('>BHddBBB')      # type, offset, scale, translate, has bits, lo, hi
+
+_SECTION = re.compile(r'^\[(\w+)\]')
+_BITS = re.compile(r'\[\s*(\d+)\s*:\s*(\d+)\s*\]')
+
+
+# --- INI PARSING ---
+def _strip_comment(line):
+    """Drop a trailing ';' comment, ignoring ';' inside quotes."""
+    quoted = False
+    for i, c in enumerate(line):
+        if c == '"':
+            quoted = not quoted
+        elif c == ';' and not quoted:
+            return line[:i]
+    return line
+
+def _split_fields(rhs):
+    """Split an INI value on commas, keeping quoted strings and [a:b] intact."""
+    fields, cur, depth, quoted = [], [], 0, False
+    for c in rhs:
+        if c == '"':
+            quoted = not quoted
+        elif not quoted and c in '[{':
+            depth += 1
+        elif not quoted and c in ']}':
+            depth -= 1
+        if c == ',' and not quoted and depth == 0:
+            fields.append(''.join(cur).strip())
+            cur = []
+        else:
+            cur.append(c)
+    fields.append(''.join(cur).strip())
+    return fields
+
+_OPERATORS = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul,
+              ast.Div: operator.truediv, ast.Pow: operator.pow,
+              ast.USub: operator.neg, ast.UAdd: operator.pos}
+
+def _constant(node):
+    """Value of an arithmetic expression over number literals only."""
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+        return node.value
+    if isinstance(node, ast.BinOp) and type(node.op) in _OPERATORS:
+        return _OPERATORS[type(node.op)](_constant(node.left), _constant(node.right))
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _OPERATORS:
+        return _OPERATORS[type(node.op)](_constant(node.operand))
+    raise ValueError("not a constant expression")
+
+def _number(s, default):
+    """
+    Parse a numeric INI field. Constant expressions like { 1/10 } are
+    evaluated; an empty field is `default`; anything else (an expression
+    over other INI symbols) is None.
+    """
+    if s is None or not s.strip():
+        return default
+    s = s.strip()
+    if s.startswith('{') and s.endswith('}'):
+        s = s[1:-1].strip()
+    try:
+        return float(s)
+    except ValueError:
+        pass
+    try:
+        return float(_constant(ast.parse(s, mode='eval').body))
+    except (SyntaxError, ValueError, TypeError, ZeroDivisionError, OverflowError):
+        return None
+
+def parse_ini(text, settings=()):
+    """
+    Parse [OutputChannels] from INI text.
+    Returns (channels, endianness, block_size) where channels is a list of
+    (name, type_code, offset, units, scale, translate, bits) tuples.
+    `settings` is the set of #set symbols used to resolve #if blocks.
+    """
+    settings = set(settings)
+    channels = []
+    endian = 'big'
+    block_size = None
+    section = None
+    # stack of (taking_this_branch, any_branch_taken)
+    cond = []
+
+    for raw in text.splitlines():
+        line = _strip_comment(raw).strip()
+        if not line:
+            continue
+
+        if line.startswith('#'):
+            words = line[1:].split()
+            directive = words[0] if words else ''
+            if directive == 'if':
+                take = len(words) > 1 and words[1] in settings
+                cond.append((take, take))
+            elif directive == 'elif' and cond:
+                _, taken = cond[-1]
+                take = not taken and len(words) > 1 and words[1] in settings
+                cond[-1] = (take, taken or take)
+            elif directive == 'else' and cond:
+                _, taken = cond[-1]
+                cond[-1] = (not taken, True)
+            elif directive == 'endif' and cond:
+                cond.pop()
+            elif directive in ('set', 'unset') and len(words) > 1:
+                if not all(take for take, _ in cond):
+                    continue  # inside a branch that is not taken
+                if directive == 'set':
+                    settings.add(words[1])
+                else:
+                    settings.discard(words[1])
+            continue
+
+        if not all(take for take, _ in cond):
+            continue
+
+        m = _SECTION.match(line)
+        if m:
+            section = m.group(1)
+            continue
+
+        if '=' not in line:
+            continue
+        name, rhs = (p.strip() for p in line.split('=', 1))
+
+        if name == 'endianness':
+            endian = rhs.strip().lower()
+            continue
+        if section != 'OutputChannels':
+            continue
+        if name == 'ochBlockSize':
+            block_size = int(_number(rhs, 0) or 0)
+            continue
+
+        fields = _split_fields(rhs)
+        kind = fields[0].lower()
+        if kind not in ('scalar', 'bits') or len(fields) < 3:
+            continue  # expressions {…} and unknown entries are not in the block
+        type_code = fields[1].upper()
+        if type_code not in TYPE_CODES:
+            continue
+        try:
+            offset = int(fields[2])
+        except ValueError:
+            continue
+
+        if kind == 'bits':
+            m = _BITS.search(fields[3]) if len(fields) > 3 else None
+            if not m:
+                continue
+            lo, hi = int(m.group(1)), int(m.group(2))
+            channels.append((name, type_code, offset, '', 1.0, 0.0, (lo, hi)))
+        else:
+            units = fields[3].strip('"') if len(fields) > 3 else ''
+            scale_ = _number(fields[4], 1.0) if len(fields) > 4 else 1.0
+            translate = _number(fields[5], 0.0) if len(fields) > 5 else 0.0
+            if scale_ is None or translate is None:
+                # Guessing 1.0 would decode it 10x or 100x off without a word
+                print(f"Skipping channel {name}: scale/translate "
+                      f"{', '.join(fields[4:6])} is not a constant")
+                continue
+            channels.append((name, type_code, offset, units, scale_, translate, None))
+
+    return channels, endian, block_size
+
+
+# --- COMPILED LAYOUT ---
+class ChannelLayout:
+    """
+    A compiled set of output channels.
+
+    Every distinct (offset, type) slot is unpacked by one precompiled
+    struct.Struct; overlapping slots (e.g. a U16 and a U08 inside it) go
+    into an extra pass. Channels then index into the unpacked tuple and
+    apply (raw + translate) * scale, the TunerStudio convention.
+    """
+
+    def __init__(self, channels, endian='big', block_size=None):
+        self.channels = list(channels)
+        self.endian = endian
+        self.names = [c[0] for c in self.channels]
+        self.units = {c[0]: c[3] for c in self.channels}
+        order = '>' if endian == 'big' else '<'
+
+        # Unique slots, packed into as few non-overlapping passes as possible
+        slots = sorted({(c[2], c[1]) for c in self.channels})
+        passes = []  # each: list of (offset, type_code), end offset
+        for offset, type_code in slots:
+            size = struct.calcsize(TYPE_CODES[type_code])
+            for p in passes:
+                if p[1] <= offset:
+                    p[0].append((offset, type_code))
+                    p[1] = offset + size
+                    break
+            else:
+                passes.append([[(offset, type_code)], offset + size])
+
+        self.structs = []
+        slot_index = {}
+        base = 0
+        for members, _ in passes:
+            fmt, pos = order, 0
+            for offset, type_code in members:
+                if offset > pos:
+                    fmt += f'{offset - pos}x'
+                fmt += TYPE_CODES[type_code]
+                pos = offset + struct.calcsize(TYPE_CODES[type_code])
+                slot_index[(offset, type_code)] = base
+                base += 1
+            self.structs.append(struct.Struct(fmt))
+
+        self.min_size = max((s.size for s in self.structs), default=0)
+        self.block_size = block_size or self.min_size
+
+        # Scale table: plain scalars and bitfields are kept apart so the
+        # common case is a tight zip with no per-channel branching.
+        self._scalars = []
+        self._bits = []
+        for name, type_code, offset, _, scale_, translate, bits in self.channels:
+            idx = slot_index[(offset, type_code)]
+            if bits is None:
+                self._scalars.append((name, idx, scale_, translate))
+            else:
+                lo, hi = bits
+                self._bits.append((name, idx, lo, (1 << (hi - lo + 1)) - 1))
+
+        # Inverse table for encode(): one single-value struct per channel
+        self._packers = []
+        for name, type_code, offset, _, scale_, translate, bits in self.channels:
+            packer = struct.Struct(order + TYPE_CODES[type_code])
+            if type_code == 'F32':
+                limits = None
+            else:
+                span = 1 << (8 * packer.size)
+                signed = type_code.startswith('S')
+                limits = (-span // 2, span // 2 - 1) if signed else (0, span - 1)
+            self._packers.append((name, packer, offset, scale_, translate, bits, limits))
+
+    def __len__(self):
+        return len(self.channels)
+
+    def __contains__(self, name):
+        return name in self.units
+
+    def unpack(self, block):
+        """Return the raw slot values of a realtime block as one tuple."""
+        if len(self.structs) == 1:
+            return self.structs[0].unpack_from(block)
+        raw = ()
+        for s in self.structs:
+            raw += s.unpack_from(block)
+        return raw
+
+    def decode(self, block):
+        """Decode every channel of a realtime block into a {name: value} dict."""
+        if len(block) < self.min_size:
+            return {}
+        raw = self.unpack(block)
+        out = {name: (raw[i] + t) * s for name, i, s, t in self._scalars}
+        for name, i, lo, mask in self._bits:
+            out[name] = (raw[i] >> lo) & mask
+        return out
+
+    def encode(self, values, block=None):
+        """
+        Inverse of decode(): build a realtime block from {name: value}.
+        Values are scaled back to raw counts and clamped to the field's
+        range; channels missing from `values` are left as they are in
+        `block` (zero for a new block).
+        """
+        block = bytearray(self.block_size) if block is None else bytearray(block)
+        for name, packer, offset, scale_, translate, bits, limits in self._packers:
+            value = values.get(name)
+            if value is None:
+                continue
+            if limits is None:
+                packer.pack_into(block, offset, value)
+                continue
+            if bits is not None:
+                lo, hi = bits
+                mask = ((1 << (hi - lo + 1)) - 1) << lo
+                (old,) = packer.unpack_from(block, offset)
+                raw = (old & ~mask) | ((int(value) << lo) & mask)
+            else:
+                raw = int(round(value / scale_ - translate)) if scale_ else 0
+            packer.pack_into(block, offset, min(max(raw, limits[0]), limits[1]))
+        return bytes(block)
+
+    def plan(self, names, max_gap=16):
+        """SpanPlan for reading only the named channels with ranged reads."""
+        return SpanPlan(self, names, max_gap)
+
+
+class SpanPlan:
+    """
+    Ranged-read plan for a subset of channels.
+
+    The byte ranges the channels occupy are coalesced into as few spans as
+    possible: two ranges are merged when the gap between them is at most
+    `max_gap` bytes, since reading a few unused bytes is cheaper than the
+    framing and turnaround of another request. The spans are fetched back
+    to back and decoded by a layout compiled for their concatenation.
+    """
+
+    def __init__(self, layout, names, max_gap=16):
+        wanted = set(names)
+        chans = [c for c in layout.channels if c[0] in wanted]
+        ranges = sorted((c[2], c[2] + struct.calcsize(TYPE_CODES[c[1]])) for c in chans)
+
+        spans = []
+        for start, end in ranges:
+            if spans and start <= spans[-1][1] + max_gap:
+                spans[-1][1] = max(spans[-1][1], end)
+            else:
+                spans.append([start, end])
+        self.spans = [(start, end - start) for start, end in spans]
+        self.size = sum(length for _, length in self.spans)
+
+        # Offset of each span inside the concatenated reply
+        remapped, pos = [], 0
+        for start, length in self.spans:
+            for c in chans:
+                if start <= c[2] < start + length:
+                    remapped.append((c[0], c[1], c[2] - start + pos) + c[3:])
+            pos += length
+        self.layout = ChannelLayout(remapped, layout.endian, self.size)
+
+    def __len__(self):
+        return len(self.spans)
+
+    def fetch(self, transport):
+        """Read every span back to back; raises TransportError on failure."""
+        if len(self.spans) == 1:
+            return transport.read_range(*self.spans[0])
+        return b''.join(transport.read_range(o, n) for o, n in self.spans)
+
+    def read(self, transport):
+        """Fetch every span and decode; raises TransportError on failure."""
+        if not self.spans:
+            return {}
+        return self.layout.decode(self.fetch(transport))
+
+
+def compile_layout(text, settings=()):
+    """Parse INI text and return a compiled ChannelLayout."""
+    channels, endian, block_size = parse_ini(text, settings)
+    return ChannelLayout(channels, endian, block_size)
+
+def load_ini(path, settings=()):
+    """Read a TunerStudio INI file and return a compiled ChannelLayout."""
+    with open(path, "r", encoding="latin-1") as f:
+        return compile_layout(f.read(), settings)
+
+def default_layout():
+    """Layout for the first part of the MS2/Extra outpc block, no INI needed."""
+    return compile_layout(DEFAULT_INI)
+
+
+# --- LAYOUT CACHE ---
+def cache_key(ini_bytes, signature, settings=()):
+    """sha256 over ECU signature, #set symbols and INI contents."""
+    h = hashlib.sha256()
+    h.update(signature.encode('latin-1') if isinstance(signature, str) else signature)
+    h.update(b'\0' + ','.join(sorted(settings)).encode() + b'\0')
+    h.update(ini_bytes)
+    return h.digest()
+
+def dump_layout(layout, key):
+    """Serialise a compiled layout into the compact cache format."""
+    parts = [_CACHE_HEADER.pack(CACHE_MAGIC, CACHE_VERSION,
+                                1 if layout.endian == 'big' else 0,
+                                layout.block_size, len(layout.channels), key)]
+    for name, type_code, offset, units, scale_, translate, bits in layout.channels:
+        lo, hi = bits or (0, 0)
+        parts.append(_CACHE_RECORD.pack(_TYPE_LIST.index(type_code), offset,
+                                        scale_, translate, bits is not None, lo, hi))
+        for text in (name, units):
+            b = text.encode('utf-8')
+            parts.append(bytes((len(b),)) + b)
+    return b''.join(parts)
+
+def parse_cached(data, key):
+    """Rebuild a layout from cache bytes, or None if stale or corrupt."""
+    try:
+        magic, version, big, block_size, count, stored_key = _CACHE_HEADER.unpack_from(data)
+        if magic != CACHE_MAGIC or version != CACHE_VERSION or stored_key != key:
+            return None
+        pos = _CACHE_HEADER.size
+        channels = []
+        for _ in range(count):
+            t, offset, scale_, translate, has_bits, lo, hi = _CACHE_RECORD.unpack_from(data, pos)
+            pos += _CACHE_RECORD.size
+            texts = []
+            for _ in range(2):
+                n = data[pos]
+                texts.append(data[pos + 1:pos + 1 + n].decode('utf-8'))
+                pos += 1 + n
+            channels.append((texts[0], _TYPE_LIST[t], offset, texts[1], scale_, translate,
+                             (lo, hi) if has_bits else None))
+    except (struct.error, IndexError, UnicodeDecodeError):
+        return None
+    return ChannelLayout(channels, 'big' if big else 'little', block_size)
+
+def cache_name(path, signature, settings=()):
+    """
+    File name of the cache entry for one INI path, signature and settings.
+    It does not depend on the INI contents, so a recompile after an edit
+    overwrites the old entry instead of leaving it behind.
+    """
+    h = hashlib.sha256()
+    h.update(os.path.abspath(path).encode('utf-8', 'surrogateescape') + b'\0')
+    h.update(signature.encode('latin-1') if isinstance(signature, str) else signature)
+    h.update(b'\0' + ','.join(sorted(settings)).encode())
+    return h.hexdigest()[:32] + ".lay"
+
+def prune_cache(cache_dir=CACHE_DIR, max_age=CACHE_MAX_AGE, keep=None):
+    """
+    Remove cache entries not used for max_age seconds (INIs or firmware
+    gone). load_cached touches an entry's mtime on every hit, since atime
+    is not kept up to date on noatime/relatime mounts.
+    """
+    cutoff = time.time() - max_age
+    try:
+        entries = os.listdir(cache_dir)
+    except OSError:
+        return
+    for name in entries:
+        if not name.endswith((".lay", ".lay.tmp")) or name == keep:
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+def load_cached(path, signature, settings=(), cache_dir=CACHE_DIR):
+    """
+    Return the compiled layout for an INI, using the on-disk cache.
+    The cache entry is keyed by ECU signature + INI hash, so changing
+    firmware or editing the INI recompiles it automatically; the entry is
+    then rewritten in place and entries unused for CACHE_MAX_AGE pruned.
+    """
+    with open(path, "rb") as f:
+        ini_bytes = f.read()
+    key = cache_key(ini_bytes, signature, settings)
+    name = cache_name(path, signature, settings)
+    cache_path = os.path.join(cache_dir, name)
+
+    try:
+        with open(cache_path, "rb") as f:
+            layout = parse_cached(f.read(), key)
+        if layout is not None:
+            try:
+                os.utime(cache_path)   # mark as used for prune_cache
+            except OSError:
+                pass
+            return layout
+    except OSError:
+        pass
+
+    layout = compile_layout(ini_bytes.decode('latin-1'), settings)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = cache_path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(dump_layout(layout, key))
+        os.replace(tmp, cache_path)
+    except OSError as e:
+        print("Could not write layout cache:", e)
+    prune_cache(cache_dir, keep=name)
+    return layout
+
+
+# --- MAIN ---
+if __name__ == "__main__":
+    import sys
+    layout = load_ini(sys.argv[1]) if len(sys.argv) > 1 else default_layout()
+    print(f"{len(layout)} channels, block size {layout.block_size} bytes, "
+          f"{len(layout.structs)} struct pass(es)")
+    for name, type_code, offset, units, scale_, translate, bits in layout.channels:
+        extra = f"[{bits[0]}:{bits[1]}]" if bits else f"x{scale_:g} +{translate:g} {units}"
+        print(f"{offset:4d} {type_code} {name:20s} {extra}")
@@ -1,13 +1,38 @@
 # ms2_live_decoder.py
+import os
 import struct
+import sys
 import textwrap
-import serial
 import time
+import serial
+from MS_Channels import default_layout, load_ini
+from MS_Capture import is_capture, capture_array
+from MS_Transport import Transport, TransportError
+from MS_Scheduler import PollScheduler
 
 # --- CONFIGURE YOUR SERIAL PORT ---
 PORT = "COM3"       # change to your actual COM port
 BAUD = 115200       # typical for MS2/Extra
-RT_REQUEST = b'\x01\x00\x00\x00'  # realtime poll
+INI_PATH = None     # firmware's TunerStudio INI; the built-in MS2/Extra layout otherwise
+INI_SETTINGS = {'CELSIUS'}  # the INI's #set symbols; CELSIUS: temperatures in C
+WORD_MAP = False    # decode with try_map_common's six 3.2.5 words instead of a layout
+FRAME_SIZE = 212    # bytes per raw frame in a capture with WORD_MAP
+
+# Batch decode range checks on INI channels, in scaled units (try_map_common's
+# bounds, temperatures allowed below zero); outside becomes NaN, safe_field's N/A
+RANGES = {
+    'rpm': (0, 16000),
+    'tps': (0, 100),
+    'map': (0, 255),
+    'coolant': (-40, 250),
+    'mat': (-40, 250),
+    'afr1': (0, 20),
+}
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 # --- HELPER FUNCTIONS ---
 def hex_to_bytes(s):
@@ -35,36 +60,49 @@ def safe_field(value, min_val=0, max_val=65535):
 def scale(value, divisor):
     return value/divisor if isinstance(value, int) else value
 
+# (name, min raw, max raw, divisor) for words 0..5 of the RT block
+COMMON_FIELDS = [
+    ('RPM',     0, 16000, None),
+    ('TPS_%',   0, 1000,  10.0),
+    ('MAP_kPa', 0, 2550,  10.0),
+    ('CLT_C',   0, 2500,  10.0),
+    ('IAT_C',   0, 2500,  10.0),
+    ('AFR',     0, 2000,  100.0),
+]
+
 def try_map_common(words):
     """
     MS2/Extra 3.2.5 RT block mapping with engine-off detection.
     """
     out = {}
-    if len(words) < 6:
+    if len(words) < len(COMMON_FIELDS):
         return out
 
-    rpm     = safe_field(words[0], 0, 16000)
-    tps     = scale(safe_field(words[1], 0, 1000), 10.0)
-    map_kpa = scale(safe_field(words[2], 0, 2550), 10.0)
-    clt     = scale(safe_field(words[3], 0, 2500), 10.0)
-    iat     = scale(safe_field(words[4], 0, 2500), 10.0)
-    afr     = scale(safe_field(words[5], 0, 2000), 100.0)
+    for (name, lo, hi, divisor), word in zip(COMMON_FIELDS, words):
+        value = safe_field(word, lo, hi)
+        out[name] = scale(value, divisor) if divisor else value
 
     # Mark likely inactive fields if RPM == 0
-    if rpm == 0 or rpm == "N/A":
-        tps = map_kpa = clt = iat = afr = "N/A"
-
-    out['RPM']     = rpm
-    out['TPS_%']   = tps
-    out['MAP_kPa'] = map_kpa
-    out['CLT_C']   = clt
-    out['IAT_C']   = iat
-    out['AFR']     = afr
+    if out['RPM'] == 0 or out['RPM'] == "N/A":
+        for name, *_ in COMMON_FIELDS[1:]:
+            out[name] = "N/A"
 
     return out
 
+def load_layout():
+    """Compile the channel layout, or None (WORD_MAP) to use try_map_common."""
+    if WORD_MAP:
+        return None
+    if INI_PATH:
+        try:
+            return load_ini(INI_PATH, INI_SETTINGS)
+        except OSError as e:
+            print("Failed to read INI, using built-in layout:", e)
+    return default_layout()
+
 # --- LIVE POLLING ---
 def live_poll():
+    layout = load_layout()
     try:
         ser = serial.Serial(PORT, BAUD, timeout=0.5)
         print(f"Connected to ECU on {PORT} at {BAUD} baud.\n")
@@ -72,21 +110,30 @@ def live_poll():
         print("Failed to open serial port:", e)
         return
 
+    transport = Transport(ser)
+    scheduler = PollScheduler(baud=BAUD)
     print("Press Ctrl+C to stop.\nPolling ECU for realtime data...\n")
     try:
         while True:
-            ser.write(RT_REQUEST)
-            time.sleep(0.05)  # 50ms delay between polls
-            reply = ser.read(256)  # read up to 256 bytes
-            if reply:
+            scheduler.begin()  # waits only as long as the link needs
+            try:
+                reply = transport.read_realtime()
+            except TransportError as e:
+                print("Bad reply:", e)
+                reply = None
+            scheduler.end(reply is not None)
+            if reply and layout:
+                decoded = layout.decode(reply)
+                print('\t'.join(f"{k}: {v:.1f}" for k, v in decoded.items()))
+            elif reply:
                 words = bytes_to_words_le(reply)
                 mapped = try_map_common(words)
                 # Print live values
                 print(f"RPM: {mapped['RPM']}\tTPS: {mapped['TPS_%']}\tMAP: {mapped['MAP_kPa']}"
                       f"\tCLT: {mapped['CLT_C']}\tIAT: {mapped['IAT_C']}\tAFR: {mapped['AFR']}")
-            time.sleep(0.1)
     except KeyboardInterrupt:
         print("\nPolling stopped.")
+        print(scheduler.summary())
         ser.close()
 
 # --- MANUAL DECODE FROM HEX (optional) ---
@@ -113,12 +160,129 @@ def manual_decode():
     for i,w in enumerate(words):
         print(f"W{i:03d}: {w} (0x{w:04X})")
     print("\n--- Decoded MS2/Extra fields ---")
-    mapped = try_map_common(words)
+    layout = load_layout()
+    mapped = layout.decode(b) if layout else try_map_common(words)
     for k,v in mapped.items():
         print(f"{k}: {v}")
 
+# --- BATCH DECODE OF CAPTURED FRAMES (needs numpy) ---
+# INI type -> numpy type; byte order is prefixed from the layout
+NUMPY_TYPES = {'U08': 'u1', 'S08': 'i1', 'U16': 'u2', 'S16': 'i2',
+               'U32': 'u4', 'S32': 'i4', 'F32': 'f4'}
+
+def read_frames(path, frame_size):
+    """
+    Raw frames as one buffer, the frame size, the frame count and the
+    capture timestamps (None if the file has none). MS_Capture files
+    keep their own frame length; other binary files are frames back to
+    back; .txt/.hex files are hex dumps like the ones manual_decode takes,
+    one or more frames per line.
+    """
+    if is_capture(path):
+        times, frames = capture_array(path)
+        return frames, frames.shape[1], len(frames), times
+    with open(path, 'rb') as f:
+        data = f.read()
+    if path.endswith(('.txt', '.hex')):
+        text = data.decode('ascii', 'ignore').replace('0x', '').replace(',', ' ')
+        data = bytes.fromhex(text)  # skips all whitespace
+    return data, frame_size, len(data) // frame_size, None
+
+def layout_dtype(layout, frame_size):
+    """Structured dtype viewing one frame as every INI channel's raw slot."""
+    order = '>' if layout.endian == 'big' else '<'
+    return np.dtype({
+        'names': [c[0] for c in layout.channels],
+        'formats': [order + NUMPY_TYPES[c[1]] for c in layout.channels],
+        'offsets': [c[2] for c in layout.channels],
+        'itemsize': frame_size,
+    })
+
+def common_dtype(frame_size):
+    """Structured dtype for try_map_common's little-endian words."""
+    return np.dtype({
+        'names': [f[0] for f in COMMON_FIELDS],
+        'formats': ['<u2'] * len(COMMON_FIELDS),
+        'offsets': [2 * i for i in range(len(COMMON_FIELDS))],
+        'itemsize': frame_size,
+    })
+
+def decode_layout_frames(records, layout, ranges=RANGES):
+    """Columns {name: array} for every INI channel; out-of-range values are NaN."""
+    columns = {}
+    for name, _, _, _, scale_, translate, bits in layout.channels:
+        raw = records[name]
+        if bits is not None:
+            lo, hi = bits
+            columns[name] = (raw >> lo) & ((1 << (hi - lo + 1)) - 1)
+            continue
+        value = (raw.astype(np.float64) + translate) * scale_
+        if name in ranges:
+            lo, hi = ranges[name]
+            value[(value < lo) | (value > hi)] = np.nan
+        columns[name] = value
+    return columns
+
+def decode_common_frames(records):
+    """try_map_common over every frame at once: N/A is NaN, engine-off masks all but RPM."""
+    columns = {}
+    for name, lo, hi, divisor in COMMON_FIELDS:
+        raw = records[name]
+        value = raw / divisor if divisor else raw.astype(np.float64)
+        value[(raw < lo) | (raw > hi)] = np.nan
+        columns[name] = value
+    engine_off = ~(columns['RPM'] > 0)  # 0 or N/A
+    for name, *_ in COMMON_FIELDS[1:]:
+        columns[name][engine_off] = np.nan
+    return columns
+
+def batch_decode(path, out_path=None):
+    """
+    Decode a whole file of captured frames without a per-frame Python loop:
+    the file is viewed as an array of structured records, and scaling and
+    range checks run as whole-column operations. Writes an .npz with one
+    array per channel plus 'frame' (index in the capture) and, for
+    MS_Capture files, 'time' (seconds since the first frame).
+    """
+    if np is None:
+        print("Batch decode needs numpy (pip install numpy).")
+        return None
+    layout = load_layout()
+    t0 = time.perf_counter()
+    data, frame_size, count, times = read_frames(path, layout.block_size if layout else FRAME_SIZE)
+    needed = layout.min_size if layout else 2 * len(COMMON_FIELDS)
+    if count and frame_size < needed:
+        print(f"Frames are {frame_size} bytes, the channels need {needed}.")
+        return None
+    if layout:
+        records = np.frombuffer(data, dtype=layout_dtype(layout, frame_size), count=count)
+        columns = decode_layout_frames(records, layout)
+    else:
+        records = np.frombuffer(data, dtype=common_dtype(frame_size), count=count)
+        columns = decode_common_frames(records)
+    columns['frame'] = np.arange(count)
+    if times is not None:
+        columns['time'] = times - times[0] if count else times
+
+    out_path = out_path or os.path.splitext(path)[0] + ".npz"
+    np.savez(out_path, **columns)
+    elapsed = time.perf_counter() - t0
+    print(f"{count} frames of {frame_size} bytes -> {out_path} in {elapsed:.2f}s")
+    if times is None and len(data) % frame_size:
+        print(f"  ignored {len(data) % frame_size} trailing bytes")
+    for name, value in columns.items():
+        if value.dtype.kind == 'f':
+            bad = int(np.isnan(value).sum())
+            if bad:
+                print(f"  {name}: {bad} N/A")
+    return columns
+
 # --- MAIN ---
 if __name__ == "__main__":
-    manual_decode()  # optional
-    live_poll()
+    if len(sys.argv) > 1:
+        # python MS_Decoder.py frames.bin|capture.cap [out.npz]
+        batch_decode(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
+    else:
+        manual_decode()  # optional
+        live_poll()
 
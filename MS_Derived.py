@@ -0,0 +1,152 @@
+# ms_derived.py
+"""
+Derived channels computed from decoded ones.
+
+Formulas are plain expressions over channel names:
+
+    FORMULAS = {'Boost': "(MAP - Baro) / 100.0", 'Lambda': "AFR / STOICH"}
+
+Each one is compiled once into a lambda taking exactly the channels it
+references, and the set is ordered so a formula always runs after the
+formulas it reads (derived channels can build on each other; a cycle is
+an error). Per sample, update() compares only the source channels with
+their previous values; a formula whose inputs didn't change reuses its
+cached result, so unchanged channels cost a set check, not a recompute.
+
+    derived = DerivedChannels(FORMULAS)
+    derived.update(values)       # adds 'Boost', 'Lambda', ... in place
+"""
+import math
+
+# --- CONFIG (car specific) ---
+STOICH = 14.7                                   # gasoline AFR at lambda 1
+GEAR_RATIOS = [3.454, 1.947, 1.366, 0.972, 0.738]
+FINAL_DRIVE = 4.444
+TYRE_DIAMETER_IN = 25.0
+GEAR_TOLERANCE = 0.12                           # clutch in / slipping beyond this
+INJECTOR_CC_MIN = 565.0                         # per injector, at rated pressure
+INJECTORS = 4
+
+# Engine rpm at 1 mph in each gear: ratio * final drive * 336 / tyre diameter
+RPM_PER_MPH = [r * FINAL_DRIVE * 336.0 / TYRE_DIAMETER_IN for r in GEAR_RATIOS]
+
+FORMULAS = {
+    'Boost': "(MAP - Baro) / 100.0",            # bar of boost, negative in vacuum
+    'Lambda': "AFR / STOICH",
+    'Gear': "gear(RPM, GPS)",
+    # Injector duty (one squirt per 4-stroke cycle) times total flow, in L/h
+    'Duty': "PW * RPM / 1200.0",
+    'FuelFlow': "Duty / 100.0 * INJECTOR_CC_MIN * INJECTORS * 60 / 1000.0",
+}
+
+
+def gear(rpm, mph):
+    """Gear whose rpm/mph ratio is closest to the measured one; 0 = neutral/clutch."""
+    if mph < 3 or rpm < 500:
+        return 0
+    ratio = rpm / mph
+    best = min(range(len(RPM_PER_MPH)), key=lambda i: abs(RPM_PER_MPH[i] - ratio))
+    if abs(RPM_PER_MPH[best] - ratio) > GEAR_TOLERANCE * RPM_PER_MPH[best]:
+        return 0
+    return best + 1
+
+
+# Names a formula may use that are not channels
+NAMESPACE = {
+    'STOICH': STOICH, 'INJECTOR_CC_MIN': INJECTOR_CC_MIN, 'INJECTORS': INJECTORS,
+    'gear': gear, 'abs': abs, 'min': min, 'max': max, 'round': round,
+    'sqrt': math.sqrt, 'log': math.log, 'exp': math.exp,
+}
+
+
+class DerivedChannels:
+
+    def __init__(self, formulas=FORMULAS, namespace=NAMESPACE):
+        self.formulas = dict(formulas)
+        inputs = {}
+        funcs = {}
+        for name, expr in self.formulas.items():
+            code = compile(expr, f"<{name}>", "eval")
+            names = sorted(n for n in code.co_names if n not in namespace)
+            inputs[name] = names
+            funcs[name] = eval(f"lambda {', '.join(names)}: {expr}",
+                               {'__builtins__': {}, **namespace})
+        self.inputs = inputs
+        order = self._order(inputs)
+        self.plan = [(name, funcs[name], tuple(inputs[name]), frozenset(inputs[name]))
+                     for name in order]
+        self.sources = sorted({n for names in inputs.values() for n in names}
+                              - set(self.formulas))
+        self._last = {}
+        self.cache = {}
+        self.evaluations = 0
+
+    @staticmethod
+    def _order(inputs):
+        """Depth-first topological order; raises ValueError on a cycle."""
+        order, state = [], {}
+
+        def visit(name, path):
+            if state.get(name) == 'done':
+                return
+            if state.get(name) == 'active':
+                raise ValueError("derived channel cycle: " + " -> ".join(path + [name]))
+            state[name] = 'active'
+            for dep in inputs[name]:
+                if dep in inputs:
+                    visit(dep, path + [name])
+            state[name] = 'done'
+            order.append(name)
+
+        for name in inputs:
+            visit(name, [])
+        return order
+
+    def requires(self, names):
+        """Source channels needed to compute `names` (derived names expanded)."""
+        needed, stack = set(), list(names)
+        while stack:
+            name = stack.pop()
+            if name in self.inputs:
+                stack.extend(self.inputs[name])
+            else:
+                needed.add(name)
+        return needed
+
+    def update(self, values):
+        """Add every derived channel to `values`, recomputing only what changed."""
+        last = self._last
+        changed = set()
+        for name in self.sources:
+            value = values.get(name)
+            if last.get(name, changed) != value:   # `changed` as a never-equal sentinel
+                last[name] = value
+                changed.add(name)
+        cache = self.cache
+        for name, func, args, argset in self.plan:
+            if changed.isdisjoint(argset):
+                if name in cache:
+                    values[name] = cache[name]
+                continue
+            try:
+                result = func(*[values[a] for a in args])
+            except (KeyError, TypeError, ValueError, ZeroDivisionError):
+                result = None   # an input is missing or out of domain
+            self.evaluations += 1
+            if cache.get(name, changed) != result:
+                changed.add(name)
+            if result is None:
+                cache.pop(name, None)
+                values.pop(name, None)
+            else:
+                cache[name] = values[name] = result
+        return values
+
+
+# --- MAIN ---
+if __name__ == "__main__":
+    derived = DerivedChannels()
+    for name, _, args, _ in derived.plan:
+        print(f"{name:10s} = {derived.formulas[name]:40s} <- {', '.join(args)}")
+    sample = {'MAP': 180.0, 'Baro': 101.3, 'AFR': 11.8, 'RPM': 4200, 'GPS': 62.0, 'PW': 9.5}
+    print(derived.update(dict(sample)))
@@ -0,0 +1,194 @@
+# ms_engine.py
+"""
+Asyncio acquisition engine.
+
+Each stage (ECU poll, GPS, input, render) runs as its own asyncio task at
+its own rate. Blocking work (serial reads, gpsd, I2C flushes) runs on a
+dedicated worker thread per stage, so a slow OLED flush never delays the
+next ECU poll. Stages share results through LatestValue slots.
+
+    engine = Engine()
+    ecu = engine.stage("ecu", poll_ecu, hz=50)
+    engine.stage("render", lambda: draw(ecu.get()), hz=20)
+    engine.run()
+
+Hardware callbacks (GPIO edges, etc.) hand events to the loop with
+engine.post(); handlers registered with engine.on() run on the loop
+thread and can wake() a stage so it runs immediately.
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class LatestValue:
+    """
+    Single-writer latest-value slot.
+
+    publish() swaps in a new (seq, timestamp, value) tuple with one
+    reference assignment, which is atomic under the GIL, so readers never
+    take a lock and never see a half-written sample. Readers that are
+    slower than the writer simply skip intermediate values.
+    """
+
+    __slots__ = ('_item',)
+
+    def __init__(self, value=None):
+        self._item = (0, 0.0, value)
+
+    def publish(self, value):
+        seq = self._item[0] + 1
+        self._item = (seq, time.monotonic(), value)
+        return seq
+
+    def get(self):
+        """Return the latest value (None until the first publish)."""
+        return self._item[2]
+
+    def snapshot(self):
+        """Return (seq, timestamp, value) of the latest publish."""
+        return self._item
+
+    @property
+    def seq(self):
+        return self._item[0]
+
+
+class Stage:
+    """
+    A periodic stage: calls func() on its own thread at a fixed rate, or
+    at the rate chosen by a PollScheduler when one is given (a None result
+    or an exception then counts as a failed request).
+    """
+
+    def __init__(self, name, func, hz, scheduler=None):
+        self.name = name
+        self.func = func
+        self.interval = 1.0 / hz if hz else 0.0
+        self.scheduler = scheduler
+        self.slot = LatestValue()
+        self.runs = 0
+        self.overruns = 0
+        self.errors = 0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+        self._wake = None
+
+    def wake(self):
+        """Run the stage now instead of at its next deadline (loop thread only)."""
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _sleep(self, delay):
+        try:
+            await asyncio.wait_for(self._wake.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+        self._wake.clear()
+
+    def get(self):
+        return self.slot.get()
+
+    def snapshot(self):
+        return self.slot.snapshot()
+
+    async def run(self, loop):
+        sched = self.scheduler
+        self._wake = asyncio.Event()
+        next_due = time.monotonic()
+        while True:
+            if sched:
+                await asyncio.sleep(sched.delay())
+                sched.mark_start()
+            value = None
+            try:
+                value = await loop.run_in_executor(self._executor, self.func)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                print(f"[{self.name}] error: {e}")
+            else:
+                if value is not None:
+                    self.slot.publish(value)
+            self.runs += 1
+            if sched:
+                sched.end(value is not None)
+                continue
+
+            # Fixed-rate schedule: sleep to the next deadline, or resync if late
+            next_due += self.interval
+            delay = next_due - time.monotonic()
+            if delay < 0:
+                self.overruns += 1
+                next_due = time.monotonic()
+                delay = 0
+            await self._sleep(delay)
+
+    def achieved_hz(self, elapsed):
+        return self.runs / elapsed if elapsed > 0 else 0.0
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+class Engine:
+    """Runs a set of independent stages until cancelled or interrupted."""
+
+    def __init__(self):
+        self.stages = {}
+        self.started = None
+        self.loop = None
+        self._handlers = {}
+
+    def stage(self, name, func, hz=None, scheduler=None):
+        """Register a stage; returns it so other stages can read its slot."""
+        st = Stage(name, func, hz, scheduler)
+        self.stages[name] = st
+        return st
+
+    def on(self, event, handler):
+        """Call handler(*args) on the loop thread whenever `event` is posted."""
+        self._handlers.setdefault(event, []).append(handler)
+
+    def post(self, event, *args):
+        """Deliver an event from any thread (e.g. a GPIO callback)."""
+        loop = self.loop
+        if loop is not None:
+            loop.call_soon_threadsafe(self._dispatch, event, args)
+
+    def _dispatch(self, event, args):
+        for handler in self._handlers.get(event, ()):
+            try:
+                handler(*args)
+            except Exception as e:
+                print(f"[{event}] handler error: {e}")
+
+    async def main(self):
+        loop = asyncio.get_running_loop()
+        self.loop = loop
+        self.started = time.monotonic()
+        tasks = [asyncio.create_task(st.run(loop), name=st.name)
+                 for st in self.stages.values()]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for t in tasks:
+                t.cancel()
+            for st in self.stages.values():
+                st.shutdown()
+
+    def run(self):
+        """Blocking entry point for scripts."""
+        asyncio.run(self.main())
+
+    def report(self):
+        """One line per stage with achieved rate and overrun/error counts."""
+        elapsed = time.monotonic() - self.started if self.started else 0.0
+        lines = []
+        for st in self.stages.values():
+            if st.scheduler:
+                lines.append(f"{st.name}: {st.scheduler.summary()}")
+            else:
+                lines.append(f"{st.name}: {st.achieved_hz(elapsed):.1f} Hz, "
+                             f"{st.overruns} overruns, {st.errors} errors")
+        return lines
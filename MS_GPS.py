@@ -0,0 +1,168 @@
+# ms_gps.py
+"""
+Background gpsd reader.
+
+A daemon thread consumes the gpsd stream continuously (blocking reads
+are fine there) and publishes the latest TPV fix, stamped with the
+monotonic time it arrived, through a LatestValue slot. Readers never
+touch the socket: speed() is one tuple read plus a linear extrapolation
+from the last two fixes, so a 20 Hz display moves smoothly between 1 Hz
+fixes instead of stepping once a second. Position is dead-reckoned from
+the last fix along its track the same way.
+
+    gps = GPSWorker()
+    gps.start()
+    ...
+    mph = gps.speed_mph()     # O(1), never blocks
+"""
+import math
+import threading
+import time
+from collections import namedtuple
+from MS_Engine import LatestValue
+
+try:
+    import gps as gpsd
+except ImportError:
+    gpsd = None
+
+# --- CONFIG ---
+STALE_SECONDS = 3.0        # no fix for this long: report no speed
+MAX_EXTRAPOLATE = 1.5      # never project a fix further than this
+MAX_ACCEL = 10.0           # m/s^2, about 1 g; clamps noisy fix pairs
+RECONNECT_SECONDS = 2.0
+MPH_PER_MS = 2.23694
+EARTH_RADIUS = 6371000.0
+
+# time is time.monotonic() at arrival; utc is gpsd's own timestamp string
+Fix = namedtuple('Fix', 'time speed track lat lon alt mode utc')
+
+
+def _number(report, name):
+    value = getattr(report, name, None)
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(value) else value
+
+
+class GPSWorker:
+
+    def __init__(self, host="127.0.0.1", port="2947"):
+        self.host = host
+        self.port = port
+        # (fix, acceleration m/s^2) or None until the first fix
+        self.latest = LatestValue()
+        self.connected = False
+        self.reports = 0
+        self.fixes = 0
+        self._stop = False
+        self._thread = None
+
+    @property
+    def available(self):
+        return gpsd is not None
+
+    def start(self):
+        if gpsd is None:
+            return False
+        self._thread = threading.Thread(target=self._run, name="gps", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._stop = True
+
+    # --- worker thread ---
+    def _run(self):
+        while not self._stop:
+            try:
+                session = gpsd.gps(host=self.host, port=self.port, mode=gpsd.WATCH_ENABLE)
+                self.connected = True
+                while not self._stop:
+                    self._handle(session.next())
+            except (StopIteration, OSError, KeyError, AttributeError):
+                pass
+            self.connected = False
+            time.sleep(RECONNECT_SECONDS)
+
+    def _handle(self, report):
+        self.reports += 1
+        if getattr(report, 'class', '') != 'TPV':
+            return
+        mode = int(getattr(report, 'mode', 0) or 0)
+        speed = _number(report, 'speed')
+        if mode < 2 or speed is None:
+            return  # no 2D/3D fix yet
+        fix = Fix(time.monotonic(), speed, _number(report, 'track'),
+                  _number(report, 'lat'), _number(report, 'lon'), _number(report, 'alt'),
+                  mode, getattr(report, 'time', None))
+        accel = 0.0
+        previous = self.latest.get()
+        if previous is not None:
+            last = previous[0]
+            dt = fix.time - last.time
+            if 0 < dt <= STALE_SECONDS:
+                accel = max(-MAX_ACCEL, min(MAX_ACCEL, (fix.speed - last.speed) / dt))
+        self.latest.publish((fix, accel))
+        self.fixes += 1
+
+    # --- readers (any thread, O(1)) ---
+    def fix(self):
+        """The latest Fix, or None if there is none or it is stale."""
+        item = self.latest.get()
+        if item is None or time.monotonic() - item[0].time > STALE_SECONDS:
+            return None
+        return item[0]
+
+    def speed(self, now=None):
+        """Speed in m/s, extrapolated from the last two fixes; 0.0 without a fix."""
+        item = self.latest.get()
+        if item is None:
+            return 0.0
+        fix, accel = item
+        age = (time.monotonic() if now is None else now) - fix.time
+        if age > STALE_SECONDS:
+            return 0.0
+        return max(0.0, fix.speed + accel * min(age, MAX_EXTRAPOLATE))
+
+    def speed_mph(self, now=None):
+        return self.speed(now) * MPH_PER_MS
+
+    def position(self, now=None):
+        """(lat, lon) dead-reckoned along the last track, or None."""
+        item = self.latest.get()
+        if item is None or item[0].lat is None or item[0].lon is None:
+            return None
+        fix, accel = item
+        age = (time.monotonic() if now is None else now) - fix.time
+        if age > STALE_SECONDS or fix.track is None:
+            return fix.lat, fix.lon
+        age = min(age, MAX_EXTRAPOLATE)
+        dist = fix.speed * age + 0.5 * accel * age * age
+        track = math.radians(fix.track)
+        lat = fix.lat + math.degrees(dist * math.cos(track) / EARTH_RADIUS)
+        lon = fix.lon + math.degrees(dist * math.sin(track)
+                                     / (EARTH_RADIUS * math.cos(math.radians(fix.lat))))
+        return lat, lon
+
+
+# --- MAIN ---
+if __name__ == "__main__":
+    worker = GPSWorker()
+    if not worker.start():
+        print("gps module not installed (python3-gps).")
+    else:
+        try:
+            while True:
+                fix = worker.fix()
+                state = "connected" if worker.connected else "waiting for gpsd"
+                if fix:
+                    print(f"{worker.speed_mph():6.1f} MPH  fix mode {fix.mode}, "
+                          f"{time.monotonic() - fix.time:.2f}s old, {worker.fixes} fixes")
+                else:
+                    print(f"no fix ({state}, {worker.reports} reports)")
+                time.sleep(0.1)
+        except KeyboardInterrupt:
+            pass
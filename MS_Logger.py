@@ -0,0 +1,191 @@
+# ms_logger.py
+"""
+Buffered binary data logger.
+
+Samples are handed to log() (one deque append, no I/O) and a background
+thread packs them into fixed-width records, compresses each chunk with
+zlib and writes it in one large block. Files rotate by size or age, which
+keeps SD-card writes few, large and sequential.
+
+File format (little endian):
+    header  'MSLG' u16 version, u16 channel count, f64 wall-clock start,
+            then per channel: u8 length + UTF-8 name
+    chunk   'CHNK' u32 records, u32 raw bytes, u32 compressed bytes,
+            u32 crc32 of the compressed data, then the zlib data
+    record  f64 monotonic timestamp + one f32 per channel
+
+    python MS_Logger.py [DIR]    # log every sample from the shared ring
+"""
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import deque
+
+# --- CONFIG ---
+LOG_DIR = os.path.expanduser("~/msdash_logs")
+CHUNK_RECORDS = 1000          # records per compressed chunk
+FLUSH_SECONDS = 5.0           # write a partial chunk at least this often
+MAX_FILE_BYTES = 32 * 1024 * 1024
+MAX_FILE_SECONDS = 30 * 60
+EXTENSION = ".msb"
+
+MAGIC = b'MSLG'
+CHUNK_MAGIC = b'CHNK'
+_FILE_HEADER = struct.Struct('<4sHHd')
+_CHUNK_HEADER = struct.Struct('<4sIIII')
+NAN = float('nan')
+
+
+def record_struct(n):
+    return struct.Struct(f'<d{n}f')
+
+
+class BinaryLogger:
+
+    def __init__(self, names, directory=LOG_DIR, chunk_records=CHUNK_RECORDS,
+                 max_bytes=MAX_FILE_BYTES, max_seconds=MAX_FILE_SECONDS, level=6):
+        self.names = list(names)
+        self.directory = directory
+        self.chunk_records = chunk_records
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.level = level
+        self._record = record_struct(len(self.names))
+        self._pending = deque()
+        self._wakeup = threading.Event()
+        self._stop = False
+        self._file = None
+        self._file_opened = 0.0
+        self.path = None
+        self.records = 0
+        self.bytes_written = 0
+        os.makedirs(directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="logger", daemon=True)
+        self._thread.start()
+
+    # --- hot path ---
+    def log(self, values, timestamp=None):
+        """Queue one sample ({name: value}); never blocks on disk I/O."""
+        self._pending.append((timestamp if timestamp is not None else time.monotonic(),
+                              values))
+        if len(self._pending) >= self.chunk_records:
+            self._wakeup.set()
+
+    def log_values(self, timestamp, values):
+        """Queue a sample already ordered like `names` (e.g. from RingReader.poll)."""
+        self._pending.append((timestamp, tuple(values)))
+        if len(self._pending) >= self.chunk_records:
+            self._wakeup.set()
+
+    # --- writer thread ---
+    def _run(self):
+        chunk = bytearray()
+        count = 0
+        last_flush = time.monotonic()
+        pack = self._record.pack
+        names = self.names
+        while True:
+            self._wakeup.wait(FLUSH_SECONDS / 4)
+            self._wakeup.clear()
+            pending = self._pending
+            while pending:
+                t, values = pending.popleft()
+                if isinstance(values, dict):
+                    values = [values.get(ch, NAN) for ch in names]
+                chunk += pack(t, *values)
+                count += 1
+                if count >= self.chunk_records:
+                    self._write_chunk(chunk, count)
+                    chunk, count = bytearray(), 0
+                    last_flush = time.monotonic()
+            if count and (self._stop or time.monotonic() - last_flush >= FLUSH_SECONDS):
+                self._write_chunk(chunk, count)
+                chunk, count = bytearray(), 0
+                last_flush = time.monotonic()
+            if self._stop and not pending:
+                break
+        if self._file:
+            self._file.close()
+
+    def _open(self):
+        if self._file:
+            self._file.close()
+        base = os.path.join(self.directory, time.strftime("msdash_%Y%m%d_%H%M%S"))
+        path, n = base + EXTENSION, 1
+        while os.path.exists(path):
+            path, n = f"{base}_{n}{EXTENSION}", n + 1
+        self.path = path
+        self._file = open(self.path, "wb")
+        self._file_opened = time.monotonic()
+        header = bytearray(_FILE_HEADER.pack(MAGIC, 1, len(self.names), time.time()))
+        for ch in self.names:
+            b = ch.encode('utf-8')[:255]
+            header += bytes((len(b),)) + b
+        self._file.write(header)
+
+    def _write_chunk(self, chunk, count):
+        if (self._file is None or self._file.tell() >= self.max_bytes
+                or time.monotonic() - self._file_opened >= self.max_seconds):
+            self._open()
+        data = zlib.compress(bytes(chunk), self.level)
+        self._file.write(_CHUNK_HEADER.pack(CHUNK_MAGIC, count, len(chunk),
+                                            len(data), zlib.crc32(data)) + data)
+        self._file.flush()
+        self.records += count
+        self.bytes_written += _CHUNK_HEADER.size + len(data)
+
+    def close(self):
+        """Flush everything queued and close the file."""
+        self._stop = True
+        self._wakeup.set()
+        self._thread.join()
+
+
+# --- READING ---
+def read_log(path):
+    """Yield (timestamp, {name: value}) for every record in a log file."""
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, _, n, _ = _FILE_HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not an MSLG log")
+    pos = _FILE_HEADER.size
+    names = []
+    for _ in range(n):
+        length = data[pos]
+        names.append(data[pos + 1:pos + 1 + length].decode('utf-8'))
+        pos += 1 + length
+    record = record_struct(n)
+
+    while pos + _CHUNK_HEADER.size <= len(data):
+        magic, count, raw_len, comp_len, crc = _CHUNK_HEADER.unpack_from(data, pos)
+        pos += _CHUNK_HEADER.size
+        comp = data[pos:pos + comp_len]
+        pos += comp_len
+        if magic != CHUNK_MAGIC or len(comp) != comp_len or zlib.crc32(comp) != crc:
+            break  # truncated tail from a power cut
+        for rec in record.iter_unpack(zlib.decompress(comp)):
+            yield rec[0], dict(zip(names, rec[1:]))
+
+
+# --- MAIN ---
+if __name__ == "__main__":
+    import sys
+    from MS_SharedRing import RingReader
+    reader = RingReader()
+    logger = BinaryLogger(reader.names, sys.argv[1] if len(sys.argv) > 1 else LOG_DIR)
+    print(f"Logging {len(reader.names)} channels to {logger.directory}")
+    try:
+        while True:
+            for _, t, values in reader.poll():
+                logger.log_values(t, values)
+            time.sleep(0.05)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        logger.close()
+        reader.close()
+        print(f"{logger.records} records, {logger.bytes_written} bytes, "
+              f"{reader.dropped} dropped")
@@ -0,0 +1,160 @@
+# ms_probe.py
+"""
+Automatic baud/protocol detection for MS2/Extra.
+
+Tries each candidate baud with the newserial (framed) and legacy
+(raw command) protocols, reads the firmware signature and measures the
+realtime block length. The winning configuration is saved so later boots
+open the port straight away; if the cached settings stop answering, a
+full re-probe runs.
+
+    ser, transport, config = connect("/dev/ttyUSB0")
+"""
+import json
+import os
+import serial
+from MS_Transport import Transport, TransportError, CMD_REALTIME, CMD_SIGNATURE
+
+# --- CONFIG ---
+CANDIDATE_BAUDS = [115200, 9600, 57600, 38400]
+PROTOCOLS = ["newserial", "legacy"]
+PROBE_TIMEOUT = 0.25   # seconds per attempt
+RUN_TIMEOUT = 0.2      # read timeout once connected
+CACHE_PATH = os.path.expanduser("~/.cache/msdash/probe.json")
+
+
+# --- HELPER FUNCTIONS ---
+def looks_like_signature(b):
+    """A real signature is non-empty, mostly printable ASCII."""
+    b = b.rstrip(b'\0')
+    if len(b) < 4:
+        return False
+    printable = sum(32 <= c < 127 for c in b)
+    return printable >= 0.9 * len(b)
+
+def read_until_quiet(ser, max_bytes=4096):
+    """Read until the port goes quiet for one timeout; legacy replies carry no length."""
+    buf = bytearray()
+    while len(buf) < max_bytes:
+        chunk = ser.read(max_bytes - len(buf))
+        if not chunk:
+            break
+        buf += chunk
+    return bytes(buf)
+
+def try_config(ser, protocol):
+    """
+    Probe an open port with one protocol.
+    Returns (signature, block_size) or None if the ECU didn't answer sensibly.
+    """
+    ser.reset_input_buffer()
+    if protocol == "newserial":
+        transport = Transport(ser, framed=True, timeout=PROBE_TIMEOUT)
+        try:
+            signature = transport.signature()
+            block_size = len(transport.read_realtime())
+        except TransportError:
+            return None
+        return signature, block_size
+
+    ser.write(CMD_SIGNATURE)
+    raw = read_until_quiet(ser, 64)
+    if not looks_like_signature(raw):
+        return None
+    ser.write(CMD_REALTIME)
+    block = read_until_quiet(ser)
+    if not block:
+        return None
+    return raw.rstrip(b'\0').decode('latin-1'), len(block)
+
+def probe(port, bauds=CANDIDATE_BAUDS, protocols=PROTOCOLS):
+    """Full probe over every baud/protocol; returns the config dict or None."""
+    for baud in bauds:
+        try:
+            ser = serial.Serial(port, baud, timeout=PROBE_TIMEOUT)
+        except serial.SerialException as e:
+            print(f"Failed to open {port}: {e}")
+            return None
+        try:
+            for protocol in protocols:
+                found = try_config(ser, protocol)
+                if found:
+                    signature, block_size = found
+                    return {'port': port, 'baud': baud, 'protocol': protocol,
+                            'signature': signature, 'block_size': block_size}
+        finally:
+            ser.close()
+    return None
+
+
+# --- CACHE ---
+def load_cache(path=CACHE_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_cache(config, path=CACHE_PATH):
+    cache = load_cache(path)
+    cache[config['port']] = config
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(cache, f, indent=2)
+        os.replace(tmp, path)
+    except OSError as e:
+        print("Could not save probe cache:", e)
+
+def open_config(config):
+    """Open the port with a known config and check the ECU still answers."""
+    ser = serial.Serial(config['port'], config['baud'], timeout=PROBE_TIMEOUT)
+    transport = Transport(ser, framed=config['protocol'] == "newserial")
+    try:
+        signature = transport.signature()
+    except TransportError:
+        signature = None
+    if signature != config['signature']:
+        ser.close()
+        return None
+    ser.timeout = RUN_TIMEOUT
+    transport.timeout = RUN_TIMEOUT
+    return ser, transport
+
+def connect(port, cache_path=CACHE_PATH, reprobe=False):
+    """
+    Return (ser, transport, config) for the ECU on `port`, or None.
+    Uses the cached config when it still answers, else probes from scratch.
+    """
+    config = None if reprobe else load_cache(cache_path).get(port)
+    if config:
+        try:
+            opened = open_config(config)
+        except serial.SerialException as e:
+            print(f"Failed to open {port}: {e}")
+            return None
+        if opened:
+            return opened + (config,)
+        print("Cached ECU settings stopped answering, re-probing...")
+
+    config = probe(port)
+    if config is None:
+        return None
+    save_cache(config, cache_path)
+    opened = open_config(config)
+    return opened + (config,) if opened else None
+
+
+# --- MAIN ---
+if __name__ == "__main__":
+    import sys
+    port = sys.argv[1] if len(sys.argv) > 1 else "/dev/ttyUSB0"
+    result = connect(port, reprobe="--reprobe" in sys.argv)
+    if result:
+        ser, transport, config = result
+        print(f"{config['signature']} on {port}: {config['baud']} baud, "
+              f"{config['protocol']}, {config['block_size']}-byte realtime block")
+        ser.close()
+    else:
+        print(f"No ECU found on {port}.")
@@ -0,0 +1,454 @@
+# ms_reactor.py
+"""
+Multi-device acquisition on one thread.
+
+Every serial device - the MegaSquirt, a wideband controller, a CAN/USB
+adapter - is opened non-blocking and registered with a selector (epoll
+on Linux). The loop sleeps in select() until a port has bytes, a poll is
+due or a reply is overdue, so no device ever waits on another: adding
+the wideband costs the MegaSquirt nothing, it is still polled the moment
+its PollScheduler allows.
+
+Each device is a small protocol handler: request() says what to send
+(nothing, for devices that stream on their own) and parse() turns the
+bytes received so far into channel values. The latest value of every
+channel is merged into one sample, stamped when its bytes arrived, and
+published to the shared ring, where the dash, logger and console reader
+already look:
+
+    python MS_Reactor.py                  # MS_PORT, WIDEBAND_PORT, CAN_PORT
+    python MS_Reactor.py /dev/ttyUSB0 - /dev/ttyACM0    # "-" skips a device
+    python MS_SharedRing.py --watch       # merged stream
+
+A device that stops sending has its channels dropped (NaN in the ring)
+after STALE_SECONDS; a port that fails is closed and reopened.
+"""
+import selectors
+import struct
+import time
+import zlib
+import serial
+from MS_Channels import default_layout, load_ini
+from MS_Scheduler import PollScheduler
+from MS_Transport import (frame, CMD_REALTIME, FLAG_NAMES, MAX_PAYLOAD,
+                          FrameError, TransportError)
+
+# --- CONFIG ---
+MS_PORT = "/dev/ttyUSB0"
+WIDEBAND_PORT = "/dev/ttyUSB1"
+CAN_PORT = "/dev/ttyACM0"
+INI_PATH = None               # firmware INI; the built-in MS2/Extra layout otherwise
+INI_SETTINGS = {'CELSIUS'}    # the INI's #set symbols; CELSIUS: temperatures in C
+CAN_BITRATE = 500000
+STALE_SECONDS = 2.0
+REOPEN_SECONDS = 2.0
+READ_SIZE = 4096
+
+# CAN signals: name -> (id, first byte, bytes, byte order, signed, scale, offset).
+# Example sensor module frames; edit to match what is on the bus.
+CAN_SIGNALS = {
+    'oil_pressure': (0x640, 0, 2, 'big', False, 0.1, 0.0),
+    'oil_temp': (0x640, 2, 2, 'big', True, 0.1, 0.0),
+    'fuel_pressure': (0x640, 4, 2, 'big', False, 0.1, 0.0),
+    'lat_g': (0x641, 0, 2, 'big', True, 0.001, 0.0),
+    'long_g': (0x641, 2, 2, 'big', True, 0.001, 0.0),
+}
+
+_LEN = struct.Struct('>H')
+_CRC = struct.Struct('>I')
+
+# Lawicel/SLCAN bitrate commands
+SLCAN_BITRATES = {10000: b'S0', 20000: b'S1', 50000: b'S2', 100000: b'S3',
+                  125000: b'S4', 250000: b'S5', 500000: b'S6', 800000: b'S7',
+                  1000000: b'S8'}
+
+
+# --- DEVICES ---
+class Device:
+    """
+    One serial device. Polled devices have a PollScheduler and a request();
+    streaming devices have neither. parse() consumes self.buf and returns
+    {channel: value} for every complete message in it (None if there is
+    none yet), raising TransportError on garbage.
+    """
+
+    names = ()
+
+    def __init__(self, name, port, baud, timeout=0.5):
+        self.name = name
+        self.port = port
+        self.baud = baud
+        self.timeout = timeout
+        self.ser = None
+        self.scheduler = None
+        self.buf = bytearray()
+        self.deadline = None       # reply due by, while a request is out
+        self.last_rx = 0.0
+        self.messages = 0
+        self.errors = 0
+        self.reopen_at = 0.0
+        self.open_error = None
+
+    def open(self):
+        self.ser = serial.Serial(self.port, self.baud, timeout=0)
+        return self.ser
+
+    def start(self):
+        """Bytes to send once after opening, or None."""
+        return None
+
+    def request(self):
+        return None
+
+    def parse(self):
+        raise NotImplementedError
+
+    def close(self):
+        if self.ser is not None:
+            try:
+                self.ser.close()
+            except OSError:
+                pass
+        self.ser = None
+        self.buf.clear()
+        self.deadline = None
+
+
+class MegaSquirt(Device):
+    """
+    Realtime block polling, newserial (framed, CRC32) or legacy raw.
+    block_size is the probed realtime block length (MS_Probe config); a
+    legacy reply carries no length, so it is split on that size, or on
+    the layout's ochBlockSize when the port was never probed.
+    """
+
+    def __init__(self, port=MS_PORT, baud=115200, layout=None, framed=True, capture=None,
+                 block_size=None):
+        super().__init__("megasquirt", port, baud)
+        self.layout = layout or default_layout()
+        self.names = tuple(self.layout.names)
+        self.framed = framed
+        self.block_size = block_size or self.layout.block_size
+        self.capture = capture     # optional MS_Capture.FrameCapture for raw blocks
+        self.scheduler = PollScheduler(baud=baud, block_size=self.block_size)
+        self._request = frame(CMD_REALTIME) if framed else CMD_REALTIME
+
+    def request(self):
+        return self._request
+
+    def parse(self):
+        buf = self.buf
+        if self.framed:
+            if len(buf) < _LEN.size:
+                return None
+            (length,) = _LEN.unpack_from(buf)
+            if length == 0 or length > MAX_PAYLOAD:
+                raise FrameError(f"bad length {length}")
+            end = _LEN.size + length + _CRC.size
+            if len(buf) < end:
+                return None
+            data = bytes(buf[_LEN.size:_LEN.size + length])
+            (crc,) = _CRC.unpack_from(buf, end - _CRC.size)
+            del buf[:end]
+            if zlib.crc32(data) != crc:
+                raise FrameError("CRC mismatch")
+            if data[0] & 0x80:
+                raise FrameError(FLAG_NAMES.get(data[0], f"error flag 0x{data[0]:02X}"))
+            block = data[1:]
+        else:
+            size = self.block_size
+            if len(buf) < size:
+                return None
+            block = bytes(buf[:size])
+            del buf[:size]
+        if self.capture:
+            self.capture.write(block)
+        return self.layout.decode(block) or None
+
+
+class Wideband(Device):
+    """
+    Wideband controller streaming ASCII AFR lines ("14.7\\r\\n"), as the
+    AEM UEGO/X-Series serial outputs do at 9600 baud. Nothing is sent.
+    """
+
+    def __init__(self, port=WIDEBAND_PORT, baud=9600, channel='wb_afr'):
+        super().__init__("wideband", port, baud)
+        self.channel = channel
+        self.names = (channel,)
+
+    def parse(self):
+        buf = self.buf
+        value = None
+        while True:
+            i = buf.find(b'\n')
+            if i < 0:
+                break
+            line = bytes(buf[:i]).strip()
+            del buf[:i + 1]
+            try:
+                value = float(line)
+            except ValueError:
+                if line:
+                    self.errors += 1
+        if len(buf) > 64:
+            buf.clear()
+            raise FrameError("no line ending (wrong baud?)")
+        return None if value is None else {self.channel: value}
+
+
+class CANAdapter(Device):
+    """
+    CAN/USB adapter speaking the Lawicel/SLCAN ASCII protocol (CANable,
+    USBtin, ...). The bus is opened listen-only on start; frames stream in
+    as "t1232AABB\\r" and the signals in `signals` are decoded from them.
+    """
+
+    def __init__(self, port=CAN_PORT, baud=115200, bitrate=CAN_BITRATE, signals=CAN_SIGNALS):
+        super().__init__("can", port, baud)
+        self.bitrate = bitrate
+        self.names = tuple(signals)
+        self.by_id = {}
+        for name, (can_id, first, size, order, signed, scale_, offset) in signals.items():
+            self.by_id.setdefault(can_id, []).append(
+                (name, first, first + size, order, signed, scale_, offset))
+        self.frames = 0
+
+    def start(self):
+        return b'C\r' + SLCAN_BITRATES[self.bitrate] + b'\rL\r'
+
+    def parse(self):
+        buf = self.buf
+        out = None
+        while True:
+            i = buf.find(b'\r')
+            if i < 0:
+                break
+            line = bytes(buf[:i]).lstrip(b'\x07')   # BEL is a NAK to a command
+            del buf[:i + 1]
+            if not line or line[0] not in b'tT':
+                continue
+            id_len = 3 if line[0] == ord('t') else 8
+            try:
+                can_id = int(line[1:1 + id_len], 16)
+                dlc = int(line[1 + id_len:2 + id_len], 16)
+                data = bytes.fromhex(line[2 + id_len:2 + id_len + 2 * dlc].decode('ascii'))
+            except ValueError:
+                self.errors += 1
+                continue
+            self.frames += 1
+            for name, start, end, order, signed, scale_, offset in self.by_id.get(can_id, ()):
+                if end <= len(data):
+                    if out is None:
+                        out = {}
+                    out[name] = int.from_bytes(data[start:end], order, signed=signed) \
+                        * scale_ + offset
+        if len(buf) > 64:
+            buf.clear()
+            raise FrameError("no frame terminator")
+        return out
+
+
+# --- REACTOR ---
+class Reactor:
+    """
+    Drives every device from one selector loop and merges their channels.
+    publish(values, timestamp) receives each merged sample; RingWriter's
+    publish fits directly.
+    """
+
+    def __init__(self, devices, publish=None, stale=STALE_SECONDS):
+        self.devices = list(devices)
+        names = [n for d in self.devices for n in d.names]
+        duplicates = sorted({n for n in names if names.count(n) > 1})
+        if duplicates:
+            raise ValueError("channel names used by more than one device: "
+                             + ", ".join(duplicates))
+        self.names = names
+        self.publish = publish
+        self.stale = stale
+        self.values = {}
+        self.samples = 0
+        self.selector = selectors.DefaultSelector()
+        self._stop = False
+
+    def _open(self, device, now):
+        try:
+            ser = device.open()
+            init = device.start()
+            if init:
+                ser.write(init)
+            # Registered last: a failed init write must not leave the fd in
+            # the selector, or the next reopen's register() raises KeyError
+            self.selector.register(ser.fileno(), selectors.EVENT_READ, device)
+            device.last_rx = now
+            device.open_error = None
+            print(f"{device.name}: {device.port} open")
+        except (OSError, serial.SerialException) as e:
+            device.close()
+            device.reopen_at = now + REOPEN_SECONDS
+            if str(e) != device.open_error:   # once, not every retry
+                device.open_error = str(e)
+                print(f"{device.name}: {device.port} unavailable ({e})")
+
+    def _fail(self, device, now):
+        """Port error: drop it from the selector and try again later."""
+        if device.ser is not None:
+            try:
+                self.selector.unregister(device.ser.fileno())
+            except (KeyError, ValueError, OSError):
+                pass
+        device.close()
+        device.reopen_at = now + REOPEN_SECONDS
+        self._drop(device)
+
+    def _drop(self, device):
+        for name in device.names:
+            self.values.pop(name, None)
+
+    def _error(self, device):
+        """Bad or missing reply: resynchronise and let the scheduler back off."""
+        device.errors += 1
+        device.buf.clear()
+        if device.scheduler and device.deadline is not None:
+            device.scheduler.end(False)
+        device.deadline = None
+        try:
+            device.ser.reset_input_buffer()
+        except (OSError, serial.SerialException):
+            pass
+
+    def _read(self, device, now):
+        try:
+            data = device.ser.read(READ_SIZE)
+        except (OSError, serial.SerialException):
+            self._fail(device, now)
+            return False
+        if not data:
+            return False
+        device.buf += data
+        try:
+            values = device.parse()
+        except TransportError:
+            self._error(device)
+            return False
+        if values is None:
+            return False
+        device.messages += 1
+        device.last_rx = now
+        if device.scheduler and device.deadline is not None:
+            device.scheduler.end(True)
+            device.deadline = None
+        self.values.update(values)
+        return True
+
+    def _service(self, device, now):
+        """Timeouts, staleness and due polls; returns when to look at it next."""
+        if device.ser is None:
+            if now >= device.reopen_at:
+                self._open(device, now)
+            if device.ser is None:
+                return device.reopen_at
+        if device.deadline is not None and now >= device.deadline:
+            self._error(device)
+        if now - device.last_rx > self.stale:
+            self._drop(device)
+        if device.scheduler is None:
+            return device.last_rx + self.stale if now - device.last_rx <= self.stale \
+                else now + self.stale
+        if device.deadline is not None:
+            return device.deadline
+        delay = device.scheduler.delay()
+        if delay > 0:
+            return now + delay
+        try:
+            device.ser.write(device.request())
+        except (OSError, serial.SerialException):
+            self._fail(device, now)
+            return device.reopen_at
+        device.scheduler.mark_start()
+        device.deadline = now + device.timeout
+        return device.deadline
+
+    def run(self):
+        select = self.selector.select
+        devices = self.devices
+        while not self._stop:
+            now = time.monotonic()
+            wake = min(self._service(d, now) for d in devices)
+            events = select(max(0.0, wake - time.monotonic()))
+            now = time.monotonic()
+            updated = False
+            for key, _ in events:
+                updated |= self._read(key.data, now)
+            # Everything that arrived in one wake-up becomes one sample
+            if updated:
+                self.samples += 1
+                if self.publish:
+                    self.publish(self.values, now)
+
+    def stop(self):
+        self._stop = True
+
+    def close(self):
+        for device in self.devices:
+            if device.ser is not None:
+                try:
+                    self.selector.unregister(device.ser.fileno())
+                except (KeyError, ValueError, OSError):
+                    pass
+            device.close()
+        self.selector.close()
+
+    def report(self):
+        lines = [f"{self.samples} merged samples"]
+        for d in self.devices:
+            line = f"{d.name:11s} {d.messages} messages, {d.errors} errors"
+            if d.scheduler:
+                line += f", {d.scheduler.summary()}"
+            lines.append(line)
+        return lines
+
+
+# --- MAIN ---
+if __name__ == "__main__":
+    import sys
+    from MS_Probe import load_cache
+    from MS_SharedRing import RingWriter
+    # python MS_Reactor.py [ms port] [wideband port] [can port]; "-" skips a device
+    ports = sys.argv[1:] + [None] * 3
+    layout = load_ini(INI_PATH, INI_SETTINGS) if INI_PATH else None
+    devices = []
+    if ports[0] != "-":
+        ms_port = ports[0] or MS_PORT
+        # Baud, protocol and block size as last found by MS_Probe, if it has seen this port
+        config = load_cache().get(ms_port, {})
+        devices.append(MegaSquirt(ms_port, config.get('baud', 115200), layout,
+                                  framed=config.get('protocol', "newserial") == "newserial",
+                                  block_size=config.get('block_size')))
+    if ports[1] != "-":
+        devices.append(Wideband(ports[1] or WIDEBAND_PORT))
+    if ports[2] != "-":
+        devices.append(CANAdapter(ports[2] or CAN_PORT))
+    if not devices:
+        sys.exit("No devices.")
+    reactor = Reactor(devices)
+    try:
+        ring = RingWriter(reactor.names)
+    except FileExistsError as e:
+        reactor.close()
+        sys.exit(str(e))
+    reactor.publish = ring.publish
+    print(f"Publishing {len(reactor.names)} channels from "
+          f"{', '.join(d.name for d in devices)} to the shared ring.")
+    start = time.monotonic()
+    try:
+        reactor.run()
+    except KeyboardInterrupt:
+        elapsed = time.monotonic() - start
+        print(f"\n{elapsed:.1f}s, {reactor.samples / elapsed:.0f} samples/s")
+        for line in reactor.report():
+            print(line)
+    finally:
+        reactor.close()
+        ring.close()
@@ -0,0 +1,104 @@
+# ms_scheduler.py
+"""
+Adaptive poll-rate scheduler.
+
+Instead of a hard-coded sleep, the poll interval follows the measured
+round-trip time of each request: it runs as fast as the link sustains,
+backs off multiplicatively on timeouts/bad frames, and recovers gradually
+once requests succeed again. How fast samples are consumed is not its
+concern: readers of a latest-value slot simply skip stale ones.
+
+    sched = PollScheduler(baud=BAUD, block_size=212)
+    while True:
+        sched.begin()                 # sleeps until the next poll is due
+        try:
+            reply = transport.read_realtime()
+            sched.end(True)
+        except TransportError:
+            sched.end(False)
+"""
+import time
+from collections import deque
+
+FRAME_OVERHEAD = 7 + 7   # reply length+flag+CRC (2+1+4), plus the framed 'A' request
+
+
+class PollScheduler:
+
+    def __init__(self, baud=None, block_size=None, min_interval=0.005,
+                 max_interval=1.0, headroom=0.1, window=50):
+        self.baud = baud
+        self.block_size = block_size
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.headroom = headroom
+
+        self.rtt = self.wire_time() or min_interval
+        self.backoff = 1.0
+        self.interval = self._target()
+        self._last_start = None
+        self._started = None
+        self._starts = deque(maxlen=window)
+        self._results = deque(maxlen=window)
+        self.polls = 0
+        self.failures = 0
+
+    def wire_time(self):
+        """Theoretical transfer time of one request/reply at 10 bits per byte."""
+        if not self.baud or not self.block_size:
+            return 0.0
+        return (self.block_size + FRAME_OVERHEAD) * 10.0 / self.baud
+
+    def _target(self):
+        base = max(self.min_interval, self.rtt * (1.0 + self.headroom))
+        return min(self.max_interval, base * self.backoff)
+
+    def delay(self):
+        """Seconds until the next poll is due."""
+        if self._last_start is None:
+            return 0.0
+        return max(0.0, self._last_start + self.interval - time.monotonic())
+
+    def begin(self):
+        """Sleep until the next poll is due, then mark the request start."""
+        delay = self.delay()
+        if delay > 0:
+            time.sleep(delay)
+        self.mark_start()
+
+    def mark_start(self):
+        """Mark the request start without sleeping (async callers sleep themselves)."""
+        now = time.monotonic()
+        self._last_start = self._started = now
+        self._starts.append(now)
+
+    def end(self, ok):
+        """Record the outcome of the request started by begin()."""
+        rtt = time.monotonic() - self._started if self._started else 0.0
+        self.polls += 1
+        self._results.append(ok)
+        if ok:
+            self.rtt += 0.2 * (rtt - self.rtt)
+            self.backoff = max(1.0, self.backoff * 0.9)
+        else:
+            self.failures += 1
+            self.backoff = min(self.max_interval / self.min_interval, self.backoff * 2.0)
+        self.interval = self._target()
+
+    def error_rate(self):
+        if not self._results:
+            return 0.0
+        return 1.0 - sum(self._results) / len(self._results)
+
+    def achieved_hz(self):
+        """Poll rate over the recent window."""
+        if len(self._starts) < 2:
+            return 0.0
+        span = self._starts[-1] - self._starts[0]
+        return (len(self._starts) - 1) / span if span > 0 else 0.0
+
+    def summary(self):
+        link = f"{self.baud} baud, " if self.baud else ""
+        return (f"{link}{self.achieved_hz():.1f} Hz achieved, "
+                f"rtt {self.rtt * 1000:.1f} ms (wire {self.wire_time() * 1000:.1f} ms), "
+                f"{self.error_rate() * 100:.0f}% errors, backoff x{self.backoff:.2f}")
@@ -0,0 +1,274 @@
+# ms_shared_ring.py
+"""
+Shared-memory ring buffer of decoded samples.
+
+One acquisition process owns the serial port and writes fixed-width
+samples (sequence number, monotonic timestamp, one float64 per channel)
+into a multiprocessing.shared_memory ring. Any number of readers (the
+OLED dash, a logger, a console table) attach by name and read without
+locks: each slot carries its sequence number, written last by the writer
+and re-checked by the reader, so a slot overwritten mid-read is detected
+and skipped instead of blocking the writer. The writer's pid is kept in
+the header: a second writer refuses to take over a live ring, and only
+replaces one left behind by a crashed process.
+
+    python MS_SharedRing.py            # acquisition process
+    python MS_Reactor.py               # or: ECU, wideband and CAN merged
+    python MS_SharedRing.py --watch    # console table reader
+"""
+import os
+import struct
+import time
+from multiprocessing import shared_memory
+
+# --- CONFIG ---
+RING_NAME = "msdash_ring"
+RING_SLOTS = 1024
+NAME_LEN = 32
+
+MAGIC = b'MSRB'
+VERSION = 2
+_HEADER = struct.Struct('<4sHHII')   # magic, version, channels, slots, slot size
+_WRITE_SEQ = struct.Struct('<Q')     # total samples published
+_WRITER = struct.Struct('<I')        # writer pid, after the write seq
+_WRITER_AT = _HEADER.size + _WRITE_SEQ.size
+_SLOT_HEAD = struct.Struct('<Qd')    # slot seq, timestamp
+_SEQ = struct.Struct('<Q')
+HEADER_SIZE = 64
+NAN = float('nan')
+
+_owned = set()   # segments created by a RingWriter in this process
+
+
+def _attach(name):
+    """Attach to an existing segment without letting this process unlink it at exit."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13: the resource tracker would destroy the segment when a reader exits
+        from multiprocessing import resource_tracker
+        shm = shared_memory.SharedMemory(name=name)
+        if name not in _owned:
+            # ...but not the writer's own registration, which its unlink() removes
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+def _alive(pid):
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True   # exists, owned by another user
+    return True
+
+
+class _Ring:
+    def _map(self, shm):
+        self.shm = shm
+        self.buf = shm.buf
+        magic, _, n, self.n_slots, self.slot_size = _HEADER.unpack_from(self.buf)
+        if magic != MAGIC:
+            raise ValueError(f"{shm.name} is not a sample ring")
+        names_at = HEADER_SIZE
+        self.names = [bytes(self.buf[names_at + i * NAME_LEN:names_at + (i + 1) * NAME_LEN])
+                      .rstrip(b'\0').decode() for i in range(n)]
+        self.data_at = names_at + n * NAME_LEN
+        self._slot = struct.Struct(f'<Qd{n}d')
+        self._values = self.buf[self.data_at:self.data_at + self.n_slots * self.slot_size].cast('d')
+
+    def _slot_at(self, seq):
+        return self.data_at + ((seq - 1) % self.n_slots) * self.slot_size
+
+    @property
+    def write_seq(self):
+        return _WRITE_SEQ.unpack_from(self.buf, _HEADER.size)[0]
+
+
+class RingWriter(_Ring):
+    """
+    Owns the segment; publish() never blocks and never allocates a new slot.
+    Raises FileExistsError if another live process is writing the ring.
+    """
+
+    def __init__(self, names, name=RING_NAME, slots=RING_SLOTS):
+        n = len(names)
+        slot_size = _SLOT_HEAD.size + 8 * n
+        size = HEADER_SIZE + n * NAME_LEN + slots * slot_size
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            existing = _attach(name)
+            pid = 0
+            if existing.size >= HEADER_SIZE and bytes(existing.buf[:4]) == MAGIC:
+                pid = _WRITER.unpack_from(existing.buf, _WRITER_AT)[0]
+            existing.close()
+            if _alive(pid):
+                raise FileExistsError(f"shared ring '{name}' already has a live writer "
+                                      f"(pid {pid})") from None
+            # Left behind by a crashed writer
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        _HEADER.pack_into(shm.buf, 0, MAGIC, VERSION, n, slots, slot_size)
+        _WRITE_SEQ.pack_into(shm.buf, _HEADER.size, 0)
+        _WRITER.pack_into(shm.buf, _WRITER_AT, os.getpid())
+        _owned.add(name)
+        for i, ch in enumerate(names):
+            shm.buf[HEADER_SIZE + i * NAME_LEN:HEADER_SIZE + (i + 1) * NAME_LEN] = \
+                ch.encode()[:NAME_LEN].ljust(NAME_LEN, b'\0')
+        self._map(shm)
+        self.seq = 0
+
+    def publish(self, values, timestamp=None):
+        """Write one sample: `values` is a dict keyed by channel name."""
+        seq = self.seq + 1
+        at = self._slot_at(seq)
+        # Invalidate the slot first and stamp its seq last, so readers never
+        # accept a half-written sample
+        _SEQ.pack_into(self.buf, at, 0)
+        self._slot.pack_into(self.buf, at, 0,
+                             timestamp if timestamp is not None else time.monotonic(),
+                             *[values.get(ch, NAN) for ch in self.names])
+        _SEQ.pack_into(self.buf, at, seq)
+        _WRITE_SEQ.pack_into(self.buf, _HEADER.size, seq)
+        self.seq = seq
+        return seq
+
+    def close(self):
+        _WRITER.pack_into(self.buf, _WRITER_AT, 0)
+        self._values.release()
+        self.shm.close()
+        self.shm.unlink()
+        _owned.discard(self.shm.name)
+
+
+class RingReader(_Ring):
+    """Attaches to a running writer's ring; reads never block the writer."""
+
+    def __init__(self, name=RING_NAME):
+        self._map(_attach(name))
+        self.last_seq = 0
+        self.dropped = 0
+
+    def view(self, seq):
+        """
+        Zero-copy memoryview of the channel values of sample `seq`.
+        Check valid(seq) after using it: the writer may have lapped the slot.
+        """
+        first = (self._slot_at(seq) + _SLOT_HEAD.size - self.data_at) // 8
+        return self._values[first:first + len(self.names)]
+
+    def valid(self, seq):
+        return _SEQ.unpack_from(self.buf, self._slot_at(seq))[0] == seq
+
+    def read(self, seq):
+        """Copy out (timestamp, values tuple) for `seq`, or None if overwritten."""
+        at = self._slot_at(seq)
+        sample = self._slot.unpack_from(self.buf, at)
+        if sample[0] != seq or not self.valid(seq):
+            return None
+        return sample[1], sample[2:]
+
+    def latest(self):
+        """Most recent sample as (seq, timestamp, {name: value}), or None."""
+        for _ in range(3):
+            seq = self.write_seq
+            if not seq:
+                return None
+            sample = self.read(seq)
+            if sample:
+                return seq, sample[0], dict(zip(self.names, sample[1]))
+            # lapped while reading, retry on the newest
+        return None
+
+    def poll(self):
+        """Return every sample published since the last poll, oldest first."""
+        newest = self.write_seq
+        start = max(self.last_seq + 1, newest - self.n_slots + 2)
+        if start > self.last_seq + 1:
+            self.dropped += start - self.last_seq - 1
+        out = []
+        for seq in range(start, newest + 1):
+            sample = self.read(seq)
+            if sample is None:
+                self.dropped += 1
+                continue
+            out.append((seq, sample[0], sample[1]))
+        self.last_seq = newest
+        return out
+
+    def close(self):
+        self._values.release()
+        self.shm.close()
+
+
+# --- ACQUISITION PROCESS ---
+def acquire(port="/dev/ttyUSB0", ini_path=None, settings=('CELSIUS',)):
+    from MS_Channels import default_layout, load_cached
+    from MS_Probe import connect
+    from MS_Scheduler import PollScheduler
+    from MS_Transport import TransportError
+
+    result = connect(port)
+    if not result:
+        print(f"No ECU found on {port}.")
+        return
+    ser, transport, config = result
+    layout = load_cached(ini_path, config['signature'], settings) if ini_path else default_layout()
+    try:
+        ring = RingWriter(layout.names)
+    except FileExistsError as e:
+        print(e)
+        ser.close()
+        return
+    scheduler = PollScheduler(baud=config['baud'], block_size=config['block_size'])
+    print(f"Publishing {len(layout)} channels to shared memory '{RING_NAME}'.")
+    try:
+        while True:
+            scheduler.begin()
+            try:
+                block = transport.read_realtime(config['block_size'])
+            except TransportError:
+                scheduler.end(False)
+                continue
+            scheduler.end(True)
+            values = layout.decode(block)
+            if values:
+                ring.publish(values)
+    except KeyboardInterrupt:
+        print("\n" + scheduler.summary())
+    finally:
+        ring.close()
+        ser.close()
+
+def watch(channels=('rpm', 'map', 'coolant', 'mat', 'tps', 'afr1')):
+    """Console table reader, like Poll_9600_2's, fed from the ring."""
+    reader = RingReader()
+    header = ' '.join(f"{ch:>8}" for ch in channels)
+    print(header)
+    print("-" * len(header))
+    try:
+        while True:
+            latest = reader.latest()
+            if latest:
+                _, _, values = latest
+                print(' '.join(f"{values.get(ch, NAN):>8.1f}" for ch in channels))
+            time.sleep(0.2)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        reader.close()
+
+
+# --- MAIN ---
+if __name__ == "__main__":
+    import sys
+    if "--watch" in sys.argv:
+        watch()
+    else:
+        args = [a for a in sys.argv[1:] if not a.startswith("--")]
+        acquire(*args)
@@ -0,0 +1,367 @@
+# ms_simulator.py
+"""
+Virtual MS2/Extra ECU on a pseudo-terminal.
+
+Opens a pty and answers realtime ('A' / legacy RT_REQUEST), signature,
+version and ranged 'r' reads exactly like the firmware, in both the
+newserial (framed, CRC32) and legacy raw protocols. Realtime blocks are
+built with ChannelLayout.encode() from either a synthetic engine model or
+a recorded .msl/.mlg log replayed at 1x, N x or maximum speed; an
+MS_Capture file replays the ECU's own raw frames byte for byte. The serial
+link can be slowed to a real baud rate and replies can be dropped,
+corrupted or truncated on purpose, so the pollers, the probe and the
+dashboard can be exercised and timed with no car attached.
+
+    python MS_Simulator.py                                  # synthetic engine
+    python MS_Simulator.py --replay track.msl --speed 4     # 4x real time
+    python MS_Simulator.py --replay track.mlg --speed 0 --baud 115200 --errors 0.01
+    python MS_Simulator.py --replay ecu.cap                 # raw frame capture
+    MSDASH_PORT=/tmp/ttyMS python newMScode.py              # with --link /tmp/ttyMS
+"""
+import bisect
+import math
+import os
+import random
+import select
+import struct
+import time
+import tty
+import zlib
+from MS_Capture import is_capture, read_capture
+from MS_Channels import default_layout, load_ini
+from MS_Transport import frame, CMD_REALTIME, CMD_SIGNATURE, CMD_VERSION, OUTPC_TABLE
+
+# --- CONFIG ---
+SIGNATURE = "MS2Extra comms342h"
+VERSION = "MS2/Extra 3.4.2 simulator"
+MAX_STEP = 0.01        # synthetic model seconds per request at maximum speed
+
+# Log column names (TunerStudio defaults) -> INI output channel names
+LOG_ALIASES = {
+    'rpm': 'rpm', 'map': 'map', 'clt': 'coolant', 'coolant': 'coolant',
+    'mat': 'mat', 'iat': 'mat', 'tps': 'tps', 'afr': 'afr1', 'afr1': 'afr1',
+    'afr2': 'afr2', 'batt v': 'batteryVoltage', 'battery': 'batteryVoltage',
+    'spk adv': 'advance', 'advance': 'advance', 'baro': 'barometer',
+    'pw': 'pulseWidth1', 'pw1': 'pulseWidth1', 'pw2': 'pulseWidth2',
+    'afr target': 'afrtgt1', 'afr target 1': 'afrtgt1', 'ego cor1': 'egoCorrection1',
+    've1': 'veCurr1', 'dwell': 'dwell', 'knock': 'knock',
+}
+
+_RANGE = struct.Struct('>BBHH')    # can id, table, offset, length (after 'r')
+ERROR_KINDS = ("drop", "corrupt", "truncate")
+
+
+# --- DATA SOURCES ---
+class EngineModel:
+    """
+    Synthetic drive cycle: idle, a throttle sweep with boost, overrun and
+    back to idle every `period` seconds, while the coolant warms up.
+    sample(t) is a pure function of model time and `seed` (the noise is
+    re-seeded from both on every call), so any replay speed works and a
+    bench run sees the same samples every time.
+    """
+
+    def __init__(self, period=20.0, seed=0):
+        self.period = period
+        self.seed = seed
+        self.noise = random.Random()
+
+    def sample(self, t):
+        self.noise.seed(hash((self.seed, t)))
+        n = self.noise.gauss
+        phase = (t % self.period) / self.period
+        tps = max(0.0, 85.0 * math.sin(2 * math.pi * phase)) + abs(n(0, 0.3))
+        load = tps / 100.0
+        rpm = 850 + 5600 * load ** 1.3 + n(0, 15)
+        map_kpa = 32 + 70 * load + max(0.0, load - 0.6) * 250 + n(0, 0.5)
+        afr_target = 14.7 if map_kpa < 100 else 14.7 - (map_kpa - 100) * 0.035
+        coolant = 90 - 70 * math.exp(-t / 300.0)
+        return {
+            'seconds': int(t) % 65536, 'rpm': rpm, 'tps': tps, 'map': map_kpa,
+            'barometer': 101.3, 'mat': 22 + 12 * load, 'coolant': coolant,
+            'afrtgt1': afr_target, 'afr1': afr_target + n(0, 0.12),
+            'afr2': afr_target + n(0, 0.12), 'advance': 32 - 0.12 * map_kpa,
+            'batteryVoltage': 14.1 + n(0, 0.03),
+            'pulseWidth1': 1.2 + 9.0 * map_kpa / 200, 'pulseWidth2': 1.2 + 9.0 * map_kpa / 200,
+            'veCurr1': 45 + 50 * load, 'egoCorrection1': 100 + n(0, 1.5),
+            'dwell': 3.0, 'ready': 1, 'crank': int(rpm < 300),
+        }
+
+
+class SyntheticSource:
+    def __init__(self, layout, model=None):
+        self.layout = layout
+        self.model = model or EngineModel()
+        self.step = MAX_STEP
+
+    def block(self, t):
+        return self.layout.encode(self.model.sample(t))
+
+
+class ReplaySource:
+    """
+    A recorded log, pre-encoded into realtime blocks so serving a request
+    is a bisect and a list lookup. Loops back to the start at the end.
+    Captured frames are already blocks and are served as they were sent.
+    """
+
+    def __init__(self, layout, path):
+        self.layout = layout
+        if is_capture(path):
+            times, self.blocks, _ = read_capture(path)
+        else:
+            if path.endswith(".mlg"):
+                times, rows = read_mlg(path)
+            else:
+                times, rows = read_msl(path)
+            self.blocks = [layout.encode(map_channels(row, layout)) for row in rows]
+        if not self.blocks:
+            raise ValueError(f"{path} has no data rows")
+        t0 = times[0]
+        self.times = [t - t0 for t in times]
+        self.duration = self.times[-1] or len(self.times) * MAX_STEP
+        self.step = self.duration / max(len(self.times) - 1, 1)   # one row per request
+
+    def block(self, t):
+        i = bisect.bisect_right(self.times, t % self.duration) - 1
+        return self.blocks[max(i, 0)]
+
+
+def map_channels(row, layout):
+    """Rename log columns to layout channel names (exact, case-insensitive or alias)."""
+    out = {}
+    lower = {name.lower(): name for name in layout.names}
+    for column, value in row.items():
+        key = column.strip().lower()
+        name = column if column in layout else lower.get(key) or LOG_ALIASES.get(key)
+        if name and name in layout:
+            out.setdefault(name, value)
+    return out
+
+def read_msl(path):
+    """Times and {column: value} rows of a TunerStudio .msl text log."""
+    from logfile_read import read_header, parse_rows
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        header = read_header(f)
+        if header is None:
+            return [], []
+        lines = f.readlines()
+    time_col = header.index("Time") if "Time" in header else None
+    times, rows = [], []
+    for i, cols in enumerate(parse_rows(lines)):
+        row = {h: float(v) for h, v in zip(header, cols) if v != ''}
+        times.append(row.get(header[time_col], i * MAX_STEP) if time_col is not None
+                     else i * MAX_STEP)
+        rows.append(row)
+    return times, rows
+
+def read_mlg(path):
+    """Times and {field: value} rows of a binary .mlg log."""
+    from MLG_Reader import MLGLog
+    with MLGLog(path) as log:
+        rows = [log.record(i) for i in range(len(log))]
+    times = [row.get('Time', i * MAX_STEP) for i, row in enumerate(rows)]
+    return times, rows
+
+
+# --- VIRTUAL ECU ---
+class VirtualECU:
+    """
+    Serves one data source on a pty.
+
+    speed is model seconds per wall-clock second: 1.0 is real time,
+    4.0 four times faster, 0 as fast as requests arrive (each request
+    advances the source by one step). baud=None answers instantly;
+    otherwise each exchange takes as long as its bytes would on the wire.
+    error_rate is the probability that a reply is dropped, corrupted or
+    truncated.
+    """
+
+    def __init__(self, source, signature=SIGNATURE, speed=1.0, baud=None,
+                 error_rate=0.0, latency=0.0, protocol="auto", seed=None):
+        self.source = source
+        self.layout = source.layout
+        self.signature = signature.encode('latin-1')
+        self.speed = speed
+        self.baud = baud
+        self.error_rate = error_rate
+        self.latency = latency
+        self.protocol = protocol
+        self.rng = random.Random(seed)
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+        self.link = None
+        self._buf = bytearray()
+        self._start = None
+        self._model_time = 0.0
+        self.requests = 0
+        self.bytes_out = 0
+        self.injected = dict.fromkeys(ERROR_KINDS, 0)
+
+    def symlink(self, path):
+        """Give the pty a stable name, e.g. /tmp/ttyMS."""
+        if os.path.islink(path):
+            os.unlink(path)
+        os.symlink(self.port, path)
+        self.link = path
+
+    def model_time(self):
+        if self.speed <= 0:
+            self._model_time += self.source.step
+            return self._model_time
+        if self._start is None:
+            self._start = time.monotonic()
+        return (time.monotonic() - self._start) * self.speed
+
+    # --- request handling ---
+    def _next_request(self):
+        """
+        Split one request off the input buffer.
+        Returns (framed, payload, bad_crc), or None if it is incomplete.
+        Framed requests start with the high byte of a small length (0x00);
+        anything else is a legacy single-byte command.
+        """
+        buf = self._buf
+        if self.protocol != "legacy" and buf[0] == 0:
+            if len(buf) < 2:
+                return None
+            length = (buf[0] << 8) | buf[1]
+            if len(buf) < 2 + length + 4:
+                return None
+            payload = bytes(buf[2:2 + length])
+            (crc,) = struct.unpack_from('>I', buf, 2 + length)
+            del buf[:2 + length + 4]
+            return True, payload, zlib.crc32(payload) != crc
+        if self.protocol == "newserial":
+            del buf[0]   # a real newserial ECU ignores stray bytes
+            return False, b'', False
+        if buf[0] == ord('r'):
+            if len(buf) < 1 + _RANGE.size:
+                return None
+            payload = bytes(buf[:1 + _RANGE.size])
+            del buf[:1 + _RANGE.size]
+            return False, payload, False
+        payload = bytes(buf[:1])
+        del buf[:1]
+        if payload == b'\x01':
+            # RT_REQUEST is 01 00 00 00; its zero padding is not a frame
+            while buf[:1] == b'\x00' and len(payload) < 4:
+                payload += bytes(buf[:1])
+                del buf[:1]
+        return False, payload, False
+
+    def answer(self, payload):
+        """(flag, data) reply for one request payload."""
+        cmd = payload[:1]
+        if cmd in (CMD_REALTIME, b'\x01'):
+            return 0x01, self.source.block(self.model_time())
+        if cmd == CMD_SIGNATURE:
+            return 0x00, self.signature
+        if cmd == CMD_VERSION:
+            return 0x00, VERSION.encode('latin-1')
+        if cmd == b'r' and len(payload) == 1 + _RANGE.size:
+            _, table, offset, length = _RANGE.unpack_from(payload, 1)
+            if table != OUTPC_TABLE or offset + length > self.layout.block_size:
+                return 0x84, b''
+            block = self.source.block(self.model_time())
+            return 0x01, block[offset:offset + length]
+        return 0x83, b''
+
+    def _inject(self, reply):
+        kind = self.rng.choice(ERROR_KINDS)
+        self.injected[kind] += 1
+        if kind == "drop":
+            return b''
+        if kind == "truncate":
+            return reply[:len(reply) // 2]
+        corrupt = bytearray(reply)
+        corrupt[self.rng.randrange(len(corrupt))] ^= 1 << self.rng.randrange(8)
+        return bytes(corrupt)
+
+    def handle(self, framed, payload, bad_crc):
+        if not payload and not framed:
+            return
+        self.requests += 1
+        if bad_crc:
+            flag, data = 0x82, b''
+        else:
+            flag, data = self.answer(payload)
+        if framed:
+            reply = frame(bytes((flag,)) + data)
+        elif flag & 0x80:
+            return   # legacy firmware just stays silent
+        else:
+            reply = data
+        if self.error_rate and self.rng.random() < self.error_rate:
+            reply = self._inject(reply)
+
+        delay = self.latency
+        if self.baud:
+            # 10 bit times per byte (8N1), request and reply
+            delay += (len(payload) + len(reply) + (6 if framed else 0)) * 10 / self.baud
+        if delay:
+            time.sleep(delay)
+        if reply:
+            os.write(self.master, reply)
+            self.bytes_out += len(reply)
+
+    def serve_forever(self):
+        poller = select.poll()
+        poller.register(self.master, select.POLLIN)
+        while True:
+            if not poller.poll(1000):
+                continue
+            self._buf += os.read(self.master, 4096)
+            while self._buf:
+                request = self._next_request()
+                if request is None:
+                    break
+                self.handle(*request)
+
+    def close(self):
+        if self.link and os.path.islink(self.link):
+            os.unlink(self.link)
+        os.close(self.master)
+        os.close(self.slave)
+
+
+# --- MAIN ---
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Virtual MS2/Extra ECU on a pty")
+    parser.add_argument("--replay", metavar="LOG", help=".msl/.mlg log or MS_Capture file to replay")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="replay speed: 1 real time, 4 four times faster, 0 maximum")
+    parser.add_argument("--baud", type=int, default=None, help="emulate this baud rate")
+    parser.add_argument("--latency", type=float, default=0.0, help="extra ms per reply")
+    parser.add_argument("--errors", type=float, default=0.0,
+                        help="probability of dropping/corrupting/truncating a reply")
+    parser.add_argument("--protocol", choices=["auto", "newserial", "legacy"], default="auto")
+    parser.add_argument("--ini", help="firmware INI for the realtime block layout")
+    parser.add_argument("--signature", default=SIGNATURE)
+    parser.add_argument("--link", help="symlink to create for the pty, e.g. /tmp/ttyMS")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    layout = load_ini(args.ini) if args.ini else default_layout()
+    source = ReplaySource(layout, args.replay) if args.replay else SyntheticSource(layout)
+    ecu = VirtualECU(source, args.signature, args.speed, args.baud, args.errors,
+                     args.latency / 1000.0, args.protocol, args.seed)
+    if args.link:
+        ecu.symlink(args.link)
+    print(f"Virtual ECU on {ecu.link or ecu.port} ({args.signature}, "
+          f"{layout.block_size}-byte blocks, "
+          f"{'replay ' + args.replay if args.replay else 'synthetic engine'}, "
+          f"speed {args.speed or 'max'})")
+    start = time.monotonic()
+    try:
+        ecu.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        elapsed = time.monotonic() - start
+        print(f"\n{ecu.requests} requests in {elapsed:.1f}s "
+              f"({ecu.requests / elapsed:.0f}/s), {ecu.bytes_out} bytes out, "
+              f"injected {ecu.injected}")
+        ecu.close()
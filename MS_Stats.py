@@ -0,0 +1,211 @@
+# ms_stats.py
+"""
+Always-on hot-path timers.
+
+Each phase of the dash loop (ECU request, decode, GPS, render, flush)
+owns a fixed-size latency histogram: log-spaced buckets with four
+sub-buckets per power of two of microseconds, so recording a sample is
+a perf_counter_ns pair, a bit_length and a list increment, and memory
+never grows however long the car runs. Percentiles are read off the
+buckets (within ~12%).
+
+The numbers are served as JSON on a local UNIX socket; this file is
+also the CLI that queries it:
+
+    python MS_Stats.py            # print the table once
+    python MS_Stats.py --watch    # refresh every second
+    python MS_Stats.py reset      # clear the histograms
+"""
+import json
+import os
+import socket
+import threading
+import time
+
+# --- CONFIG ---
+SOCKET_PATH = "/tmp/msdash_stats.sock"
+SUB = 4                 # sub-buckets per power of two
+BUCKETS = 26 * SUB      # up to ~67 s
+
+
+def _bucket(us):
+    if us < SUB:
+        return us
+    b = us.bit_length()
+    return min((b - 2) * SUB + ((us >> (b - 3)) & (SUB - 1)), BUCKETS - 1)
+
+def _bucket_high(i):
+    """Largest microsecond value that lands in bucket i."""
+    if i < SUB:
+        return i
+    b = i // SUB + 2
+    return ((SUB + i % SUB + 1) << (b - 3)) - 1
+
+
+class Histogram:
+
+    __slots__ = ('counts', 'count', 'total_ns', 'max_ns')
+
+    def __init__(self):
+        self.counts = [0] * BUCKETS
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def record(self, ns):
+        self.counts[_bucket(ns // 1000)] += 1
+        self.count += 1
+        self.total_ns += ns
+        if ns > self.max_ns:
+            self.max_ns = ns
+
+    def percentile(self, p):
+        """Upper bound of the bucket holding the p-th percentile, in ms."""
+        if not self.count:
+            return 0.0
+        rank = p / 100.0 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if n and seen >= rank:
+                return min(_bucket_high(i) / 1000.0, self.max_ns / 1e6)
+        return self.max_ns / 1e6
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean_ms': self.total_ns / self.count / 1e6 if self.count else 0.0,
+            'p50_ms': self.percentile(50),
+            'p99_ms': self.percentile(99),
+            'max_ms': self.max_ns / 1e6,
+        }
+
+    def reset(self):
+        self.counts = [0] * BUCKETS
+        self.count = self.total_ns = self.max_ns = 0
+
+
+class Timer:
+    """
+    Reusable context manager around one histogram. A timer belongs to
+    one thread (one engine stage), so the start time needs no locking.
+    """
+
+    __slots__ = ('hist', 'start')
+
+    def __init__(self, hist):
+        self.hist = hist
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.record(time.perf_counter_ns() - self.start)
+        return False
+
+
+class Stats:
+
+    def __init__(self, phases):
+        self.phases = list(phases)
+        self.hists = {name: Histogram() for name in self.phases}
+        self.timers = {name: Timer(h) for name, h in self.hists.items()}
+        self.started = time.monotonic()
+        self._server = None
+
+    def timer(self, phase):
+        return self.timers[phase]
+
+    def snapshot(self):
+        return {
+            'uptime_s': time.monotonic() - self.started,
+            'phases': {name: h.summary() for name, h in self.hists.items()},
+        }
+
+    def worst(self):
+        """(phase, p99 ms) of the slowest phase, for the Stats page."""
+        return max(((name, h.percentile(99)) for name, h in self.hists.items()),
+                   key=lambda item: item[1], default=("", 0.0))
+
+    def reset(self):
+        for h in self.hists.values():
+            h.reset()
+        self.started = time.monotonic()
+
+    # --- UNIX socket ---
+    def serve(self, path=SOCKET_PATH):
+        """Answer 'stats' / 'reset' requests on a UNIX socket from a daemon thread."""
+        if os.path.exists(path):
+            os.unlink(path)  # stale socket from a previous run
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(path)
+        server.listen(2)
+        self._server = server
+        threading.Thread(target=self._serve, args=(server,), name="stats", daemon=True).start()
+
+    def _serve(self, server):
+        while True:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                return  # closed
+            with conn:
+                conn.settimeout(1.0)
+                try:
+                    command = conn.recv(64).decode('ascii', 'replace').strip()
+                    if command == "reset":
+                        self.reset()
+                    conn.sendall(json.dumps(self.snapshot()).encode() + b"\n")
+                except OSError:
+                    pass
+
+    def close(self):
+        if self._server:
+            path = self._server.getsockname()
+            self._server.close()
+            self._server = None
+            if os.path.exists(path):
+                os.unlink(path)
+
+
+# --- CLIENT ---
+def query(command="stats", path=SOCKET_PATH, timeout=1.0):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.settimeout(timeout)
+        s.connect(path)
+        s.sendall(command.encode('ascii') + b"\n")
+        data = bytearray()
+        while not data.endswith(b"\n"):
+            chunk = s.recv(4096)
+            if not chunk:
+                break
+            data += chunk
+    return json.loads(data)
+
+def print_stats(snapshot):
+    print(f"uptime {snapshot['uptime_s']:.0f}s")
+    print(f"{'phase':8s} {'count':>8s} {'mean':>8s} {'p50':>8s} {'p99':>8s} {'max':>8s}  (ms)")
+    for name, s in snapshot['phases'].items():
+        print(f"{name:8s} {s['count']:8d} {s['mean_ms']:8.2f} {s['p50_ms']:8.2f} "
+              f"{s['p99_ms']:8.2f} {s['max_ms']:8.2f}")
+
+
+# --- MAIN ---
+if __name__ == "__main__":
+    import sys
+    command = "reset" if "reset" in sys.argv else "stats"
+    try:
+        if "--watch" in sys.argv:
+            while True:
+                print("\033[2J\033[H", end="")
+                print_stats(query(command))
+                command = "stats"
+                time.sleep(1.0)
+        else:
+            print_stats(query(command))
+    except (FileNotFoundError, ConnectionRefusedError):
+        print(f"No dash running (nothing listening on {SOCKET_PATH}).")
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,219 @@
+# ms_streams.py
+"""
+Streaming statistics over channels: smoothing, peak hold, windowed
+min/max/mean.
+
+Every statistic updates in O(1) time and fixed memory:
+
+    ema     exponential moving average with a time constant, so it
+            smooths the same at any sample rate
+    peak    highest value, held for `hold` seconds, then relaxing toward
+            the live value with time constant `decay`
+    min/max/mean over the last N seconds. The window is split into a
+            fixed number of time buckets; finished buckets feed
+            monotonic deques (min, max) and a running sum (mean), and
+            expire from the front as the window slides. Resolution is
+            window / buckets.
+
+Statistics are published back into the sample dict under their own
+names, so a page binds to "AFR smoothed" or "Boost peak" like any other
+channel:
+
+    streams = StreamStats(STREAMS)
+    streams.update(values)        # adds 'AFR smoothed', 'Boost peak', ...
+"""
+import math
+import time
+from collections import deque
+
+# name: (kind, source channel, parameters...)
+STREAMS = {
+    'AFR smoothed': ('ema', 'AFR', 0.3),
+    'RPM smoothed': ('ema', 'RPM', 0.15),
+    'MAP peak': ('peak', 'MAP', 3.0, 2.0),
+    'Boost peak': ('peak', 'Boost', 3.0, 2.0),
+    'CLT max': ('max', 'Coolant', 600.0),
+    'AFR min': ('min', 'AFR', 10.0),
+    'AFR max': ('max', 'AFR', 10.0),
+    'AFR mean': ('mean', 'AFR', 10.0),
+}
+WINDOW_BUCKETS = 32
+
+
+class EMA:
+
+    __slots__ = ('tau', 'value', 'last')
+
+    def __init__(self, tau):
+        self.tau = tau
+        self.value = None
+        self.last = 0.0
+
+    def add(self, v, t):
+        if self.value is None:
+            self.value = v
+        else:
+            alpha = 1.0 - math.exp(-(t - self.last) / self.tau) if self.tau > 0 else 1.0
+            self.value += alpha * (v - self.value)
+        self.last = t
+        return self.value
+
+
+class PeakHold:
+
+    __slots__ = ('hold', 'decay', 'value', 'peak_time', 'last')
+
+    def __init__(self, hold=3.0, decay=2.0):
+        self.hold = hold
+        self.decay = decay
+        self.value = None
+        self.peak_time = 0.0
+        self.last = 0.0
+
+    def add(self, v, t):
+        if self.value is None or v >= self.value:
+            self.value = v
+            self.peak_time = t
+        elif t - self.peak_time > self.hold:
+            # Held long enough: relax toward the live value
+            alpha = 1.0 - math.exp(-(t - self.last) / self.decay) if self.decay > 0 else 1.0
+            self.value += alpha * (v - self.value)
+        self.last = t
+        return self.value
+
+
+class Window:
+    """Bucketed sliding window with O(1) min, max and mean."""
+
+    def __init__(self, seconds, buckets=WINDOW_BUCKETS):
+        self.buckets = buckets
+        self.span = seconds / buckets
+        self.index = None
+        self.cur_min = self.cur_max = None
+        self.cur_sum = 0.0
+        self.cur_n = 0
+        self.maxq = deque()     # (bucket, max), values decreasing
+        self.minq = deque()     # (bucket, min), values increasing
+        self.sums = deque()     # (bucket, sum, count)
+        self.total = 0.0
+        self.count = 0
+
+    def add(self, v, t):
+        b = int(t / self.span)
+        if b != self.index:
+            self._roll(b)
+        if self.cur_n == 0:
+            self.cur_min = self.cur_max = v
+        elif v > self.cur_max:
+            self.cur_max = v
+        elif v < self.cur_min:
+            self.cur_min = v
+        self.cur_sum += v
+        self.cur_n += 1
+
+    def _roll(self, b):
+        if self.cur_n:
+            i = self.index
+            maxq, minq = self.maxq, self.minq
+            while maxq and maxq[-1][1] <= self.cur_max:
+                maxq.pop()
+            maxq.append((i, self.cur_max))
+            while minq and minq[-1][1] >= self.cur_min:
+                minq.pop()
+            minq.append((i, self.cur_min))
+            self.sums.append((i, self.cur_sum, self.cur_n))
+            self.total += self.cur_sum
+            self.count += self.cur_n
+        self.index = b
+        self.cur_sum = 0.0
+        self.cur_n = 0
+        # The window is the current bucket plus the buckets - 1 before it
+        oldest = b - self.buckets + 1
+        while self.maxq and self.maxq[0][0] < oldest:
+            self.maxq.popleft()
+        while self.minq and self.minq[0][0] < oldest:
+            self.minq.popleft()
+        sums = self.sums
+        while sums and sums[0][0] < oldest:
+            _, s, n = sums.popleft()
+            self.total -= s
+            self.count -= n
+
+    def max(self):
+        best = self.maxq[0][1] if self.maxq else None
+        if self.cur_n and (best is None or self.cur_max > best):
+            best = self.cur_max
+        return best
+
+    def min(self):
+        best = self.minq[0][1] if self.minq else None
+        if self.cur_n and (best is None or self.cur_min < best):
+            best = self.cur_min
+        return best
+
+    def mean(self):
+        n = self.count + self.cur_n
+        return (self.total + self.cur_sum) / n if n else None
+
+
+class StreamStats:
+
+    def __init__(self, streams=STREAMS, buckets=WINDOW_BUCKETS):
+        self.streams = dict(streams)
+        self.sources = {}           # source channel -> [(name, add, read)]
+        windows = {}
+        for name, (kind, source, *params) in self.streams.items():
+            if kind == 'ema':
+                stat = EMA(*params)
+                add, read = stat.add, None
+            elif kind == 'peak':
+                stat = PeakHold(*params)
+                add, read = stat.add, None
+            elif kind in ('min', 'max', 'mean'):
+                # min/max/mean over the same channel and span share one window
+                key = (source, params[0])
+                first = key not in windows
+                if first:
+                    windows[key] = Window(params[0], buckets)
+                stat = windows[key]
+                add, read = (stat.add if first else None), getattr(stat, kind)
+            else:
+                raise ValueError(f"unknown statistic '{kind}' for {name}")
+            self.sources.setdefault(source, []).append((name, add, read))
+
+    def requires(self, names):
+        """Replace statistic names by the channels they are computed from."""
+        return [self.streams[n][1] if n in self.streams else n for n in names]
+
+    def windowed(self):
+        """Statistics that need every sample, not just while they are on screen."""
+        return [n for n, spec in self.streams.items() if spec[0] != 'ema']
+
+    def update(self, values, now=None):
+        """Feed the sample's source channels and publish every statistic into `values`."""
+        t = time.monotonic() if now is None else now
+        for source, stats in self.sources.items():
+            v = values.get(source)
+            if not isinstance(v, (int, float)):
+                continue
+            for name, add, read in stats:
+                result = add(v, t) if add else None
+                if read:
+                    result = read()
+                if result is not None:
+                    values[name] = result
+        return values
+
+
+# --- MAIN ---
+if __name__ == "__main__":
+    import random
+    streams = StreamStats()
+    t = 0.0
+    for i in range(2000):
+        t += 0.05
+        sample = {'AFR': 14.7 + random.gauss(0, 0.4), 'MAP': 100 + 80 * (i % 400 < 40),
+                  'Coolant': 80 + i * 0.005, 'RPM': 3000 + random.gauss(0, 40)}
+        streams.update(sample, t)
+    for name in streams.streams:
+        print(f"{name:14s} {sample.get(name, float('nan')):8.2f}")
@@ -0,0 +1,145 @@
+# ms_transport.py
+"""
+MS2/Extra "newserial" transport.
+
+Every request and reply is framed as
+
+    [len u16 BE] [payload ...] [crc32 u32 BE over payload]
+
+and the first payload byte of a reply is a status flag. Because the
+length comes first, a reply is read with exactly two reads and returns
+the moment the last byte arrives - no fixed sleep, no guessed size.
+"""
+import struct
+import time
+import zlib
+
+# --- COMMANDS ---
+CMD_REALTIME = b'A'      # full outpc block
+CMD_SIGNATURE = b'Q'     # firmware signature
+CMD_VERSION = b'S'       # version / title string
+OUTPC_TABLE = 7          # outpc as a table for ranged 'r' reads
+
+# --- REPLY FLAGS ---
+FLAG_OK = 0x00
+FLAG_REALTIME = 0x01
+FLAG_PAGE = 0x02
+FLAG_NAMES = {
+    0x80: "underrun", 0x81: "overrun", 0x82: "CRC failure",
+    0x83: "unrecognised command", 0x84: "out of range",
+    0x85: "serial busy", 0x86: "flash locked",
+}
+
+MAX_PAYLOAD = 4096
+_LEN = struct.Struct('>H')
+_CRC = struct.Struct('>I')
+_RANGE = struct.Struct('>cBBHH')   # 'r', can id, table, offset, length
+
+
+class TransportError(Exception):
+    """Base class for serial transport failures."""
+
+class TransportTimeout(TransportError):
+    """The ECU did not send a complete frame in time."""
+
+class FrameError(TransportError):
+    """A frame arrived but was malformed, corrupt or flagged as an error."""
+
+
+def frame(payload):
+    """Wrap a payload in newserial framing."""
+    return _LEN.pack(len(payload)) + payload + _CRC.pack(zlib.crc32(payload))
+
+
+class Transport:
+    """
+    Request/response over an open pyserial port.
+
+    framed=False talks the legacy protocol instead: raw command bytes out,
+    exactly `length` bytes back, no CRC.
+    """
+
+    def __init__(self, ser, framed=True, timeout=None):
+        self.ser = ser
+        self.framed = framed
+        self.timeout = timeout if timeout is not None else (ser.timeout or 0.5)
+        self.frames = 0
+        self.errors = 0
+
+    def _read_exact(self, n, deadline):
+        """Read exactly n bytes; pyserial returns as soon as they arrive."""
+        buf = bytearray()
+        while len(buf) < n:
+            chunk = self.ser.read(n - len(buf))
+            if chunk:
+                buf += chunk
+            elif time.monotonic() >= deadline:
+                raise TransportTimeout(f"got {len(buf)} of {n} bytes")
+        return bytes(buf)
+
+    def _fail(self, exc):
+        self.errors += 1
+        # Drop whatever is left of a bad frame so the next request starts clean
+        self.ser.reset_input_buffer()
+        raise exc
+
+    def request(self, payload):
+        """Send one framed command; returns (flag, data) of the reply."""
+        self.ser.write(frame(payload))
+        deadline = time.monotonic() + self.timeout
+        try:
+            (length,) = _LEN.unpack(self._read_exact(2, deadline))
+            if length == 0 or length > MAX_PAYLOAD:
+                self._fail(FrameError(f"bad length {length}"))
+            body = self._read_exact(length + 4, deadline)
+        except TransportTimeout as e:
+            self._fail(e)
+
+        data, (crc,) = body[:-4], _CRC.unpack(body[-4:])
+        if zlib.crc32(data) != crc:
+            self._fail(FrameError("CRC mismatch"))
+        flag = data[0]
+        if flag & 0x80:
+            self._fail(FrameError(FLAG_NAMES.get(flag, f"error flag 0x{flag:02X}")))
+        self.frames += 1
+        return flag, data[1:]
+
+    def request_raw(self, command, length):
+        """Legacy unframed request: write command, read exactly length bytes."""
+        self.ser.write(command)
+        try:
+            reply = self._read_exact(length, time.monotonic() + self.timeout)
+        except TransportTimeout as e:
+            self._fail(e)
+        self.frames += 1
+        return reply
+
+    def read_realtime(self, length=None):
+        """
+        Return the realtime (outpc) block. The legacy protocol has no length
+        on the wire, so an unframed read needs the block size (the probed
+        config['block_size']).
+        """
+        if not self.framed:
+            if not length:
+                raise ValueError("legacy read_realtime needs the block length; "
+                                 "pass the probed config['block_size']")
+            return self.request_raw(CMD_REALTIME, length)
+        _, data = self.request(CMD_REALTIME)
+        return data
+
+    def read_range(self, offset, length, table=OUTPC_TABLE, can_id=0):
+        """Ranged read of `length` bytes at `offset` of an ECU table."""
+        _, data = self.request(_RANGE.pack(b'r', can_id, table, offset, length))
+        if len(data) != length:
+            self._fail(FrameError(f"expected {length} bytes, got {len(data)}"))
+        return data
+
+    def signature(self):
+        """Firmware signature string, e.g. 'MS2Extra comms342h'."""
+        if self.framed:
+            _, data = self.request(CMD_SIGNATURE)
+        else:
+            self.ser.write(CMD_SIGNATURE)
+            data = self.ser.read(64)
+        return data.rstrip(b'\0').decode('latin-1')
@@ -0,0 +1,295 @@
+# oled_layout.py
+"""
+Declarative multi-gauge page layouts for the OLED dashes.
+
+Pages come from a JSON file: each page lists gauges (number, bar,
+sparkline) with a region, fonts and a format, plus optional divider
+lines. When a layout is loaded, every gauge's geometry is resolved and
+everything static - labels, bar outlines, dividers - is drawn once into
+a per-page background bitmap. A frame is then the background pasted in
+one call plus only the dynamic parts: the value text from the glyph
+atlas, the bar fill, the sparkline trace.
+
+    dash = load_layout("dash_layout.json", 128, 32)
+    page = dash.pages[0]
+    state = page.state(values)          # hashable: unchanged -> skip frame
+    renderer.draw_frame((0, state), lambda draw: page.paint(renderer.image, draw, state))
+
+Layout file:
+
+    {"fonts": {"label": {}, "value": {"path": "...ttf", "size": 16}},
+     "pages": [{"name": "AFR", "lines": [[64, 0, 64, 31]],
+                "gauges": [{"type": "number", "channel": "AFR", "label": "AFR",
+                            "x": 0, "y": 0, "w": 64, "h": 32,
+                            "font": "value", "label_font": "label",
+                            "format": "{:.1f}", "align": "center"}]}]}
+
+A font with no path (or a missing file) is PIL's built-in bitmap font.
+"""
+import json
+import os
+import time
+from collections import deque
+from PIL import Image, ImageDraw, ImageFont
+from Glyph_Cache import GlyphAtlas, DEFAULT_CHARS
+
+BOLD_FONT = "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"
+
+# The single-gauge pages newMScode has always shown, used without a file
+DEFAULT_LAYOUT = {
+    "fonts": {"label": {}, "value": {"path": BOLD_FONT, "size": 16}},
+    "pages": [
+        {"name": name, "gauges": [{"type": "number", "channel": channel, "label": label,
+                                   "format": fmt, "font": "value", "label_font": "label"}]}
+        for name, channel, label, fmt in [
+            ("RPM", "RPM", "RPM", "{:.0f}"),
+            ("Coolant", "Coolant", "Coolant", "{:.0f}C"),
+            ("MAT", "MAT", "MAT", "{:.0f}C"),
+            ("AFR", "AFR", "AFR", "{:.1f}"),
+            ("TPS", "TPS", "TPS", "{:.0f}%"),
+            ("GPS", "GPS", "GPS Speed", "{:.1f} MPH"),
+            ("Stats", "Slowest", "Slowest p99", "{}"),
+        ]
+    ],
+}
+
+
+def load_font(spec):
+    path = spec.get("path")
+    if path and os.path.exists(path):
+        return ImageFont.truetype(path, spec.get("size", 16))
+    return ImageFont.load_default()
+
+def text_height(font):
+    """Ink height of a line, the spacing newMScode has always used under a label."""
+    bbox = font.getbbox("Ag")
+    return bbox[3] - bbox[1]
+
+
+# --- GAUGES ---
+class Gauge:
+    """
+    A region of a page bound to one channel. paint_static() runs once
+    per page into the background; state() reduces the channel value to
+    what is actually drawn, so equal states mean identical pixels, and
+    paint() draws only that.
+    """
+
+    def __init__(self, spec, fonts, width, height):
+        self.channel = spec["channel"]
+        self.label = spec.get("label", "")
+        self.x = spec.get("x", 0)
+        self.y = spec.get("y", 0)
+        self.w = min(spec.get("w", width - self.x), width - self.x)
+        self.h = min(spec.get("h", height - self.y), height - self.y)
+        self.label_font, self.label_glyphs = fonts[spec.get("label_font", "label")]
+
+    def paint_static(self, image, draw):
+        pass
+
+    def state(self, value):
+        raise NotImplementedError
+
+    def paint(self, image, draw, state):
+        raise NotImplementedError
+
+
+class NumberGauge(Gauge):
+    """Formatted value with an optional label above it or to its left."""
+
+    def __init__(self, spec, fonts, width, height):
+        super().__init__(spec, fonts, width, height)
+        self.font, self.glyphs = fonts[spec.get("font", "value")]
+        self.format = spec.get("format", "{}")
+        self.align = spec.get("align", "center")
+        position = spec.get("label_pos", "top") if self.label else "none"
+        # Value area inside the region, after the label takes its share
+        self.vx, self.vy, self.vw = self.x, self.y, self.w
+        self.label_xy = None
+        if position == "top":
+            label_w = self.label_glyphs.width(self.label)
+            self.label_xy = (self.x + (self.w - label_w) // 2, self.y)
+            self.vy = self.y + text_height(self.label_font)
+        elif position == "left":
+            label_w = self.label_glyphs.width(self.label) + 2
+            self.label_xy = (self.x, self.y + (self.h - text_height(self.label_font)) // 2)
+            self.vx, self.vw = self.x + label_w, self.w - label_w
+            self.vy = self.y + (self.h - text_height(self.font)) // 2
+        self.vy = self.y + spec["value_dy"] if "value_dy" in spec else self.vy
+
+    def paint_static(self, image, draw):
+        if self.label_xy:
+            bitmap, _ = self.label_glyphs.string(self.label)
+            image.paste(bitmap, self.label_xy, bitmap)
+
+    def state(self, value):
+        if value is None:
+            return "--"
+        if isinstance(value, str):
+            return value
+        try:
+            return self.format.format(value)
+        except (ValueError, TypeError):
+            return str(value)
+
+    def paint(self, image, draw, text):
+        w = self.glyphs.width(text)
+        if self.align == "left":
+            x = self.vx
+        elif self.align == "right":
+            x = self.vx + self.vw - w
+        else:
+            x = self.vx + (self.vw - w) // 2
+        self.glyphs.blit(image, text, x, self.vy)
+
+
+class BarGauge(Gauge):
+    """Horizontal bar between min and max, label to the left."""
+
+    def __init__(self, spec, fonts, width, height):
+        super().__init__(spec, fonts, width, height)
+        self.min = float(spec.get("min", 0.0))
+        self.max = float(spec.get("max", 100.0))
+        label_w = self.label_glyphs.width(self.label) + 2 if self.label else 0
+        self.label_xy = (self.x, self.y + (self.h - text_height(self.label_font)) // 2)
+        self.box = (self.x + label_w, self.y, self.x + self.w - 1, self.y + self.h - 1)
+        self.inner = self.box[2] - self.box[0] - 1
+
+    def paint_static(self, image, draw):
+        if self.label:
+            bitmap, _ = self.label_glyphs.string(self.label)
+            image.paste(bitmap, self.label_xy, bitmap)
+        draw.rectangle(self.box, outline=255, fill=0)
+
+    def state(self, value):
+        if not isinstance(value, (int, float)) or self.max <= self.min:
+            return 0
+        frac = (value - self.min) / (self.max - self.min)
+        return int(round(min(1.0, max(0.0, frac)) * self.inner))
+
+    def paint(self, image, draw, fill):
+        if fill > 0:
+            x0, y0, _, y1 = self.box
+            draw.rectangle((x0 + 1, y0 + 1, x0 + fill, y1 - 1), fill=255)
+
+
+class SparklineGauge(Gauge):
+    """
+    Scrolling trace of the last `w` samples, one sample per `interval`
+    seconds. Samples are stored already scaled to pixel rows.
+    """
+
+    def __init__(self, spec, fonts, width, height):
+        super().__init__(spec, fonts, width, height)
+        self.min = float(spec.get("min", 0.0))
+        self.max = float(spec.get("max", 100.0))
+        self.interval = spec.get("interval", 0.1)
+        self.rows = deque(maxlen=max(2, self.w))
+        self.count = 0
+        self.next_sample = 0.0
+
+    def paint_static(self, image, draw):
+        if self.label:
+            bitmap, _ = self.label_glyphs.string(self.label)
+            image.paste(bitmap, (self.x, self.y), bitmap)
+
+    def state(self, value):
+        # Sampling happens here so the trace advances at a fixed rate
+        # whatever the frame rate; the count changes only when it moves.
+        now = time.monotonic()
+        if isinstance(value, (int, float)) and now >= self.next_sample:
+            self.next_sample = now + self.interval
+            span = self.max - self.min or 1.0
+            frac = min(1.0, max(0.0, (value - self.min) / span))
+            self.rows.append(self.y + self.h - 1 - int(round(frac * (self.h - 1))))
+            self.count += 1
+        return self.count
+
+    def paint(self, image, draw, count):
+        rows = self.rows
+        if len(rows) < 2:
+            return
+        x0 = self.x + self.w - len(rows)
+        draw.line([(x0 + i, y) for i, y in enumerate(rows)], fill=255)
+
+
+GAUGE_TYPES = {"number": NumberGauge, "bar": BarGauge, "sparkline": SparklineGauge}
+
+
+# --- PAGES ---
+class Page:
+
+    def __init__(self, spec, fonts, width, height):
+        self.name = spec["name"]
+        self.gauges = [GAUGE_TYPES[g.get("type", "number")](g, fonts, width, height)
+                       for g in spec["gauges"]]
+        self.channels = [g.channel for g in self.gauges]
+        self.background = Image.new('1', (width, height))
+        draw = ImageDraw.Draw(self.background)
+        for line in spec.get("lines", []):
+            draw.line(line, fill=255)
+        for gauge in self.gauges:
+            gauge.paint_static(self.background, draw)
+
+    def sources(self, supplied, expand=None):
+        """
+        Channels of `supplied` this page reads. `expand` maps statistic and
+        derived names to their inputs; channels the data source cannot
+        supply are left out, so nothing waits for them.
+        """
+        names = expand(self.channels) if expand else self.channels
+        return sorted(ch for ch in set(names) if ch in supplied)
+
+    def state(self, values):
+        """Per-gauge drawn state; equal states render identical frames."""
+        return tuple(g.state(values.get(g.channel)) for g in self.gauges)
+
+    def paint(self, image, draw, state):
+        image.paste(self.background)
+        for gauge, s in zip(self.gauges, state):
+            gauge.paint(image, draw, s)
+
+
+class DashLayout:
+
+    def __init__(self, spec, width=128, height=32):
+        self.width = width
+        self.height = height
+        fonts = {}
+        for name, font_spec in spec.get("fonts", {}).items():
+            font = load_font(font_spec)
+            fonts[name] = (font, GlyphAtlas(font, font_spec.get("chars", DEFAULT_CHARS)))
+        self.pages = [Page(p, fonts, width, height) for p in spec["pages"]]
+        self.names = [p.name for p in self.pages]
+
+    def __len__(self):
+        return len(self.pages)
+
+
+def load_layout(path=None, width=128, height=32):
+    """DashLayout from a JSON file, or the built-in single-gauge pages."""
+    spec = DEFAULT_LAYOUT
+    if path:
+        with open(path, encoding="utf-8") as f:
+            spec = json.load(f)
+    spec = spec.get(f"{width}x{height}", spec)  # one file may hold several panel sizes
+    return DashLayout(spec, width, height)
+
+
+# --- MAIN ---
+if __name__ == "__main__":
+    import sys
+    # Preview every page with sample values as ASCII art
+    path = sys.argv[1] if len(sys.argv) > 1 else None
+    size = sys.argv[2] if len(sys.argv) > 2 else "128x32"
+    w, h = (int(n) for n in size.split("x"))
+    dash = load_layout(path, w, h)
+    sample = {'RPM': 3450, 'Coolant': 88, 'MAT': 31, 'AFR': 14.2, 'TPS': 37,
+              'GPS': 56.3, 'MAP': 142.0, 'Boost': 0.6, 'Gear': 3, 'Slowest': "flush 3.1ms"}
+    image = Image.new('1', (w, h))
+    draw = ImageDraw.Draw(image)
+    for page in dash.pages:
+        page.paint(image, draw, page.state(sample))
+        print(f"--- {page.name} ({', '.join(page.channels)})")
+        for y in range(h):
+            print("".join("#" if image.getpixel((x, y)) else "." for x in range(w)))
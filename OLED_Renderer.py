@@ -0,0 +1,103 @@
+# oled_renderer.py
+"""
+Dirty-checking renderer for SSD1306 OLEDs on I2C.
+
+Keeps one reusable PIL image and a copy of the last framebuffer sent to
+the panel. A frame is only re-rendered when its key (e.g. the formatted
+label and value) changes, and then only the 8-pixel pages and column
+ranges that actually differ are pushed over I2C instead of a full
+oled.show().
+"""
+from PIL import Image, ImageDraw
+
+SET_COL_ADDR = 0x21
+SET_PAGE_ADDR = 0x22
+DATA_CONTROL = 0x40
+
+
+class DirtyRenderer:
+
+    def __init__(self, oled, width=128, height=32):
+        self.oled = oled
+        self.width = width
+        self.pages = height // 8
+        self.image = Image.new('1', (width, height))
+        self.draw = ImageDraw.Draw(self.image)
+        self.key = None
+        # What the panel currently shows; starts unknown, so the first push is full
+        self.shown = None
+        self._out = bytearray(width + 1)
+        self._out[0] = DATA_CONTROL
+        self.frames = 0
+        self.skipped = 0
+        self.bytes_pushed = 0
+
+    def render(self, key, paint):
+        """
+        Call paint(draw) and push the result, unless `key` equals the last
+        rendered key. Returns True if anything was sent to the panel.
+        """
+        return self.draw_frame(key, paint) and self.flush()
+
+    def draw_frame(self, key, paint):
+        """
+        The drawing half of render(): paint into the framebuffer without
+        touching the bus. Returns False if `key` is unchanged; call flush()
+        afterwards when it returns True.
+        """
+        if key == self.key:
+            self.skipped += 1
+            return False
+        self.key = key
+        self.draw.rectangle((0, 0, self.image.width - 1, self.image.height - 1), fill=0)
+        paint(self.draw)
+        self.oled.image(self.image)
+        self.frames += 1
+        return True
+
+    def invalidate(self):
+        """Force the next render() to redraw and push the whole panel."""
+        self.key = None
+        self.shown = None
+
+    def flush(self):
+        """Push only the framebuffer pages/columns that differ from the panel."""
+        buf = self.oled.buf
+        if self.shown is None or not hasattr(self.oled, 'i2c_device'):
+            self.oled.show()
+            self.shown = bytearray(buf)
+            self.bytes_pushed += len(self.shown)
+            return True
+
+        sent = False
+        w = self.width
+        for page in range(self.pages):
+            row = page * w
+            new = buf[row:row + w]
+            old = self.shown[row:row + w]
+            if new == old:
+                continue
+            first = 0
+            while new[first] == old[first]:
+                first += 1
+            last = w - 1
+            while new[last] == old[last]:
+                last -= 1
+            self._push(page, first, last, new)
+            self.shown[row + first:row + last + 1] = new[first:last + 1]
+            sent = True
+        return sent
+
+    def _push(self, page, first, last, row):
+        oled = self.oled
+        oled.write_cmd(SET_COL_ADDR)
+        oled.write_cmd(first)
+        oled.write_cmd(last)
+        oled.write_cmd(SET_PAGE_ADDR)
+        oled.write_cmd(page)
+        oled.write_cmd(page)
+        n = last - first + 1
+        self._out[1:n + 1] = row[first:last + 1]
+        with oled.i2c_device:
+            oled.i2c_device.write(self._out, end=n + 1)
+        self.bytes_pushed += n
@@ -1,59 +1,40 @@
 import serial
-import struct
-import time
+from MS_Channels import default_layout, load_ini
+from MS_Transport import Transport, TransportError, TransportTimeout
+from MS_Scheduler import PollScheduler
 
 # --- CONFIGURE SERIAL PORT ---
 PORT = "/dev/ttyUSB0"  # change if needed
 BAUD = 9600
-RT_REQUEST = b'\x01\x00\x00\x00'
+INI_PATH = None        # firmware's TunerStudio INI; the built-in MS2/Extra layout otherwise
+INI_SETTINGS = {'CELSIUS'}  # the INI's #set symbols; CELSIUS: temperatures in C
 
-# --- HELPER FUNCTIONS ---
-def bytes_to_words_le(b):
-    """Convert bytes to list of 16-bit little-endian words."""
-    n = (len(b)//2)*2
-    return [struct.unpack_from('<H', b, i)[0] for i in range(0, n, 2)]
-
-def safe_field(value, min_val=0, max_val=65535):
-    if not isinstance(value, int) or value < min_val or value > max_val:
-        return "N/A"
-    return value
+# Printed fields -> INI output channels
+FIELDS = [('RPM', 'rpm'), ('TPS_%', 'tps'), ('MAP_kPa', 'map'),
+          ('CLT_C', 'coolant'), ('IAT_C', 'mat'), ('AFR', 'afr1')]
 
-def scale(value, divisor):
-    return value/divisor if isinstance(value, int) else value
+# --- HELPER FUNCTIONS ---
+def load_layout():
+    """Compiled channel layout: one precompiled struct unpack per reply."""
+    return load_ini(INI_PATH, INI_SETTINGS) if INI_PATH else default_layout()
 
-def decode_rt(words):
+def decode_rt(layout, block):
     """
     Decode MS2/Extra RT block safely. Returns N/A if data unavailable.
     """
-    out = {}
-    if len(words) < 6:
-        # Packet too short, fill with N/A
-        keys = ['RPM', 'TPS_%', 'MAP_kPa', 'CLT_C', 'IAT_C', 'AFR']
-        for k in keys:
-            out[k] = "N/A"
-        return out
-
-    rpm     = safe_field(words[0], 0, 16000)
-    tps     = scale(safe_field(words[1], 0, 1000), 10.0)
-    map_kpa = scale(safe_field(words[2], 0, 2550), 10.0)
-    clt     = scale(safe_field(words[3], 0, 2500), 10.0)
-    iat     = scale(safe_field(words[4], 0, 2500), 10.0)
-    afr     = scale(safe_field(words[5], 0, 2000), 100.0)
+    values = layout.decode(block)  # {} if the packet is too short
+    out = {label: round(values[name], 2) if name in values else "N/A"
+           for label, name in FIELDS}
 
     # Engine off detection
-    if rpm == 0 or rpm == "N/A":
-        tps = map_kpa = clt = iat = afr = "N/A"
-
-    out['RPM']     = rpm
-    out['TPS_%']   = tps
-    out['MAP_kPa'] = map_kpa
-    out['CLT_C']   = clt
-    out['IAT_C']   = iat
-    out['AFR']     = afr
+    if not out['RPM'] or out['RPM'] == "N/A":
+        for label, _ in FIELDS[1:]:
+            out[label] = "N/A"
     return out
 
 # --- LIVE POLLING ---
 def live_poll():
+    layout = load_layout()
     try:
         ser = serial.Serial(PORT, BAUD, timeout=1)
         print(f"Connected to ECU on {PORT} at {BAUD} baud")
@@ -61,25 +42,32 @@ def live_poll():
         print("Failed to open serial port:", e)
         return
 
+    transport = Transport(ser)
+    scheduler = PollScheduler(baud=BAUD)
     print("Press Ctrl+C to stop polling.\n")
     try:
         while True:
-            ser.write(RT_REQUEST)
-            time.sleep(0.05)
-            reply = ser.read(256)
+            scheduler.begin()  # waits only as long as the link needs
+            try:
+                reply = transport.read_realtime()
+            except TransportTimeout:
+                reply = None
+            except TransportError as e:
+                print("Bad frame:", e)
+                scheduler.end(False)
+                continue
+            scheduler.end(reply is not None)
             if reply:
                 # Show raw bytes in hex
                 print("Raw bytes:", ' '.join(f'{b:02X}' for b in reply))
-                # Decode words
-                words = bytes_to_words_le(reply)
-                decoded = decode_rt(words)
+                decoded = decode_rt(layout, reply)
                 print(f"Decoded: RPM={decoded['RPM']} TPS={decoded['TPS_%']} MAP={decoded['MAP_kPa']} "
                       f"CLT={decoded['CLT_C']} IAT={decoded['IAT_C']} AFR={decoded['AFR']}\n")
             else:
                 print("No response")
-            time.sleep(0.2)
     except KeyboardInterrupt:
         print("\nPolling stopped")
+        print(scheduler.summary())
         ser.close()
 
 if __name__ == "__main__":
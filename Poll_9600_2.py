@@ -1,63 +1,44 @@
 # ms2_rpi_live_table.py
 import serial
-import struct
-import time
+from MS_Channels import default_layout, load_ini
 import os
+from MS_Transport import Transport, TransportError, TransportTimeout
+from MS_Scheduler import PollScheduler
 
 # --- CONFIGURATION ---
 PORT = "/dev/ttyUSB0"  # Change if needed
 BAUD = 9600
-RT_REQUEST = b'\x01\x00\x00\x00'
+INI_PATH = None        # firmware's TunerStudio INI; the built-in MS2/Extra layout otherwise
+INI_SETTINGS = {'CELSIUS'}  # the INI's #set symbols; CELSIUS: temperatures in C
 
-# --- HELPER FUNCTIONS ---
-def bytes_to_words_le(b):
-    """Convert bytes to list of 16-bit little-endian words."""
-    n = (len(b)//2)*2
-    return [struct.unpack_from('<H', b, i)[0] for i in range(0, n, 2)]
-
-def safe_field(value, min_val=0, max_val=65535):
-    if not isinstance(value, int) or value < min_val or value > max_val:
-        return "N/A"
-    return value
+# Printed fields -> INI output channels
+FIELDS = [('RPM', 'rpm'), ('TPS_%', 'tps'), ('MAP_kPa', 'map'),
+          ('CLT_C', 'coolant'), ('IAT_C', 'mat'), ('AFR', 'afr1')]
 
-def scale(value, divisor):
-    return value/divisor if isinstance(value, int) else value
+# --- HELPER FUNCTIONS ---
+def load_layout():
+    """Compiled channel layout: one precompiled struct unpack per reply."""
+    return load_ini(INI_PATH, INI_SETTINGS) if INI_PATH else default_layout()
 
-def decode_rt(words):
+def decode_rt(layout, block):
     """
     Decode MS2/Extra RT block safely.
     CLT, IAT, TPS, AFR always readable.
     RPM and MAP may be N/A if engine not running.
     """
-    out = {}
-    keys = ['RPM', 'TPS_%', 'MAP_kPa', 'CLT_C', 'IAT_C', 'AFR']
-    if len(words) < 6:
-        for k in keys:
-            out[k] = "N/A"
-        return out
-
-    rpm     = safe_field(words[0], 0, 16000)
-    tps     = scale(safe_field(words[1], 0, 1000), 10.0)
-    map_kpa = scale(safe_field(words[2], 0, 2550), 10.0)
-    clt     = scale(safe_field(words[3], 0, 2500), 10.0)
-    iat     = scale(safe_field(words[4], 0, 2500), 10.0)
-    afr     = scale(safe_field(words[5], 0, 2000), 100.0)
+    values = layout.decode(block)  # {} if the packet is too short
+    out = {label: round(values[name], 2) if name in values else "N/A"
+           for label, name in FIELDS}
 
     # Only RPM and MAP depend on engine running
-    if rpm == 0 or rpm == "N/A":
-        rpm = 0
-        map_kpa = "N/A"
-
-    out['RPM']     = rpm
-    out['TPS_%']   = tps
-    out['MAP_kPa'] = map_kpa
-    out['CLT_C']   = clt
-    out['IAT_C']   = iat
-    out['AFR']     = afr
+    if not out['RPM'] or out['RPM'] == "N/A":
+        out['RPM'] = 0
+        out['MAP_kPa'] = "N/A"
     return out
 
 # --- MAIN POLLING LOOP ---
 def live_poll():
+    layout = load_layout()
     try:
         ser = serial.Serial(PORT, BAUD, timeout=1)
         print(f"Connected to ECU on {PORT} at {BAUD} baud\n")
@@ -65,6 +46,8 @@ def live_poll():
         print("Failed to open serial port:", e)
         return
 
+    transport = Transport(ser)
+    scheduler = PollScheduler(baud=BAUD)
     print("Press Ctrl+C to stop polling.\n")
 
     # Print header
@@ -74,20 +57,26 @@ def live_poll():
 
     try:
         while True:
-            ser.write(RT_REQUEST)
-            time.sleep(0.05)
-            reply = ser.read(256)
+            scheduler.begin()  # waits only as long as the link needs
+            try:
+                reply = transport.read_realtime()
+            except TransportTimeout:
+                reply = None
+            except TransportError as e:
+                print("Bad frame:", e)
+                scheduler.end(False)
+                continue
+            scheduler.end(reply is not None)
             if reply:
-                words = bytes_to_words_le(reply)
-                decoded = decode_rt(words)
+                decoded = decode_rt(layout, reply)
                 # Print in table format
                 print(f"{decoded['RPM']:>6} {decoded['TPS_%']:>6} {decoded['MAP_kPa']:>8} "
                       f"{decoded['CLT_C']:>6} {decoded['IAT_C']:>6} {decoded['AFR']:>6}")
             else:
                 print("No response")
-            time.sleep(0.2)
     except KeyboardInterrupt:
         print("\nPolling stopped")
+        print(scheduler.summary())
         ser.close()
 
 if __name__ == "__main__":
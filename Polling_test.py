@@ -1,4 +1,5 @@
 import RPi.GPIO as GPIO
+import queue
 import time
 
 GPIO.setmode(GPIO.BCM)
@@ -7,15 +8,23 @@ GPIO.setup(BUTTON_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
 
 pages = ["RPM","Coolant","MAT","AFR","TPS","GPS"]
 page_index = 0
-last_button_state = GPIO.input(BUTTON_PIN)
 last_press_time = 0
+presses = queue.Queue()
 
-while True:
-    button_state = GPIO.input(BUTTON_PIN)
-    if button_state == GPIO.LOW and last_button_state == GPIO.HIGH:
-        if (time.time() - last_press_time) > 0.3:
-            page_index = (page_index + 1) % len(pages)
-            print("Page:", pages[page_index])
-            last_press_time = time.time()
-    last_button_state = button_state
-    time.sleep(0.01)
+def on_button(channel):
+    # Runs on the GPIO thread; debounce here and pass the press on
+    global last_press_time
+    now = time.monotonic()
+    if now - last_press_time > 0.3:
+        last_press_time = now
+        presses.put(now)
+
+GPIO.add_event_detect(BUTTON_PIN, GPIO.FALLING, callback=on_button, bouncetime=50)
+
+try:
+    while True:
+        pressed_at = presses.get()  # idle until a press arrives
+        page_index = (page_index + 1) % len(pages)
+        print(f"Page: {pages[page_index]} ({(time.monotonic() - pressed_at) * 1000:.1f} ms)")
+except KeyboardInterrupt:
+    GPIO.cleanup()
@@ -1,58 +1,44 @@
 # ms2_rpi_live.py
 import serial
-import struct
-import time
+from MS_Channels import default_layout, load_ini
+from MS_Transport import Transport, TransportError
+from MS_Scheduler import PollScheduler
+from MS_Capture import FrameCapture
 
 # --- CONFIGURE SERIAL PORT ---
 PORT = "/dev/ttyUSB0"  # Change if your ECU is on another ttyUSB*
 BAUD = 115200
-RT_REQUEST = b'\x01\x00\x00\x00'  # MS2/Extra realtime request
+INI_PATH = None        # firmware's TunerStudio INI; the built-in MS2/Extra layout otherwise
+INI_SETTINGS = {'CELSIUS'}  # the INI's #set symbols; CELSIUS: temperatures in C
+CAPTURE_PATH = None    # e.g. "/home/pi/ecu.cap": keep every raw reply (MS_Capture)
 
-# --- HELPER FUNCTIONS ---
-def bytes_to_words_le(b):
-    """Convert bytes to list of 16-bit little-endian words."""
-    n = (len(b)//2)*2
-    return [struct.unpack_from('<H', b, i)[0] for i in range(0, n, 2)]
-
-def safe_field(value, min_val=0, max_val=65535):
-    """Return value if in range, else 'N/A'"""
-    if not isinstance(value, int) or value < min_val or value > max_val:
-        return "N/A"
-    return value
+# Printed fields -> INI output channels
+FIELDS = [('RPM', 'rpm'), ('TPS_%', 'tps'), ('MAP_kPa', 'map'),
+          ('CLT_C', 'coolant'), ('IAT_C', 'mat'), ('AFR', 'afr1')]
 
-def scale(value, divisor):
-    return value/divisor if isinstance(value, int) else value
+# --- HELPER FUNCTIONS ---
+def load_layout():
+    """Compiled channel layout: one precompiled struct unpack per reply."""
+    return load_ini(INI_PATH, INI_SETTINGS) if INI_PATH else default_layout()
 
-def decode_rt(words):
+def decode_rt(layout, block):
     """
-    Decode MS2/Extra 3.2.5 RT block.
-    Marks fields as N/A if engine off or out-of-range.
+    Decode the MS2/Extra realtime block through the channel layout.
+    Marks fields as N/A if engine off or missing from a short reply.
     """
-    out = {}
-    if len(words) < 6:
-        return out
-
-    rpm     = safe_field(words[0], 0, 16000)
-    tps     = scale(safe_field(words[1], 0, 1000), 10.0)
-    map_kpa = scale(safe_field(words[2], 0, 2550), 10.0)
-    clt     = scale(safe_field(words[3], 0, 2500), 10.0)
-    iat     = scale(safe_field(words[4], 0, 2500), 10.0)
-    afr     = scale(safe_field(words[5], 0, 2000), 100.0)
+    values = layout.decode(block)
+    out = {label: round(values[name], 2) if name in values else "N/A"
+           for label, name in FIELDS}
 
     # If engine off (RPM==0), mark other fields as N/A
-    if rpm == 0 or rpm == "N/A":
-        tps = map_kpa = clt = iat = afr = "N/A"
-
-    out['RPM']     = rpm
-    out['TPS_%']   = tps
-    out['MAP_kPa'] = map_kpa
-    out['CLT_C']   = clt
-    out['IAT_C']   = iat
-    out['AFR']     = afr
+    if not out['RPM'] or out['RPM'] == "N/A":
+        for label, _ in FIELDS[1:]:
+            out[label] = "N/A"
     return out
 
 # --- MAIN LIVE POLLING LOOP ---
 def live_poll():
+    layout = load_layout()
     try:
         ser = serial.Serial(PORT, BAUD, timeout=0.5)
         print(f"Connected to ECU on {PORT} at {BAUD} baud.\n")
@@ -60,22 +46,34 @@ def live_poll():
         print("Failed to open serial port:", e)
         return
 
+    transport = Transport(ser)
+    scheduler = PollScheduler(baud=BAUD)
+    capture = FrameCapture(CAPTURE_PATH) if CAPTURE_PATH else None
     print("Press Ctrl+C to stop polling.\n")
     try:
         while True:
-            # Send RT request
-            ser.write(RT_REQUEST)
-            time.sleep(0.05)
-            reply = ser.read(256)  # read up to 256 bytes
+            # Send RT request, returns as soon as the whole frame is in
+            scheduler.begin()
+            try:
+                reply = transport.read_realtime()
+            except TransportError as e:
+                print("Bad reply:", e)
+                reply = None
+            scheduler.end(reply is not None)
             if reply:
-                words = bytes_to_words_le(reply)
-                decoded = decode_rt(words)
+                if capture:
+                    capture.write(reply)
+                decoded = decode_rt(layout, reply)
                 # Print human-readable values
                 print(f"RPM: {decoded['RPM']}\tTPS: {decoded['TPS_%']}\tMAP: {decoded['MAP_kPa']}"
                       f"\tCLT: {decoded['CLT_C']}\tIAT: {decoded['IAT_C']}\tAFR: {decoded['AFR']}")
-            time.sleep(0.1)
     except KeyboardInterrupt:
         print("\nPolling stopped.")
+        print(scheduler.summary())
+        if capture:
+            capture.close()
+            print(f"Captured {capture.records} frames to {CAPTURE_PATH}"
+                  + (f" ({capture.dropped} dropped, file full)" if capture.dropped else ""))
         ser.close()
 
 if __name__ == "__main__":
@@ -2,13 +2,28 @@
 import os
 import glob
 import time
+import ctypes
+import ctypes.util
+import select
+import struct
+from MLG_Reader import MLGLog
+from MSL_Index import build_index, read_rows
 
 # ----------------------------
 # CONFIG
 # ----------------------------
 LOG_DIR = "/home/tomedee77/TunerStudioProjects/VWRX/DataLogs"
 LOG_EXTENSIONS = ["*.mlg", "*.msl"]
-POLL_INTERVAL = 0.2  # seconds between checks
+POLL_INTERVAL = 0.2  # seconds between checks when inotify is unavailable
+HEADER_LINES = 4     # title, capture date, channel names, units
+
+# inotify event masks (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0o4000
+_EVENT = struct.Struct("iIII")
 
 # ----------------------------
 # HELPER FUNCTIONS
@@ -22,6 +37,9 @@ def find_latest_log(log_dir, extensions):
         return None
     return max(files, key=os.path.getmtime)
 
+def is_log_file(name):
+    return any(name.endswith(ext[1:]) for ext in LOG_EXTENSIONS)
+
 def is_numeric(s):
     """Check if string can be interpreted as a number"""
     try:
@@ -30,47 +48,239 @@ def is_numeric(s):
     except ValueError:
         return False
 
-def tail_log(file_path):
-    """Continuously read new lines from the log file"""
-    try:
-        with open(file_path, "r", encoding="utf-8", errors="replace") as f:
-            # Skip first 4 lines (metadata + labels)
-            for _ in range(4):
-                next(f, None)
+def read_header(f):
+    """Read just the header lines; returns the channel names or None if incomplete"""
+    f.seek(0)
+    lines = [f.readline() for _ in range(HEADER_LINES)]
+    if not lines[-1].endswith("\n"):
+        return None
+    return lines[2].strip().split("\t")
+
+def parse_rows(lines):
+    """Split a batch of appended lines into numeric rows"""
+    rows = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        cols = line.split("\t")
+        # Only process numeric lines
+        if all(is_numeric(c) or c == '' for c in cols):
+            rows.append(cols)
+    return rows
+
+def show_rows(header, rows):
+    """Print the newest row of a batch"""
+    if not rows:
+        return
+    print(f"\nLatest data ({len(rows)} new rows):")
+    for h, v in zip(header, rows[-1]):
+        print(f"{h}\n{v}")
+
+def show_records(log, new):
+    """Print the newest of the `new` records appended to a binary MLVLG (.mlg) log"""
+    if not new:
+        return
+    print(f"\nLatest data ({new} new records):")
+    for h, v in log.record(len(log) - 1).items():
+        print(f"{h}\n{v:g}")
+
+def show_at(file_path, t, count=20):
+    """Print rows from log time t on; the sidecar index makes this a seek, not a scan"""
+    index = build_index(file_path)  # incremental if the log has grown
+    with open(file_path, "r", encoding="utf-8", errors="replace") as f:
+        header = read_header(f)
+    if header:
+        print("\t".join(header))
+    for row in read_rows(file_path, t, count, index):
+        print("\t".join(row))
+
+# ----------------------------
+# INOTIFY
+# ----------------------------
+class Inotify:
+    """Minimal ctypes wrapper around the Linux inotify API"""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._add = libc.inotify_add_watch
+        self._add.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm = libc.inotify_rm_watch
+        self.fd = libc.inotify_init1(IN_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._poll = select.poll()
+        self._poll.register(self.fd, select.POLLIN)
 
-            # Capture headers from line 3
-            f.seek(0)
-            lines = f.readlines()
-            header = lines[2].strip().split("\t")
+    def add_watch(self, path, mask):
+        wd = self._add(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {path}")
+        return wd
 
+    def rm_watch(self, wd):
+        self._rm(self.fd, wd)
+
+    def read_events(self, timeout=None):
+        """Block until events arrive; returns a list of (wd, mask, name)"""
+        if not self._poll.poll(None if timeout is None else timeout * 1000):
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        pos = 0
+        while pos < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, pos)
+            pos += _EVENT.size
+            name = data[pos:pos + length].rstrip(b"\0").decode(errors="replace")
+            pos += length
+            events.append((wd, mask, name))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+# ----------------------------
+# FOLLOWER
+# ----------------------------
+class LogFollower:
+    """
+    Follows the newest log in a directory. Only the header lines are read
+    up front; after that just the appended bytes are read, when inotify
+    says the file grew. A binary .mlg log stays open in one MLGLog and
+    only the blocks past the last seen record are scanned. A new log file
+    in the directory becomes the one being followed.
+    """
+
+    def __init__(self, log_dir, on_rows=show_rows, on_records=show_records):
+        self.log_dir = log_dir
+        self.on_rows = on_rows
+        self.on_records = on_records
+        self.f = None
+        self.mlg = None
+        self.seen = 0
+        self.path = None
+        self.header = None
+        self.partial = ""
+
+    def open(self, path, from_start=False):
+        if self.f:
+            self.f.close()
+        if self.mlg:
+            self.mlg.close()
+        self.path = path
+        self.f = None
+        self.mlg = None
+        self.header = None
+        self.partial = ""
+        print(f"Tailing log: {os.path.basename(path)}")
+        if path.endswith(".mlg"):
+            self.open_mlg(from_start)
+            return
+        self.f = open(path, "r", encoding="utf-8", errors="replace")
+        self.header = read_header(self.f)
+        if self.header and not from_start:
             # Move to the end for tailing new lines
-            f.seek(0, os.SEEK_END)
+            self.f.seek(0, os.SEEK_END)
+
+    def open_mlg(self, from_start):
+        try:
+            self.mlg = MLGLog(self.path)
+        except (OSError, ValueError, struct.error):
+            return  # header not fully written yet, retried on the next change
+        print(f"{len(self.mlg)} records, {len(self.mlg.fields)} fields")
+        self.seen = 0 if from_start else len(self.mlg)
+
+    def read_mlg(self):
+        if self.mlg is None:
+            self.open_mlg(from_start=True)
+            if self.mlg is None:
+                return
+        else:
+            self.mlg.refresh()
+        new = len(self.mlg) - self.seen
+        self.seen = len(self.mlg)
+        self.on_records(self.mlg, new)
 
+    def read_appended(self):
+        if self.path and self.path.endswith(".mlg"):
+            self.read_mlg()
+            return
+        if not self.f:
+            return
+        if self.header is None:
+            # File was created before TunerStudio wrote the header
+            self.header = read_header(self.f)
+            if self.header is None:
+                return
+        chunk = self.f.read()
+        if not chunk:
+            return
+        text = self.partial + chunk
+        lines = text.split("\n")
+        self.partial = lines.pop()  # incomplete last line, finish next time
+        self.on_rows(self.header, parse_rows(lines))
+
+    def run(self):
+        latest = find_latest_log(self.log_dir, LOG_EXTENSIONS)
+        if latest:
+            self.open(latest)
+        else:
+            print("No log files yet, waiting for one...")
+        try:
+            ino = Inotify()
+        except (OSError, AttributeError) as e:
+            print(f"inotify unavailable ({e}), polling every {POLL_INTERVAL}s")
+            return self.run_polling()
+
+        ino.add_watch(self.log_dir, IN_CREATE | IN_MOVED_TO | IN_MODIFY | IN_CLOSE_WRITE)
+        try:
             while True:
-                line = f.readline()
-                if not line:
-                    time.sleep(POLL_INTERVAL)
-                    continue
-
-                line = line.strip()
-                if not line:
-                    continue
-
-                cols = line.split("\t")
-                # Only process numeric lines
-                if all(is_numeric(c) or c == '' for c in cols):
-                    print("\nLatest data:")
-                    for h, v in zip(header, cols):
-                        print(f"{h}\n{v}")
-    except Exception as e:
-        print(f"Error reading file {file_path}: {e}")
+                modified = False
+                for _, mask, name in ino.read_events():
+                    if not is_log_file(name):
+                        continue
+                    path = os.path.join(self.log_dir, name)
+                    if mask & (IN_CREATE | IN_MOVED_TO) and path != self.path:
+                        self.open(path, from_start=True)
+                        modified = True
+                    elif path == self.path:
+                        modified = True
+                if modified:
+                    self.read_appended()
+        finally:
+            ino.close()
+
+    def run_polling(self):
+        """Fallback for systems without inotify"""
+        while True:
+            latest = find_latest_log(self.log_dir, LOG_EXTENSIONS)
+            if latest and latest != self.path:
+                self.open(latest, from_start=self.path is not None)
+            self.read_appended()
+            time.sleep(POLL_INTERVAL)
 
 # ----------------------------
 # MAIN
 # ----------------------------
-latest_file = find_latest_log(LOG_DIR, LOG_EXTENSIONS)
-if latest_file:
-    print(f"Tailing log: {os.path.basename(latest_file)}")
-    tail_log(latest_file)
-else:
-    print("No log files found.")
\ No newline at end of file
+if __name__ == "__main__":
+    import sys
+    if "--at" in sys.argv:
+        # logfile_read.py --at SECONDS [ROWS] [FILE]
+        args = sys.argv[sys.argv.index("--at") + 1:]
+        path = next((a for a in args if a.endswith(".msl")), None) \
+            or find_latest_log(LOG_DIR, ["*.msl"])
+        numbers = [a for a in args if is_numeric(a)]
+        if path and numbers:
+            show_at(path, float(numbers[0]), int(numbers[1]) if len(numbers) > 1 else 20)
+        else:
+            print("Usage: logfile_read.py --at SECONDS [ROWS] [FILE.msl]")
+    elif not os.path.isdir(LOG_DIR):
+        print("No log files found.")
+    else:
+        try:
+            LogFollower(LOG_DIR).run()
+        except KeyboardInterrupt:
+            pass
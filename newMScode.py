@@ -1,174 +1,294 @@
 import time
-import serial
 import RPi.GPIO as GPIO
-from PIL import Image, ImageDraw, ImageFont
 import adafruit_ssd1306
 import board
 import busio
 import os
+from MS_Channels import default_layout, load_cached
+from MS_Derived import DerivedChannels
+from MS_Engine import Engine
+from MS_GPS import GPSWorker
+from MS_Scheduler import PollScheduler
+from MS_SharedRing import RingReader
+from MS_Probe import connect
+from MS_Stats import Stats, print_stats
+from MS_Streams import StreamStats
+from MS_Transport import TransportError
+from OLED_Renderer import DirtyRenderer
+from OLED_Layout import load_layout
 
-# --- GPS detection ---
-gps_connected = False
-gps_session = None
-try:
-    import gps
-    gps_session = gps.gps(mode=gps.WATCH_ENABLE)
-    # Try to get a TPV report non-blocking
-    try:
-        report = gps_session.next()
-        # Only accept if the report class is TPV and has a speed attribute
-        if getattr(report, 'class', '') == 'TPV' and hasattr(report, 'speed'):
-            gps_connected = True
-    except (StopIteration, KeyError, AttributeError):
-        gps_connected = False
-except ImportError:
-    gps_connected = False
-
-if gps_connected:
-    print("GPS detected, live speed enabled.")
+# --- GPS: gpsd is read on its own thread, the loop only reads the cached fix ---
+gps = GPSWorker()
+if gps.start():
+    print("GPS worker started, live speed once gpsd has a fix.")
 else:
-    print("No GPS detected, using dummy GPS speed.")
+    print("No GPS module, using dummy GPS speed.")
 
 # --- Setup OLED ---
 i2c = busio.I2C(board.SCL, board.SDA)
 oled = adafruit_ssd1306.SSD1306_I2C(128, 32, i2c)
 oled.fill(0)
 oled.show()
+renderer = DirtyRenderer(oled, 128, 32)
 
 # --- Setup Button ---
 BUTTON_PIN = 17  # BCM numbering
 GPIO.setmode(GPIO.BCM)
 GPIO.setup(BUTTON_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
 
-# --- Setup Serial (MegaSquirt) ---
+# --- Shared sample ring: reuse a running acquisition process if there is one ---
+# A ring whose newest sample is older than this was left by a dead writer
+RING_STALE = 2.0
+ring = None
 try:
-    ser = serial.Serial('/dev/ttyUSB0', 115200, timeout=0.1)
+    ring = RingReader()
+except FileNotFoundError:
+    pass
+else:
+    latest = ring.latest()
+    if latest is None or time.monotonic() - latest[1] > RING_STALE:
+        print("Shared acquisition ring is not being written, probing the ECU directly.")
+        ring.close()
+        ring = None
+    else:
+        print("Reading ECU samples from the shared acquisition ring.")
+
+# --- Setup Serial (MegaSquirt): baud/protocol auto-detected, result cached ---
+ms_connected = False
+ms_config = None
+MS_PORT = os.environ.get("MSDASH_PORT", "/dev/ttyUSB0")  # e.g. a MS_Simulator pty
+result = None if ring else connect(MS_PORT)
+if result:
+    ser, transport, ms_config = result
     ms_connected = True
-    print("MegaSquirt detected, live data mode enabled.")
-except serial.SerialException:
+    print(f"MegaSquirt detected ({ms_config['signature']} at {ms_config['baud']} baud), "
+          "live data mode enabled.")
+elif ring is None:
     print("MegaSquirt not detected. Running in dummy mode.")
-    ms_connected = False
 
-# --- Fonts ---
-font_label = ImageFont.load_default()
-font_path = "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"
-if os.path.exists(font_path):
-    font_value = ImageFont.truetype(font_path, 16)
-else:
-    font_value = ImageFont.load_default()
+# --- Channel layout from the firmware INI (cached by signature + INI hash) ---
+INI_PATH = "/home/pi/mainController.ini"
+# The INI's #set symbols: CELSIUS picks the Celsius temperature channels the pages show
+INI_SETTINGS = {'CELSIUS'}
+layout = None
+if ms_connected and os.path.exists(INI_PATH):
+    layout = load_cached(INI_PATH, ms_config['signature'], INI_SETTINGS)
+    print(f"Loaded {len(layout)} channels for {ms_config['signature']}")
+    if layout.block_size != ms_config['block_size']:
+        print(f"INI ochBlockSize is {layout.block_size} bytes but the ECU sends "
+              f"{ms_config['block_size']}; check the INI matches the firmware.")
+block_layout = layout or default_layout()
+
+# Page data keys -> INI output channel names
+CHANNELS = {'RPM': 'rpm', 'Coolant': 'coolant', 'MAT': 'mat', 'AFR': 'afr1', 'TPS': 'tps',
+            'MAP': 'map', 'Baro': 'barometer', 'PW': 'pulseWidth1'}
+
+# Boost, lambda, gear, fuel flow: formulas over the channels above (MS_Derived.FORMULAS)
+derived = DerivedChannels()
+# "AFR smoothed", "Boost peak", "CLT max", ...: O(1) statistics (MS_Streams.STREAMS)
+streams = StreamStats()
 
-# --- Pages ---
-pages = ['RPM', 'Coolant', 'MAT', 'AFR', 'TPS', 'GPS']
+# --- Pages: gauges, fonts and formats from the layout file ---
+# Static parts of every page are pre-rendered once here; without the file
+# the dash shows the original one-channel-per-page set.
+LAYOUT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dash_layout.json")
+dash = load_layout(LAYOUT_PATH if os.path.exists(LAYOUT_PATH) else None, 128, 32)
+pages = dash.pages
 page_index = 0
 
+# --- Hot-path timers: always on, queried with `python MS_Stats.py` ---
+stats = Stats(['ecu', 'decode', 'gps', 'derive', 'render', 'flush'])
+ecu_timer = stats.timer('ecu')
+decode_timer = stats.timer('decode')
+gps_timer = stats.timer('gps')
+derive_timer = stats.timer('derive')
+render_timer = stats.timer('render')
+flush_timer = stats.timer('flush')
+try:
+    stats.serve()
+except OSError as e:
+    print("Stats socket unavailable:", e)
+
+# --- Channels each page waits for ---
+# Statistics and derived gauges expand to their source channels
+# (Boost peak -> Boost -> MAP, Baro); only channels the active source
+# (ring, INI or built-in layout, dummy data) can supply are waited for.
+def expand(names):
+    return derived.requires(streams.requires(names))
+
+source_names = ring.names if ring else block_layout.names if ms_connected else None
+supplied = {key for key, name in CHANNELS.items()
+            if source_names is None or name in source_names}
+page_sources = {page.name: page.sources(supplied, expand) for page in pages}
+
+# --- Ranged-read plan per page: only the bytes its gauges need ---
+# Peaks and windows also need their sources while other pages are shown;
+# the ones a page doesn't read are fetched every STATS_INTERVAL seconds
+# by a second, per-page plan instead of widening every page's plan.
+STATS_INTERVAL = 0.5
+tracked = sorted(ch for ch in expand(streams.windowed()) if ch in supplied)
+page_plans = {}
+stats_plans = {}
+if layout and ms_config['protocol'] == "newserial":
+    page_plans = {name: layout.plan([CHANNELS[ch] for ch in sources])
+                  for name, sources in page_sources.items()}
+    for name, sources in page_sources.items():
+        missing = [CHANNELS[ch] for ch in tracked if ch not in sources]
+        stats_plans[name] = layout.plan(missing) if missing else None
+
 # --- Button tracking ---
-last_button_state = GPIO.input(BUTTON_PIN)
 last_press_time = 0
+last_read_page = None
+last_stats_read = 0.0
 
 # --- Functions ---
-def request_realtime():
+def read_block():
+    # Full realtime block (legacy protocol or no INI), decoded with the
+    # INI layout when there is one, else the built-in MS2/Extra layout
     if not ms_connected:
         return None
-    ser.write(b'\x01')  # adjust for your MS2/Extra firmware
-    frame = ser.read(32)
-    return frame
+    try:
+        with ecu_timer:
+            block = transport.read_realtime(ms_config['block_size'])
+    except TransportError:
+        return None
+    with decode_timer:
+        values = block_layout.decode(block)
+        if not values:
+            return None  # shorter than the layout: count it as a failed poll
+        return {key: values[name] for key, name in CHANNELS.items() if name in values}
 
-def parse_data(frame):
-    if not ms_connected or frame is None or len(frame) < 5:
+def read_page_channels():
+    # The plan follows page_index, so a button press switches the spans read
+    global last_read_page, last_stats_read
+    page = pages[page_index].name
+    plan = page_plans[page]
+    stats_plan = stats_plans[page]
+    now = time.monotonic()
+    if stats_plan and now - last_stats_read < STATS_INTERVAL:
+        stats_plan = None
+    scheduler.block_size = plan.size
+    try:
+        with ecu_timer:
+            raw = plan.fetch(transport)
+            stats_raw = stats_plan.fetch(transport) if stats_plan else None
+    except TransportError:
         return None
-    rpm = frame[0] + (frame[1]<<8)
-    coolant = frame[2]
-    mat = frame[3]
-    afr = frame[4] / 10
-    tps = frame[5] if len(frame) > 5 else 0
-    return {'RPM': rpm, 'Coolant': coolant, 'MAT': mat, 'AFR': afr, 'TPS': tps}
+    with decode_timer:
+        values = plan.layout.decode(raw)
+        if stats_raw is not None:
+            values.update(stats_plan.layout.decode(stats_raw))
+        data = {key: values[name] for key, name in CHANNELS.items() if name in values}
+    if stats_plan:
+        last_stats_read = now
+    if page != last_read_page:
+        last_read_page = page
+        engine.post('page_data')  # first data for a new page: redraw now
+    return data
+
+def read_ring():
+    # Every sample published since the last poll feeds the statistics once;
+    # nothing new (the writer is slower, or stopped) publishes nothing
+    with ecu_timer:
+        samples = ring.poll()
+    data = None
+    for _, t, sample in samples:
+        values = dict(zip(ring.names, sample))
+        data = process({key: values[name] for key, name in CHANNELS.items() if name in values}, t)
+    return data
 
 def get_dummy_data():
-    return {'RPM': 1500, 'Coolant': 75, 'MAT': 30, 'AFR': 14.7, 'TPS': 5}
+    return {'RPM': 1500, 'Coolant': 75, 'MAT': 30, 'AFR': 14.7, 'TPS': 5,
+            'MAP': 35.0, 'Baro': 101.3, 'PW': 2.5}
 
-def get_gps_speed():
-    if not gps_connected or gps_session is None:
-        return 0.0
-    try:
-        report = gps_session.next()
-        if getattr(report, 'class', '') == 'TPV':
-            speed_m_s = getattr(report, 'speed', 0.0)
-            return speed_m_s * 2.23694  # convert to MPH
-    except (StopIteration, KeyError, AttributeError):
-        return 0.0
-    except Exception:
-        return 0.0
-    return 0.0
-
-def draw_centered(draw, label, value):
-    bbox_label = draw.textbbox((0, 0), label, font=font_label)
-    w_label = bbox_label[2] - bbox_label[0]
-    h_label = bbox_label[3] - bbox_label[1]
-
-    bbox_value = draw.textbbox((0, 0), value, font=font_value)
-    w_value = bbox_value[2] - bbox_value[0]
-    h_value = bbox_value[3] - bbox_value[1]
-
-    x_label = (128 - w_label) // 2
-    x_value = (128 - w_value) // 2
-
-    y_label = 0
-    y_value = h_label
-
-    draw.text((x_label, y_label), label, font=font_label, fill=255)
-    draw.text((x_value, y_value), value, font=font_value, fill=255)
+def process(values, now):
+    # Once per new sample, on the ecu thread: derived channels and statistics.
+    # GPS is read here only, so the 'gps' timer stays on one thread and the
+    # speed drawn is the one Gear was derived from.
+    with gps_timer:
+        values['GPS'] = gps.speed_mph()  # extrapolated between fixes, never blocks
+    with derive_timer:
+        derived.update(values)  # only formulas whose inputs changed are re-run
+        streams.update(values, now)
+    return values
+
+# --- Engine stages ---
+def poll_ecu():
+    # None marks a failed poll so the scheduler backs off
+    if ring:
+        return read_ring()
+    if not ms_connected:
+        return process(get_dummy_data(), time.monotonic())
+    data = read_page_channels() if page_plans else read_block()
+    return process(data, time.monotonic()) if data is not None else None
+
+def on_button(channel):
+    # GPIO thread: debounce here, then hand the press to the event loop
+    global last_press_time
+    now = time.monotonic()
+    if now - last_press_time > 0.5:
+        last_press_time = now
+        engine.post('button')
+
+def next_page():
+    global page_index
+    page_index = (page_index + 1) % len(pages)
+    render_stage.wake()
+
+def render():
+    sample = ecu.get()
+    if sample is None:
+        return  # no ECU sample yet
+    values = dict(sample)  # Slowest is added per frame, the slot stays untouched
+
+    # --- Determine page content ---
+    page = pages[page_index]
+    if 'Slowest' in page.channels:
+        phase, p99 = stats.worst()
+        values['Slowest'] = f"{phase} {p99:.1f}ms"
+    if any(ch not in values for ch in page_sources[page.name]):
+        return  # page just changed, wait for its first ranged read
+    state = page.state(values)
+
+    # --- Draw to OLED (skipped when nothing drawn has changed) ---
+    with render_timer:
+        changed = renderer.draw_frame((page_index, state),
+                                      lambda draw: page.paint(renderer.image, draw, state))
+    if changed:
+        with flush_timer:
+            renderer.flush()
+
+# Each stage runs on its own thread at its own rate, so a slow I2C flush
+# never delays the next ECU poll. GPS has its own worker thread and the
+# button is event-driven.
+engine = Engine()
+# Wire time from the probed link: full-block reads use the measured block
+# size, ranged reads switch it to the current page's plan size
+scheduler = PollScheduler(baud=ms_config['baud'] if ms_config else None,
+                          block_size=ms_config['block_size'] if ms_config else None)
+if ring:
+    ecu = engine.stage("ecu", poll_ecu, hz=50)
+elif ms_connected:
+    ecu = engine.stage("ecu", poll_ecu, scheduler=scheduler)
+else:
+    ecu = engine.stage("ecu", poll_ecu, hz=20)  # dummy data at the render rate
+render_stage = engine.stage("render", render, hz=20)
+
+# Edge-triggered button: no input polling, presses arrive as events
+engine.on('button', next_page)
+engine.on('page_data', render_stage.wake)
+GPIO.add_event_detect(BUTTON_PIN, GPIO.FALLING, callback=on_button, bouncetime=50)
 
 # --- Main loop ---
 try:
-    while True:
-        # --- Button polling ---
-        button_state = GPIO.input(BUTTON_PIN)
-        if button_state == GPIO.LOW and last_button_state == GPIO.HIGH:
-            if (time.time() - last_press_time) > 0.5:
-                page_index = (page_index + 1) % len(pages)
-                last_press_time = time.time()
-        last_button_state = button_state
-
-        # --- Read ECU or dummy ---
-        frame = request_realtime()
-        data = parse_data(frame)
-        if not data:
-            data = get_dummy_data()
-
-        # --- Read GPS speed ---
-        gps_speed = get_gps_speed()
-
-        # --- Determine page content ---
-        page = pages[page_index]
-        if page == 'RPM':
-            label = "RPM"
-            value = f"{data['RPM']}"
-        elif page == 'Coolant':
-            label = "Coolant"
-            value = f"{data['Coolant']}C"
-        elif page == 'MAT':
-            label = "MAT"
-            value = f"{data['MAT']}C"
-        elif page == 'AFR':
-            label = "AFR"
-            value = f"{data['AFR']:.1f}"
-        elif page == 'TPS':
-            label = "TPS"
-            value = f"{data['TPS']}%"
-        elif page == 'GPS':
-            label = "GPS Speed"
-            value = f"{gps_speed:.1f} MPH"
-
-        # --- Draw to OLED ---
-        image = Image.new('1', (128, 32))
-        draw = ImageDraw.Draw(image)
-        draw_centered(draw, label, value)
-        oled.image(image)
-        oled.show()
-
-        time.sleep(0.02)  # fast loop for responsive button
-
+    engine.run()
 except KeyboardInterrupt:
+    for line in engine.report():
+        print(line)
+    print_stats(stats.snapshot())
+    stats.close()
+    if ring:
+        ring.close()
     GPIO.cleanup()
     oled.fill(0)
     oled.show()
@@ -0,0 +1,124 @@
+import os
+
+from MS_Channels import cache_name, compile_layout, default_layout, load_cached, parse_ini
+
+INI = """
+[MegaTune]
+   endianness = big
+
+[OutputChannels]
+   ochBlockSize = 16
+   rpm        = scalar, U16,  0, "RPM", 1.000, 0.0
+#if CELSIUS
+   coolant    = scalar, S16,  2, "C",   0.05555, -320.0
+#elif KELVIN
+   coolant    = scalar, S16,  2, "K",   0.05555, -50.0
+#else
+   coolant    = scalar, S16,  2, "F",   0.100, 0.0
+#endif
+   engine     = scalar, U08,  4, "bit", 1.000, 0.0
+   ready      = bits,   U08,  4, [0:0]
+   crank      = bits,   U08,  4, [1:2]
+   afr1       = scalar, S16,  6, "AFR", { 1/10 }, 0.0
+   egoV1      = scalar, S16,  8, "V",   { 1 / 100 }, { -2 * 0.5 }
+   knock      = scalar, S16, 10, "%",   { knockScale / 10 }, 0.0
+   coolantF   = { coolant * 1.8 + 32 }
+"""
+
+
+def channels(settings=()):
+    chans, _, _ = parse_ini(INI, settings)
+    return {c[0]: c for c in chans}
+
+
+def test_if_takes_the_set_branch():
+    assert channels({'CELSIUS'})['coolant'][3] == "C"
+    assert channels({'KELVIN'})['coolant'][3] == "K"
+
+
+def test_else_branch_without_settings():
+    coolant = channels()['coolant']
+    assert coolant[3] == "F"
+    assert coolant[4] == 0.1
+
+
+def test_set_directive_enables_later_if():
+    chans, _, _ = parse_ini("#set CELSIUS\n" + INI)
+    assert {c[0]: c for c in chans}['coolant'][3] == "C"
+
+
+def test_set_in_untaken_branch_is_ignored():
+    chans, _, _ = parse_ini("#if NEVER\n#set CELSIUS\n#endif\n" + INI)
+    assert {c[0]: c for c in chans}['coolant'][3] == "F"
+    chans, _, _ = parse_ini("#if NEVER\n#else\n#set CELSIUS\n#endif\n" + INI)
+    assert {c[0]: c for c in chans}['coolant'][3] == "C"
+
+
+def test_unset_in_untaken_branch_is_ignored():
+    chans, _, _ = parse_ini("#if NEVER\n#unset CELSIUS\n#endif\n" + INI, {'CELSIUS'})
+    assert {c[0]: c for c in chans}['coolant'][3] == "C"
+
+
+def test_header_fields():
+    _, endian, block_size = parse_ini(INI)
+    assert endian == 'big'
+    assert block_size == 16
+
+
+def test_bit_fields():
+    chans = channels()
+    assert chans['ready'][6] == (0, 0)
+    assert chans['crank'][6] == (1, 2)
+    layout = compile_layout(INI)
+    values = layout.decode(bytes([0, 0, 0, 0, 0b00000101]) + bytes(11))
+    assert values['engine'] == 5
+    assert values['ready'] == 1
+    assert values['crank'] == 2
+
+
+def test_constant_expression_scales():
+    chans = channels()
+    assert chans['afr1'][4] == 0.1
+    assert chans['egoV1'][4] == 0.01
+    assert chans['egoV1'][5] == -1.0
+
+
+def test_non_constant_scale_skips_channel(capsys):
+    chans = channels()
+    assert 'knock' not in chans
+    assert "knock" in capsys.readouterr().out
+
+
+def test_computed_channels_are_not_in_the_block():
+    assert 'coolantF' not in channels()
+
+
+def test_decode_applies_scale_and_translate():
+    layout = compile_layout(INI, {'CELSIUS'})
+    block = layout.encode({'rpm': 3000, 'coolant': 85.0, 'afr1': 14.7})
+    values = layout.decode(block)
+    assert values['rpm'] == 3000
+    assert abs(values['coolant'] - 85.0) < 0.06
+    assert abs(values['afr1'] - 14.7) < 1e-9
+
+
+def test_short_block_decodes_to_nothing():
+    assert default_layout().decode(b'\x00' * 4) == {}
+
+
+def test_cache_hit_refreshes_entry_and_old_entries_are_pruned(tmp_path):
+    ini = tmp_path / "a.ini"
+    ini.write_text(INI)
+    cache_dir = str(tmp_path / "cache")
+    load_cached(str(ini), "sig", (), cache_dir)
+    entry = os.path.join(cache_dir, cache_name(str(ini), "sig"))
+    os.utime(entry, (0, 0))
+    assert len(load_cached(str(ini), "sig", (), cache_dir)) > 0
+    assert os.path.getmtime(entry) > 0    # the hit marked it as used
+
+    old = os.path.join(cache_dir, "0" * 32 + ".lay")
+    open(old, "wb").close()
+    os.utime(old, (0, 0))
+    load_cached(str(ini), "sig", {'CELSIUS'}, cache_dir)   # new entry: prunes
+    assert not os.path.exists(old)
+    assert os.path.exists(entry)
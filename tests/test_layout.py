@@ -0,0 +1,37 @@
+import os
+
+from MS_Derived import DerivedChannels
+from MS_Streams import StreamStats
+from OLED_Layout import load_layout
+
+LAYOUT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           "dash_layout.json")
+
+derived = DerivedChannels()
+streams = StreamStats()
+
+
+def expand(names):
+    return derived.requires(streams.requires(names))
+
+
+def page(name):
+    return next(p for p in load_layout(LAYOUT_PATH, 128, 32).pages if p.name == name)
+
+
+def test_statistics_and_derived_expand_to_sources():
+    supplied = {'RPM', 'Coolant', 'AFR', 'TPS', 'MAP', 'Baro'}
+    assert page('Peaks').sources(supplied, expand) == ['Baro', 'Coolant', 'MAP']
+    assert page('Overview').sources(supplied, expand) == ['AFR', 'RPM', 'TPS']
+
+
+def test_unsupplied_channels_are_not_waited_for():
+    # A source without MAP/Baro still draws the page from what it has
+    supplied = {'RPM', 'Coolant', 'MAT', 'AFR', 'TPS'}
+    assert page('Peaks').sources(supplied, expand) == ['Coolant']
+    assert page('Boost').sources(supplied, expand) == ['RPM']
+    assert page('GPS').sources(supplied, expand) == []
+
+
+def test_sources_without_expand():
+    assert page('Temps').sources({'Coolant'}) == ['Coolant']
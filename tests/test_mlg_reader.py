@@ -0,0 +1,56 @@
+import struct
+
+from MLG_Reader import _BLOCK_HEAD, _FIELD_V1, _HEADER_V1, MARKER_SIZE, MLGLog
+from logfile_read import LogFollower
+
+FIELDS = [(2, b'RPM', b'rpm', 1.0, 0.0), (3, b'AFR', b'AFR', 0.1, 0.0)]
+RECORD = struct.Struct('>Hh')
+
+
+def header():
+    data_start = _HEADER_V1.size + len(FIELDS) * _FIELD_V1.size
+    out = _HEADER_V1.pack(b'MLVLG\0', 1, 0, 0, data_start, RECORD.size, len(FIELDS))
+    for type_code, name, units, scale, transform in FIELDS:
+        out += _FIELD_V1.pack(type_code, name, units, 0, scale, transform, 1)
+    return out
+
+
+def block(i, rpm, afr):
+    return _BLOCK_HEAD.pack(0, i & 0xFF, i) + RECORD.pack(rpm, afr) + b'\0'
+
+
+def marker(text):
+    return _BLOCK_HEAD.pack(1, 0, 0) + text.ljust(MARKER_SIZE - _BLOCK_HEAD.size, b'\0')
+
+
+def test_refresh_scans_only_appended_blocks(tmp_path):
+    path = tmp_path / "live.mlg"
+    path.write_bytes(header() + block(0, 900, 147) + block(1, 950, 146))
+    with MLGLog(str(path)) as log, open(path, "ab") as f:
+        assert len(log) == 2
+        assert log.refresh() == 0
+        f.write(block(2, 1000, 145) + block(3, 1100, 144)[:4])   # last one half written
+        f.flush()
+        assert log.refresh() == 1
+        f.write(block(3, 1100, 144)[4:] + marker(b'lap') + block(4, 1200, 143))
+        f.flush()
+        assert log.refresh() == 2
+        assert len(log.segments) == 2
+        assert log.markers[0][0] == 4 and log.markers[0][2] == 'lap'
+        assert log.record(4)['RPM'] == 1200
+        assert abs(log.record(3)['AFR'] - 14.4) < 1e-6
+
+
+def test_follower_reports_only_new_records(tmp_path):
+    path = tmp_path / "live.mlg"
+    path.write_bytes(header() + block(0, 900, 147))
+    seen = []
+    follower = LogFollower(str(tmp_path), on_records=lambda log, new: seen.append(
+        (new, log.record(len(log) - 1)['RPM'])))
+    follower.open(str(path))
+    follower.read_appended()
+    with open(path, "ab") as f:
+        f.write(block(1, 950, 146) + block(2, 1000, 145))
+    follower.read_appended()
+    assert seen == [(0, 900), (2, 1000)]
+    follower.mlg.close()
@@ -0,0 +1,44 @@
+import os
+
+from MS_Reactor import Device, Reactor
+
+
+class PipePort:
+    """Serial stand-in over a pipe whose writes fail, like a port that vanished."""
+
+    def __init__(self):
+        self.r, self.w = os.pipe()
+
+    def fileno(self):
+        return self.r
+
+    def write(self, data):
+        raise OSError(5, "Input/output error")
+
+    def close(self):
+        os.close(self.r)
+        os.close(self.w)
+
+
+class FlakyDevice(Device):
+    names = ('x',)
+
+    def open(self):
+        self.ser = PipePort()
+        return self.ser
+
+    def start(self):
+        return b'init\r'
+
+
+def test_failed_init_write_leaves_selector_clean():
+    device = FlakyDevice("flaky", "/dev/null", 9600)
+    reactor = Reactor([device])
+    try:
+        for attempt in range(3):
+            reactor._open(device, float(attempt))   # must not raise KeyError
+            assert device.ser is None
+            assert not reactor.selector.get_map()
+        assert "Input/output error" in device.open_error
+    finally:
+        reactor.close()
@@ -0,0 +1,86 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from MS_SharedRing import _WRITER, _WRITER_AT, RingReader, RingWriter
+
+NAMES = ['rpm', 'map', 'coolant']
+
+
+@pytest.fixture
+def ring_name():
+    return f"msdash_test_{os.getpid()}"
+
+
+@pytest.fixture
+def writer(ring_name):
+    w = RingWriter(NAMES, name=ring_name, slots=8)
+    yield w
+    w.close()
+
+
+def test_latest_and_missing_channels(writer, ring_name):
+    reader = RingReader(ring_name)
+    try:
+        assert reader.latest() is None
+        writer.publish({'rpm': 900.0, 'map': 35.0}, timestamp=1.5)
+        seq, t, values = reader.latest()
+        assert (seq, t) == (1, 1.5)
+        assert values['rpm'] == 900.0
+        assert values['coolant'] != values['coolant']  # NaN
+    finally:
+        reader.close()
+
+
+def test_poll_returns_every_sample_in_order(writer, ring_name):
+    reader = RingReader(ring_name)
+    try:
+        for i in range(5):
+            writer.publish({'rpm': float(i)}, timestamp=float(i))
+        samples = reader.poll()
+        assert [s[0] for s in samples] == [1, 2, 3, 4, 5]
+        assert [s[2][0] for s in samples] == [0.0, 1.0, 2.0, 3.0, 4.0]
+        assert reader.dropped == 0
+        assert reader.poll() == []
+    finally:
+        reader.close()
+
+
+def test_lapped_reader_counts_dropped_samples(writer, ring_name):
+    reader = RingReader(ring_name)
+    try:
+        for i in range(20):
+            writer.publish({'rpm': float(i)})
+        samples = reader.poll()
+        # The slot being written next is never handed out, so 7 of 8 survive
+        assert [s[0] for s in samples] == list(range(14, 21))
+        assert reader.dropped == 13
+        assert not reader.valid(1)
+        assert reader.read(1) is None
+    finally:
+        reader.close()
+
+
+def test_second_writer_refuses_live_ring(writer, ring_name):
+    with pytest.raises(FileExistsError, match="live writer"):
+        RingWriter(NAMES, name=ring_name, slots=8)
+    writer.publish({'rpm': 1.0})
+    assert writer.write_seq == 1
+
+
+def test_ring_of_dead_writer_is_replaced(ring_name):
+    dead = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"],
+                          capture_output=True, text=True).stdout
+    old = RingWriter(NAMES, name=ring_name, slots=8)
+    old.publish({'rpm': 1.0})
+    _WRITER.pack_into(old.buf, _WRITER_AT, int(dead))   # as if that process crashed
+    new = RingWriter(['rpm'], name=ring_name, slots=4)
+    try:
+        assert new.names == ['rpm']
+        assert new.write_seq == 0
+    finally:
+        old._values.release()
+        old.shm.close()
+        new.close()
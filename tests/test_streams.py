@@ -0,0 +1,55 @@
+from MS_Streams import EMA, PeakHold, StreamStats, Window
+
+
+def test_window_min_max_mean():
+    w = Window(10.0, buckets=10)
+    for t, v in enumerate([5.0, 9.0, 1.0, 7.0]):
+        w.add(v, float(t))
+    assert w.max() == 9.0
+    assert w.min() == 1.0
+    assert w.mean() == 5.5
+
+
+def test_window_expires_old_buckets():
+    w = Window(10.0, buckets=10)
+    w.add(100.0, 0.0)
+    w.add(-100.0, 1.0)
+    for t in range(2, 11):
+        w.add(10.0 + t, float(t))
+    # t=10 starts bucket 10: the window is buckets 1..10, so t=0 has gone
+    assert w.max() == 20.0
+    assert w.min() == -100.0
+    w.add(0.0, 11.0)
+    assert w.max() == 20.0
+    assert w.min() == 0.0
+    assert w.mean() == sum(10.0 + t for t in range(2, 11)) / 10
+
+
+def test_window_empties_after_a_gap():
+    w = Window(10.0, buckets=10)
+    w.add(50.0, 0.0)
+    w.add(1.0, 100.0)
+    assert w.max() == w.min() == w.mean() == 1.0
+
+
+def test_ema_time_constant():
+    ema = EMA(1.0)
+    ema.add(0.0, 0.0)
+    value = ema.add(1.0, 1.0)
+    assert abs(value - 0.632) < 0.001
+
+
+def test_peak_holds_then_relaxes():
+    peak = PeakHold(hold=3.0, decay=1.0)
+    peak.add(200.0, 0.0)
+    assert peak.add(100.0, 2.0) == 200.0
+    assert 100.0 < peak.add(100.0, 4.0) < 200.0
+
+
+def test_stream_stats_publish_by_name():
+    streams = StreamStats({'AFR max': ('max', 'AFR', 10.0), 'AFR mean': ('mean', 'AFR', 10.0)})
+    streams.update({'AFR': 12.0}, 0.0)
+    values = streams.update({'AFR': 14.0}, 1.0)
+    assert values['AFR max'] == 14.0
+    assert values['AFR mean'] == 13.0
+    assert 'AFR max' not in streams.update({'RPM': 900}, 2.0)
@@ -0,0 +1,83 @@
+import struct
+import zlib
+
+import pytest
+
+from MS_Transport import FrameError, Transport, TransportTimeout, frame
+
+
+class ScriptedSerial:
+    """Serial port that replies to every write with the next scripted bytes."""
+
+    def __init__(self, *replies, timeout=0.05):
+        self.replies = list(replies)
+        self.timeout = timeout
+        self.written = []
+        self._rx = bytearray()
+        self.resets = 0
+
+    def write(self, data):
+        self.written.append(bytes(data))
+        if self.replies:
+            self._rx += self.replies.pop(0)
+
+    def read(self, n):
+        data = bytes(self._rx[:n])
+        del self._rx[:n]
+        return data
+
+    def reset_input_buffer(self):
+        self.resets += 1
+        self._rx.clear()
+
+
+def test_good_frame():
+    transport = Transport(ScriptedSerial(frame(b'\x01' + b'\x10\x20\x30')))
+    assert transport.read_realtime() == b'\x10\x20\x30'
+    assert transport.frames == 1
+    assert transport.errors == 0
+
+
+def test_crc_mismatch_is_rejected():
+    good = frame(b'\x01' + b'\x10\x20\x30')
+    bad = good[:-4] + struct.pack('>I', zlib.crc32(b'\x01\x10\x20\x30') ^ 1)
+    ser = ScriptedSerial(bad)
+    transport = Transport(ser)
+    with pytest.raises(FrameError, match="CRC"):
+        transport.read_realtime()
+    assert transport.errors == 1
+    assert ser.resets == 1
+
+
+def test_short_frame_times_out():
+    ser = ScriptedSerial(frame(b'\x01' + bytes(20))[:-6])
+    transport = Transport(ser)
+    with pytest.raises(TransportTimeout):
+        transport.read_realtime()
+    assert transport.errors == 1
+    assert ser.resets == 1
+
+
+def test_bad_length_is_rejected():
+    transport = Transport(ScriptedSerial(b'\x00\x00'))
+    with pytest.raises(FrameError, match="bad length"):
+        transport.read_realtime()
+
+
+def test_error_flag_is_rejected():
+    transport = Transport(ScriptedSerial(frame(b'\x83')))
+    with pytest.raises(FrameError, match="unrecognised command"):
+        transport.read_realtime()
+
+
+def test_short_range_reply_is_rejected():
+    transport = Transport(ScriptedSerial(frame(b'\x01' + bytes(3))))
+    with pytest.raises(FrameError, match="expected 4 bytes"):
+        transport.read_range(10, 4)
+
+
+def test_legacy_read_needs_length():
+    transport = Transport(ScriptedSerial(bytes(8)), framed=False)
+    with pytest.raises(ValueError, match="block_size"):
+        transport.read_realtime()
+    assert transport.read_realtime(8) == bytes(8)